@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Per-response overhead of resolving SITEMAPCHECK_CHECKS: importing every
+dotted path for each response (as was done before the registry) versus
+asking the registry for its cached tuple of callables.
+
+    python benchmarks/check_registry.py [iterations]
+"""
+from __future__ import print_function
+import sys
+import timeit
+
+if __name__ == '__main__' and __package__ is None:
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from benchmarks.support import setup_django
+
+
+def per_response_import():
+    from django.conf import settings
+    from sitemapcheck.registry import import_string
+    from sitemapcheck.settings import SITEMAPCHECK_CHECKS
+    checks = getattr(settings, 'SITEMAPCHECK_CHECKS', SITEMAPCHECK_CHECKS)
+    return tuple(import_string(check) for check in checks)
+
+
+def registry_lookup():
+    from sitemapcheck.registry import get_checks
+    return get_checks()
+
+
+def main(iterations=10000):
+    setup_django()
+    assert per_response_import() == registry_lookup()
+    for label, func in (('import per response', per_response_import),
+                        ('registry', registry_lookup)):
+        best = min(timeit.repeat(func, number=iterations, repeat=3))
+        print("{label:<20} {usec:>10.2f} usec/response".format(
+            label=label, usec=best / iterations * 1e6))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:2]])
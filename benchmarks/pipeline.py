@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Throughput of the whole pipeline (enumerating a sitemap of N URLs, requesting
+each, running the checks, writing the reports) for each engine; each run is
+made in a fresh process, so its peak RSS is its own.
+
+Prints a table, and writes the results as JSON for comparing one version
+with another.
+
+    python benchmarks/pipeline.py [--counts=10000,100000,1000000]
+        [--engines=single,multi] [--processes=N] [--view=tiny|page]
+        [--output=benchmark_pipeline.json]
+
+Stages are seconds of wall-clock time, except `request` and `checks`, which
+are the sums of every URL's own request and check times, so for the
+multiprocessing engine are spread over the workers.
+"""
+from __future__ import print_function
+from multiprocessing import cpu_count, Process, Queue
+from optparse import OptionParser
+import json
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+from timeit import default_timer
+
+if __name__ == '__main__' and __package__ is None:
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from benchmarks.support import setup_django
+
+
+DEFAULT_COUNTS = (10000, 100000, 1000000)
+DEFAULT_ENGINES = ('single', 'multi')
+
+
+def prepared_requests(count, view):
+    from benchmarks.urls import make_sitemap
+    from sitemapcheck.utils import sitemap_request_iterator
+    from sitemapcheck.utils import sitemap_urls_iterator
+    sitemaps = {'benchmark': make_sitemap(count, view=view)}
+    return sitemap_request_iterator(sitemap_urls_iterator(sitemaps.values()))
+
+
+class Timed(object):
+    """
+    Wraps an iterator, adding up the time spent waiting on each item.
+    """
+    def __init__(self, iterable):
+        self.iterator = iter(iterable)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = default_timer()
+        try:
+            return next(self.iterator)
+        finally:
+            self.seconds += default_timer() - started
+    next = __next__
+
+
+def peak_rss():
+    # linux reports kilobytes; pool workers are counted once they've exited.
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def run(engine, count, view, processes, queue):
+    from sitemapcheck.reports import get_reports
+    from sitemapcheck.reports import parse_report
+    from sitemapcheck.reports import write_reports
+    from sitemapcheck.utils import multiprocessor
+    from sitemapcheck.utils import singleprocessor
+
+    enumeration = Timed(prepared_requests(count, view))
+    for prepared in enumeration:
+        pass
+
+    root = tempfile.mkdtemp()
+    reports = [parse_report(x, root) for x in get_reports()]
+    started = default_timer()
+    if engine == 'multi':
+        results = multiprocessor(prepared_requests(count, view),
+                                 processes=processes)
+    else:
+        results = singleprocessor(prepared_requests(count, view))
+    results = Timed(results)
+    checked = 0
+    request = 0.0
+    checks = 0.0
+    try:
+        for result in write_reports(results, reports):
+            checked += 1
+            request += result.elapsed or 0
+            checks += sum(result.check_times or ())
+    finally:
+        shutil.rmtree(root)
+    total = default_timer() - started
+
+    queue.put({
+        'engine': engine,
+        'urls': checked,
+        'seconds': total,
+        'urls_per_second': checked / total if total else None,
+        'peak_rss_kb': peak_rss(),
+        'stages': {
+            'enumeration': enumeration.seconds,
+            'request': request,
+            'checks': checks,
+            'report': total - results.seconds,
+        },
+    })
+
+
+def measure(engine, count, view, processes):
+    queue = Queue()
+    process = Process(target=run, args=(engine, count, view, processes,
+                                        queue))
+    process.start()
+    measured = queue.get()
+    process.join()
+    return measured
+
+
+def environment(options):
+    import django
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'cpu_count': cpu_count(),
+        'processes': options.processes,
+        'view': options.view,
+    }
+
+
+def main(argv):
+    parser = OptionParser(usage=__doc__)
+    parser.add_option('--counts', default=','.join(
+        str(x) for x in DEFAULT_COUNTS))
+    parser.add_option('--engines', default=','.join(DEFAULT_ENGINES))
+    parser.add_option('--processes', type='int', default=cpu_count())
+    parser.add_option('--view', default='tiny', choices=('tiny', 'page'))
+    parser.add_option('--output', default='benchmark_pipeline.json')
+    options, args = parser.parse_args(argv)
+    counts = [int(x) for x in options.counts.split(',')]
+    engines = options.engines.split(',')
+
+    # without django.contrib.sites, enumerating the sitemap needn't touch
+    # the database.
+    setup_django(ROOT_URLCONF='benchmarks.urls', DEBUG=False,
+                 INSTALLED_APPS=('django.contrib.sitemaps', 'sitemapcheck'))
+    results = []
+    print("{0:>8} {1:>10} {2:>10} {3:>10} {4:>10}   {5}".format(
+        'engine', 'urls', 'seconds', 'urls/sec', 'peak (MB)',
+        'enumeration/request/checks/report (s)'))
+    for count in counts:
+        for engine in engines:
+            measured = measure(engine, count, options.view,
+                               options.processes)
+            results.append(measured)
+            stages = measured['stages']
+            print("{0:>8} {1:>10d} {2:>10.2f} {3:>10.0f} {4:>10.1f}   "
+                  "{5}".format(engine, measured['urls'], measured['seconds'],
+                               measured['urls_per_second'] or 0,
+                               measured['peak_rss_kb'] / 1024.0,
+                               '/'.join('{0:.2f}'.format(stages[x])
+                                        for x in ('enumeration', 'request',
+                                                  'checks', 'report'))))
+    with open(options.output, 'w') as f:
+        json.dump({'environment': environment(options), 'results': results},
+                  f, indent=2, sort_keys=True)
+    print("Wrote {0!s}".format(options.output))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Peak RSS of checking, and holding the results for, N URLs; each count is
+run in a fresh process so earlier runs don't inflate the peak.
+
+`compact` keeps what the command keeps, the Response summaries;
+`raw` keeps each full HttpResponse as well, as results used to.
+
+    python benchmarks/result_memory.py [count ...]
+"""
+from __future__ import print_function
+from multiprocessing import Process, Queue
+import resource
+import sys
+
+if __name__ == '__main__' and __package__ is None:
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from benchmarks.support import setup_django
+
+
+DEFAULT_COUNTS = (1000, 5000, 20000)
+
+
+def prepared_requests(count):
+    from django.test import Client
+    from sitemapcheck.utils import SitemapRequestResponse
+    for pk in range(count):
+        yield SitemapRequestResponse(handler=Client,
+                                     path='/page/{pk:d}/'.format(pk=pk),
+                                     sitemap_item=None)
+
+
+def check_urls(count, mode, queue):
+    from django.test import Client
+    from sitemapcheck.utils import get_worker_client
+    from sitemapcheck.utils import singleprocessor
+    client = get_worker_client(Client)
+    kept = []
+    for result in singleprocessor(prepared_requests(count)):
+        kept.append(result)
+        if mode == 'raw':
+            kept.append(client.get(result.path))
+    # linux reports kilobytes.
+    queue.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def measure(count, mode):
+    queue = Queue()
+    process = Process(target=check_urls, args=(count, mode, queue))
+    process.start()
+    peak = queue.get()
+    process.join()
+    return peak
+
+
+def main(*counts):
+    setup_django(ROOT_URLCONF='benchmarks.urls', DEBUG=False)
+    from sitemapcheck.registry import get_checks
+    get_checks()
+    counts = counts or DEFAULT_COUNTS
+    baseline = measure(0, 'compact')
+    print("{0:>10} {1:>14} {2:>14}".format('urls', 'compact (MB)',
+                                             'raw (MB)'))
+    for count in counts:
+        compact = (measure(count, 'compact') - baseline) / 1024.0
+        raw = (measure(count, 'raw') - baseline) / 1024.0
+        print("{0:>10d} {1:>14.1f} {2:>14.1f}".format(count, compact, raw))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:]])
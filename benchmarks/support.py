@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django(**overrides):
+    """
+    Configures Django using the same settings as the test suite, so
+    benchmarks may be run straight from a checkout.
+    """
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    from django.conf import settings
+    import django
+    from runtests import get_settings
+    if not settings.configured:
+        setting_attrs = get_settings()
+        # the test client's host, for when DEBUG is off.
+        setting_attrs['ALLOWED_HOSTS'] = ['testserver']
+        setting_attrs.update(overrides)
+        settings.configure(**setting_attrs)
+    if hasattr(django, 'setup'):
+        django.setup()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from django.conf.urls import patterns, url
+from django.contrib.sitemaps import Sitemap
+from django.http import HttpResponse
+
+
+PAGE_HTML = """<!doctype html>
+<html><head>
+<meta charset="utf-8">
+<title>Benchmark page {pk}</title>
+<meta name="description" content="A page which exists to be checked">
+<meta name="viewport" content="width=device-width">
+<link rel="canonical" href="/page/{pk}/">
+</head><body>
+<a href="/" rel="home">home</a>
+{filler}
+</body></html>"""
+
+FILLER = "<p>" + ("lorem ipsum dolor sit amet " * 40) + "</p>\n"
+
+
+def page(request, pk):
+    html = PAGE_HTML.format(pk=pk, filler=FILLER * 20)
+    return HttpResponse(html)
+
+
+def tiny(request, pk):
+    return HttpResponse(PAGE_HTML.format(pk=pk, filler=''))
+
+
+def make_sitemap(count, view='tiny'):
+    """
+    A Sitemap of `count` URLs for the given view, `page` (~22KB each) or
+    `tiny`, in the same style as the test suite's FakeSitemap.
+    """
+    class BenchmarkSitemap(Sitemap):
+        limit = 50000
+
+        def items(self):
+            return range(count)
+
+        def location(self, obj):
+            return '/{view!s}/{pk:d}/'.format(view=view, pk=obj)
+    return BenchmarkSitemap
+
+
+urlpatterns = patterns('',
+    url(r'^page/(?P<pk>\d+)/$', page, name='benchmark_page'),
+    url(r'^tiny/(?P<pk>\d+)/$', tiny, name='benchmark_tiny'),
+)
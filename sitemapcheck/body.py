@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Reading only as much of each response's body as the checks need.
+
+Each check may say what it looks at by setting `needs` to one of:
+
+* HEADERS: the status code & headers alone;
+* HEAD: the start of the document, up to the end of its `<head>`;
+* BODY: the whole document, which is assumed of any check not saying.
+
+The body is then read a chunk at a time, as the response hands it over,
+stopping once the checks have everything they need, so a streaming
+response isn't drained and a large page isn't joined into one string only
+for its `<head>` to be searched.
+"""
+from collections import namedtuple
+import hashlib
+from django.conf import settings
+from .settings import SITEMAPCHECK_HEAD_BYTES
+
+
+HEADERS = 'headers'
+HEAD = 'head'
+BODY = 'body'
+# from needing the least to the most.
+NEEDS = (HEADERS, HEAD, BODY)
+
+# `</head` split across two chunks is still found, by searching back this far
+# into what was already kept.
+HEAD_END = b'</head'
+
+# `content` is what was kept of the body: nothing, the head, or all of it.
+# `complete` is whether the body was read to its end, and `length` & `sha1`
+# are its size & hash when it was, or None.
+ReadBody = namedtuple('ReadBody', 'content complete length sha1')
+
+
+def check_needs(check):
+    return getattr(check, 'needs', BODY)
+
+
+def get_needs(checks):
+    """
+    The most any of the checks needs of the body.
+    """
+    needs = HEADERS
+    for check in checks:
+        needed = check_needs(check)
+        if NEEDS.index(needed) > NEEDS.index(needs):
+            needs = needed
+    return needs
+
+
+def get_head_bytes(limit=None):
+    if limit is None:
+        limit = getattr(settings, 'SITEMAPCHECK_HEAD_BYTES',
+                        SITEMAPCHECK_HEAD_BYTES)
+    return limit
+
+
+def response_chunks(response):
+    if getattr(response, 'streaming', False):
+        return response.streaming_content
+    # the chunks the body was built from, rather than `content`, which
+    # would join them into another copy.
+    return iter(response)
+
+
+def read_body(response, needs=BODY, head_bytes=None):
+    """
+    Reads the body of the response as far as `needs` requires. A response
+    already held in memory is always read to the end (which is cheap), so
+    its length & hash are known; a streaming one is left unread past the
+    end of its `<head>` (or `head_bytes`, whichever comes first) when only
+    that is needed, and isn't read at all when only the headers are.
+    """
+    streaming = getattr(response, 'streaming', False)
+    if needs == HEADERS and streaming:
+        return ReadBody(content=b'', complete=False, length=None, sha1=None)
+    head_bytes = get_head_bytes(head_bytes)
+    digest = hashlib.sha1()
+    length = 0
+    kept = bytearray()
+    keeping = needs != HEADERS
+    complete = True
+    for chunk in response_chunks(response):
+        length += len(chunk)
+        digest.update(chunk)
+        if not keeping:
+            continue
+        searched_from = max(0, len(kept) - len(HEAD_END))
+        kept.extend(chunk)
+        if needs == HEAD:
+            cut = head_end(kept, searched_from, head_bytes)
+            if cut is not None:
+                del kept[cut:]
+                keeping = False
+                if streaming:
+                    complete = False
+                    break
+    content = bytes(kept)
+    if not complete:
+        close = getattr(response, 'close', None)
+        if close is not None:
+            close()
+        return ReadBody(content=content, complete=False, length=None,
+                        sha1=None)
+    return ReadBody(content=content, complete=True, length=length,
+                    sha1=digest.hexdigest())
+
+
+def head_end(content, searched_from, head_bytes):
+    """
+    Where to stop keeping the body: just after `</head...>`, or at
+    `head_bytes`, if either has been reached; otherwise None. Only what was
+    added since `searched_from` is searched.
+    """
+    found = content[searched_from:].lower().find(HEAD_END)
+    if found != -1:
+        found += searched_from
+        closed = content.find(b'>', found)
+        if closed == -1:
+            # the rest of the tag hasn't arrived; what matters is before it.
+            closed = found + len(HEAD_END) - 1
+        return min(closed + 1, head_bytes)
+    if len(content) >= head_bytes:
+        return head_bytes
+    return None
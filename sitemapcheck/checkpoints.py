@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Keeping what a run has checked so far in a file, a result at a time as each
+arrives, so that stopping it (with Ctrl-C, or otherwise) loses none of them,
+and a later run given `--resume` only checks the URLs which are left.
+
+The file is a line of JSON saying which run it belongs to, then a line per
+result, as the shard files are. It's removed once a run finishes.
+"""
+import json
+import os
+from django.conf import settings
+from .settings import SITEMAPCHECK_CHECKPOINT
+from .utils import Response
+
+
+def get_checkpoint(path=None, shard=None):
+    """
+    The checkpoint given, or else the configured one, named for the shard
+    (an (index, count) pair) if given, so that the shards run from one
+    directory don't share it.
+    """
+    if path is None:
+        path = getattr(settings, 'SITEMAPCHECK_CHECKPOINT',
+                       SITEMAPCHECK_CHECKPOINT)
+        if path is not None and shard is not None:
+            root, ext = os.path.splitext(path)
+            path = '{root!s}.shard-{index:d}-of-{count:d}{ext!s}'.format(
+                root=root, index=shard[0], count=shard[1], ext=ext)
+    return path
+
+
+def read_checkpoint_header(fileobj, name):
+    try:
+        return json.loads(fileobj.readline())['sitemapcheck_checkpoint']
+    except (ValueError, KeyError, TypeError):
+        msg = "`{name!s}` isn't a sitemapcheck checkpoint".format(name=name)
+        raise ValueError(msg)
+
+
+def drop_incomplete_line(path):
+    """
+    Cuts off a last line left incomplete by the run stopping part way
+    through writing it, so that results added after it start on a line of
+    their own.
+    """
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        if position == 0:
+            return
+        f.seek(position - 1)
+        if f.read(1) == b'\n':
+            return
+        while position > 0:
+            start = max(0, position - 4096)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b'\n')
+            if newline != -1:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+
+
+def read_checkpoint(path):
+    """
+    Yields every result in the checkpoint file; a last line left incomplete
+    by the run stopping part way through writing it is ignored.
+    """
+    with open(path) as f:
+        f.readline()
+        for line in f:
+            try:
+                data = json.loads(line)
+            except ValueError:
+                continue
+            yield Response.from_dict(data)
+
+
+class Checkpoint(object):
+    """
+    Writes each result of the run to `path` as it arrives (or nowhere, if
+    path is None), noting whether the run was interrupted. `run` is a
+    dictionary of whatever decides which URLs are checked (eg: the shard),
+    which a checkpoint must match to be resumed from.
+
+    When resuming, the results already in the file are passed on first,
+    ahead of those for the URLs not yet checked, and the new results are
+    added to the end of it. Used around the run, the checkpoint is removed
+    as it ends, unless it ends by being interrupted or failing.
+    """
+    def __init__(self, path, run=None, resume=False):
+        self.path = path
+        self.run = run or {}
+        self.resume = False
+        self.interrupted = False
+        self.checked = set()
+        if resume and path is not None and os.path.exists(path):
+            self.resume = True
+            drop_incomplete_line(path)
+            with open(path) as f:
+                header = read_checkpoint_header(f, path)
+            if header.get('run', {}) != self.run:
+                msg = ("`{path!s}` is from a run with different options; "
+                       "check every URL again without --resume".format(
+                           path=path))
+                raise ValueError(msg)
+            self.checked = set(x.path for x in read_checkpoint(path))
+
+    @property
+    def resumed(self):
+        return len(self.checked)
+
+    def skipping(self, prepared_requests):
+        """
+        Passes through the prepared requests for URLs not already checked.
+        """
+        for prepared in prepared_requests:
+            if prepared.path not in self.checked:
+                yield prepared
+
+    def previous(self):
+        if self.resume:
+            for result in read_checkpoint(self.path):
+                yield result
+
+    def recording(self, results):
+        """
+        Passes through each result, writing it to the checkpoint as it goes.
+        The results stop early, rather than with an error, if interrupted
+        with Ctrl-C, so that everything after this can finish normally.
+        """
+        fileobj = None
+        if self.path is not None:
+            if self.resume:
+                fileobj = open(self.path, 'a')
+            else:
+                fileobj = open(self.path, 'w')
+                header = {'sitemapcheck_checkpoint': {'run': self.run}}
+                fileobj.write(json.dumps(header) + '\n')
+        try:
+            for result in results:
+                if fileobj is not None:
+                    fileobj.write(json.dumps(result.as_dict()) + '\n')
+                    # so nothing is lost however the run is stopped.
+                    fileobj.flush()
+                yield result
+        except KeyboardInterrupt:
+            self.interrupted = True
+        finally:
+            if fileobj is not None:
+                fileobj.close()
+
+    def finish(self):
+        """
+        Removes the checkpoint once the run is over, unless it was
+        interrupted, in which case it's kept to be resumed from.
+        """
+        if (self.path is not None and not self.interrupted and
+                os.path.exists(self.path)):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Finishes the run around which it's used, keeping the checkpoint if
+        the run failed with anything but exiting.
+        """
+        if exc_type is not None and not issubclass(exc_type, SystemExit):
+            self.interrupted = True
+        self.finish()
+        return False
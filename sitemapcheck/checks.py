@@ -1,21 +1,100 @@
 # -*- coding: utf-8 -*-
-from django.utils.encoding import force_text
 import re
+from django.conf import settings
+from django.utils.encoding import force_text
 from django.utils.translation import ugettext_lazy as _
 from collections import namedtuple
+from .body import BODY
+from .body import HEAD
+from .body import HEADERS
+from .document import DEFAULT_RE_FLAGS  # noqa
+from .document import title_re  # noqa
+from .document import get_document
+from .instrumentation import normalise_sql
+from .settings import SITEMAPCHECK_QUERY_BUDGET
+from .settings import SITEMAPCHECK_REPEATED_QUERY_LIMIT
 
 Success = _("Success")
 Error = _("Error")
 Caution = _("Warning")
 Info = _("Info")
+Skipped = _("Skipped")
 CheckedResponse = namedtuple('CheckedResponse', 'msg code name')
+# what was seen while producing the response, given to checks which set
+# `takes_context = True`, as check(response, context). `queries` is a list of
+# {'sql': ..., 'time': ...} dictionaries, or None if they couldn't be seen
+# (eg: when checking over HTTP).
+# Checks may also set `needs` to say how much of the response they look at:
+# HEADERS, HEAD or BODY (see sitemapcheck.body), BODY being assumed.
+CheckContext = namedtuple('CheckContext', 'path queries timings')
+
+# the response types the HTML checks apply to.
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+
+# Checks may set `preconditions` to a sequence of callables, each called as
+# precondition(response, results) with the results of the checks run before
+# it, keyed by check, and each having a `reason` to give if it isn't met; a
+# check whose preconditions aren't all met is skipped rather than run.
+def successful(response, results):
+    return 200 <= response.status_code < 300
+successful.reason = _("Not a successful (2xx) response")
+
+
+def html(response, results):
+    content_type = response.get('Content-Type') or ''
+    return content_type.split(';')[0].strip().lower() in HTML_CONTENT_TYPES
+html.reason = _("Not an HTML response")
+
+
+def passed(*checks):
+    """
+    A precondition met if each of the given checks succeeded; when the
+    results aren't known yet (`results` is None), it's assumed they will.
+    """
+    def precondition(response, results):
+        if results is None:
+            return True
+        for check in checks:
+            result = results.get(check)
+            if result is None or result.code != Success:
+                return False
+        return True
+    precondition.reason = "Needs {names!s} to succeed first".format(
+        names=', '.join(force_text(get_check_name(x)) for x in checks))
+    return precondition
+
+
+def unmet_precondition(check, response, results=None):
+    """
+    Why the check shouldn't be run: the reason given by the first of its
+    preconditions which isn't met, or None if they all are. With `results`
+    of None, those depending on other checks' results are taken as met.
+    """
+    for precondition in getattr(check, 'preconditions', ()):
+        if not precondition(response, results):
+            return precondition.reason
+    return None
+
+
+def get_check_name(check):
+    """
+    What the check calls itself in its results (its `verbose_name`), for
+    recording it as skipped without running it.
+    """
+    name = getattr(check, 'verbose_name', None)
+    if name is None:
+        name = getattr(check, '__name__', None) or repr(check)
+    return name
+
+
+whitespace_re = re.compile(r'\s+')
+theme_color_re = re.compile(r'^#([a-fA-F0-9]{6})$')
+html5_doctype_re = re.compile(r'\s*<!doctype html>')
 
 
-DEFAULT_RE_FLAGS = re.DOTALL | re.IGNORECASE | re.MULTILINE
-title_re = re.compile(r'<title>(.+?)</title>', flags=DEFAULT_RE_FLAGS)
-
 def check_status_code(response):
-    checkname = _("Status code")
+    checkname = check_status_code.verbose_name
     if response.status_code > 300 and response.status_code < 400:
         msg = "Performs a redirect (%d)" % response.status_code
         return CheckedResponse(msg=msg, code=Caution, name=checkname)
@@ -24,132 +103,158 @@ def check_status_code(response):
         return CheckedResponse(msg=msg, code=Error, name=checkname)
     if response.status_code == 200:
         return CheckedResponse(msg="OK!", code=Success, name=checkname)
+check_status_code.needs = HEADERS
+check_status_code.verbose_name = _("Status code")
 
 
 def check_html_title(response):
-    checkname = _("HTML title")
-    data = title_re.search(force_text(response.content))
-    if data is None:
+    checkname = check_html_title.verbose_name
+    title = get_document(response).title
+    if title is None:
         return CheckedResponse(msg="Missing <title>", code=Error,
                                name=checkname)
-    outdata = ','.join(data.groups())
-    collapsed_outdata = re.sub('\s+', ' ', outdata)
+    collapsed_outdata = whitespace_re.sub(' ', title)
     # see here http://moz.com/learn/seo/title-tag
     if len(collapsed_outdata) > 55:
         return CheckedResponse(msg=collapsed_outdata, code=Caution,
                                name=checkname)
     return CheckedResponse(msg=collapsed_outdata, code=Success, name=checkname)
+check_html_title.needs = HEAD
+check_html_title.verbose_name = _("HTML title")
+check_html_title.preconditions = (successful, html)
 
 
 def check_html_meta_description(response):
-    checkname = _("HTML meta description")
-    data = re.search(r'<meta name="description" content="(.+?)">',
-                     force_text(response.content))
+    checkname = check_html_meta_description.verbose_name
+    data = get_document(response).meta('description')
     if data is None:
         return CheckedResponse(msg='Missing <meta name="description">',
                                code=Caution, name=checkname)
-    return CheckedResponse(msg=','.join(data.groups()), code=Success,
+    return CheckedResponse(msg=data, code=Success,
                            name=checkname)
+check_html_meta_description.needs = HEAD
+check_html_meta_description.verbose_name = _("HTML meta description")
+check_html_meta_description.preconditions = (successful, html)
 
 
 def check_html_meta_keywords(response):
-    checkname = _("HTML meta keywords")
-    data = re.search(r'<meta name="keywords" content="(.+?)">',
-                     force_text(response.content))
+    checkname = check_html_meta_keywords.verbose_name
+    data = get_document(response).meta('keywords')
     if data is None:
         return CheckedResponse(msg='Missing <meta name="keywords">',
                                code=Caution, name=checkname)
-    return CheckedResponse(msg=','.join(data.groups()), code=Success,
+    return CheckedResponse(msg=data, code=Success,
                            name=checkname)
+check_html_meta_keywords.needs = HEAD
+check_html_meta_keywords.verbose_name = _("HTML meta keywords")
+check_html_meta_keywords.preconditions = (successful, html)
 
 
 def check_html_rel_canonical(response):
-    checkname = _("rel=canonical")
-    data = re.search(r'<link rel="canonical" href="(.+?)">',
-                     force_text(response.content))
+    checkname = check_html_rel_canonical.verbose_name
+    data = get_document(response).link('canonical')
     if data is None:
         return CheckedResponse(msg='Missing <link rel="canonical">',
                                code=Caution, name=checkname)
-    return CheckedResponse(msg=','.join(data.groups()), code=Success,
+    return CheckedResponse(msg=data, code=Success,
                            name=checkname)
+check_html_rel_canonical.needs = HEAD
+check_html_rel_canonical.verbose_name = _("rel=canonical")
+check_html_rel_canonical.preconditions = (successful, html)
 
 
 def check_html_android_theme_color(response):
-    checkname = _("Android theme colour")
-    data = re.search(r'<meta name="theme-color" content="#([a-fA-F0-9]{6})">',
-                     force_text(response.content))
+    checkname = check_html_android_theme_color.verbose_name
+    data = theme_color_re.match(
+        get_document(response).meta('theme-color') or '')
     if data is None:
         return CheckedResponse(msg='Missing <meta name="theme-color">',
                                code=Caution, name=checkname)
-    return CheckedResponse(msg=','.join(data.groups()), code=Success,
+    return CheckedResponse(msg=data.group(1), code=Success,
                            name=checkname)
+check_html_android_theme_color.needs = HEAD
+check_html_android_theme_color.verbose_name = _("Android theme colour")
+check_html_android_theme_color.preconditions = (successful, html)
 
 
 def check_html_meta_charset(response):
-    checkname = _("HTML meta charset")
-    data = re.search(r'<meta charset="(.+?)">',
-                     force_text(response.content))
+    checkname = check_html_meta_charset.verbose_name
+    data = get_document(response).meta_charset()
     if data is None:
         return CheckedResponse(msg='Missing <meta charset="...">',
                                code=Caution, name=checkname)
-    return CheckedResponse(msg=','.join(data.groups()), code=Success,
+    return CheckedResponse(msg=data, code=Success,
                            name=checkname)
+check_html_meta_charset.needs = HEAD
+check_html_meta_charset.verbose_name = _("HTML meta charset")
+check_html_meta_charset.preconditions = (successful, html)
 
 
 def check_html_meta_viewport(response):
-    checkname = _("HTML meta viewport")
-    data = re.search(r'<meta name="viewport" content="(.+?)">',
-                     force_text(response.content))
+    checkname = check_html_meta_viewport.verbose_name
+    data = get_document(response).meta('viewport')
     if data is None:
         return CheckedResponse(msg='Missing <meta name="viewport">',
                                code=Caution, name=checkname)
-    return CheckedResponse(msg=','.join(data.groups()), code=Success,
+    return CheckedResponse(msg=data, code=Success,
                            name=checkname)
+check_html_meta_viewport.needs = HEAD
+check_html_meta_viewport.verbose_name = _("HTML meta viewport")
+check_html_meta_viewport.preconditions = (successful, html)
 
 
 def check_mobile_homescreen(response):
-    checkname = _("May be added to Android homescreen")
-    data = re.search(r'<meta name="mobile-web-app-capable" content="(.+?)">',
-                     force_text(response.content))
+    checkname = check_mobile_homescreen.verbose_name
+    data = get_document(response).meta('mobile-web-app-capable')
     if data is None:
         return CheckedResponse(msg='no',
                                code=Caution, name=checkname)
-    return CheckedResponse(msg=','.join(data.groups()), code=Success,
+    return CheckedResponse(msg=data, code=Success,
                            name=checkname)
+check_mobile_homescreen.needs = HEAD
+check_mobile_homescreen.verbose_name = _("May be added to Android homescreen")
+check_mobile_homescreen.preconditions = (successful, html)
 
 
 def check_ios_homescreen(response):
-    checkname = _("May be added to iOS homescreen")
-    data = re.search(r'<meta name="apple-mobile-web-app-capable" '
-                     r'content="(.+?)">', force_text(response.content))
+    checkname = check_ios_homescreen.verbose_name
+    data = get_document(response).meta('apple-mobile-web-app-capable')
     if data is None:
         return CheckedResponse(msg='no',
                                code=Caution, name=checkname)
-    return CheckedResponse(msg=','.join(data.groups()), code=Success,
+    return CheckedResponse(msg=data, code=Success,
                            name=checkname)
+check_ios_homescreen.needs = HEAD
+check_ios_homescreen.verbose_name = _("May be added to iOS homescreen")
+check_ios_homescreen.preconditions = (successful, html)
 
 
 def check_html5_doctype(response):
-    checkname = _("HTML5 doctype")
-    copied_content = force_text(response.content.strip())
-    if not copied_content.startswith('<!doctype html>'):
+    checkname = check_html5_doctype.verbose_name
+    if html5_doctype_re.match(get_document(response).text) is None:
         return CheckedResponse(msg='Missing the HTML5 doctype, or it is not '
                                    'the first element in the document',
                                code=Error, name=checkname)
     return CheckedResponse(msg='yes', code=Success,
                            name=checkname)
+check_html5_doctype.needs = HEAD
+check_html5_doctype.verbose_name = _("HTML5 doctype")
+check_html5_doctype.preconditions = (successful, html)
 
 
 def check_allow_header(response):
-    checkname = _("Allows HTTP methods")
+    checkname = check_allow_header.verbose_name
     if 'Allow' in response:
         return CheckedResponse(msg=response['Allow'], code=Success,
                                name=checkname)
     return CheckedResponse(msg="Unknown", code=Info, name=checkname)
+check_allow_header.needs = HEADERS
+check_allow_header.verbose_name = _("Allows HTTP methods")
+check_allow_header.preconditions = (successful,)
 
 
 def check_csp_header(response):
-    checkname = _("Has content security policy")
+    checkname = check_csp_header.verbose_name
     if 'Content-Security-Policy' in response:
         header = response['Content-Security-Policy']
         unsafe_inline = 'unsafe-inline' in header
@@ -163,19 +268,25 @@ def check_csp_header(response):
     return CheckedResponse(msg="Missing Content-Security-Policy header, "
                                "anything is permitted", code=Caution,
                            name=checkname)
+check_csp_header.needs = HEADERS
+check_csp_header.verbose_name = _("Has content security policy")
+check_csp_header.preconditions = (successful,)
 
 
 def check_frameorigin_header(response):
-    checkname = _("Clickjacking via X-Frame-Options")
+    checkname = check_frameorigin_header.verbose_name
     if 'X-Frame-Options' in response:
         return CheckedResponse(msg=response['X-Frame-Options'], code=Success,
                                name=checkname)
     return CheckedResponse(msg="No X-Frame-Options set.", code=Error,
                            name=checkname)
+check_frameorigin_header.needs = HEADERS
+check_frameorigin_header.verbose_name = _("Clickjacking via X-Frame-Options")
+check_frameorigin_header.preconditions = (successful,)
 
 
 def check_content_type_nosniff_header(response):
-    checkname = _("Browser content-type sniffing")
+    checkname = check_content_type_nosniff_header.verbose_name
     if 'X-Content-Type-Options' in response:
         return CheckedResponse(msg=response['X-Content-Type-Options'],
                                code=Success,
@@ -184,25 +295,80 @@ def check_content_type_nosniff_header(response):
                                "sniff the stream to decide on a content-type",
                            code=Info,
                            name=checkname)
+check_content_type_nosniff_header.needs = HEADERS
+check_content_type_nosniff_header.verbose_name = _(
+    "Browser content-type sniffing")
+check_content_type_nosniff_header.preconditions = (successful,)
 
 
 def check_html_rel_home(response):
-    checkname = _("rel=home")
-    if 'rel="home"' not in force_text(response.content):
+    checkname = check_html_rel_home.verbose_name
+    count = get_document(response).text.count('rel="home"')
+    if count == 0:
         return CheckedResponse(msg='Missing rel="home" microformat',
                                code=Info, name=checkname)
-    count = force_text(response.content).count('rel="home"')
     return CheckedResponse(msg='{count} found'.format(count=count),
                            code=Success, name=checkname)
+check_html_rel_home.needs = BODY
+check_html_rel_home.verbose_name = _("rel=home")
+check_html_rel_home.preconditions = (successful, html)
 
 
 def check_html_schemaorg_breadcrumbs(response):
-    checkname = _("Schema.org breadcrumbs")
+    checkname = check_html_schemaorg_breadcrumbs.verbose_name
     breadcrumbs = 'itemtype="http://schema.org/Breadcrumb"'
-    breadcrumbs_found = breadcrumbs in force_text(response.content)
-    if not breadcrumbs_found:
+    count = get_document(response).text.count(breadcrumbs)
+    if count == 0:
         return CheckedResponse(msg="Doesn't have breadcrumbs itemtype",
                                code=Info, name=checkname)
-    count = force_text(response.content).count(breadcrumbs)
     return CheckedResponse(msg='{count} found'.format(count=count),
                            code=Success, name=checkname)
+check_html_schemaorg_breadcrumbs.needs = BODY
+check_html_schemaorg_breadcrumbs.verbose_name = _("Schema.org breadcrumbs")
+check_html_schemaorg_breadcrumbs.preconditions = (successful, html)
+
+
+def check_query_budget(response, context):
+    checkname = check_query_budget.verbose_name
+    if context is None or context.queries is None:
+        return CheckedResponse(msg="Unknown, as the view wasn't run in-process",
+                               code=Info, name=checkname)
+    budget = getattr(settings, 'SITEMAPCHECK_QUERY_BUDGET',
+                     SITEMAPCHECK_QUERY_BUDGET)
+    count = len(context.queries)
+    if count > budget:
+        msg = "{count:d} queries, over the budget of {budget:d}".format(
+            count=count, budget=budget)
+        return CheckedResponse(msg=msg, code=Caution, name=checkname)
+    return CheckedResponse(msg='{count:d} queries'.format(count=count),
+                           code=Success, name=checkname)
+check_query_budget.takes_context = True
+check_query_budget.needs = HEADERS
+check_query_budget.verbose_name = _("Database queries")
+
+
+def check_repeated_queries(response, context):
+    checkname = check_repeated_queries.verbose_name
+    if context is None or context.queries is None:
+        return CheckedResponse(msg="Unknown, as the view wasn't run in-process",
+                               code=Info, name=checkname)
+    limit = getattr(settings, 'SITEMAPCHECK_REPEATED_QUERY_LIMIT',
+                    SITEMAPCHECK_REPEATED_QUERY_LIMIT)
+    seen = {}
+    for query in context.queries:
+        sql = normalise_sql(query['sql'])
+        seen[sql] = seen.get(sql, 0) + 1
+    repeated = sorted(((count, sql) for sql, count in seen.items()
+                       if count > limit), reverse=True)
+    if repeated:
+        count, sql = repeated[0]
+        msg = ("{queries:d} queries repeated more than {limit:d} times, the "
+               "worst {count:d} times: {sql!s}".format(
+                   queries=len(repeated), limit=limit, count=count, sql=sql))
+        return CheckedResponse(msg=msg, code=Caution, name=checkname)
+    return CheckedResponse(msg="No query repeated more than {limit:d} "
+                               "times".format(limit=limit),
+                           code=Success, name=checkname)
+check_repeated_queries.takes_context = True
+check_repeated_queries.needs = HEADERS
+check_repeated_queries.verbose_name = _("Repeated queries (N+1)")
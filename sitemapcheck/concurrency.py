@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Deciding how many requests to have in flight at once when checking a site
+over HTTP, and how often to start one.
+
+With a fixed number, the server is either left idle or overloaded, and an
+overloaded server's slowness ends up in the times recorded for its pages.
+Adapting the number instead works as TCP does (additive increase,
+multiplicative decrease): it's raised slowly while responses come back in
+good time, and cut sharply as soon as they don't.
+"""
+import threading
+import time
+from timeit import default_timer
+from django.conf import settings
+from .settings import SITEMAPCHECK_LIVE_ADAPTIVE
+from .settings import SITEMAPCHECK_LIVE_CONCURRENCY
+from .settings import SITEMAPCHECK_LIVE_MIN_CONCURRENCY
+from .settings import SITEMAPCHECK_LIVE_MAX_CONCURRENCY
+from .settings import SITEMAPCHECK_LIVE_MAX_RATE
+from .settings import SITEMAPCHECK_LIVE_LATENCY_TOLERANCE
+
+
+# statuses saying the server has more than it can handle.
+CONGESTION_STATUSES = (429, 502, 503, 504)
+
+# how much the limit is cut by when the server is struggling.
+DECREASE = 0.75
+
+# how much weight each response's time to first byte is given in the running
+# average, and how far that average's best is pulled towards it each time,
+# so the best adjusts (slowly) to a server which has got slower for reasons
+# of its own.
+SMOOTHING = 0.2
+BASELINE_DRIFT = 0.01
+
+
+def get_concurrency(concurrency=None):
+    if concurrency is None:
+        concurrency = getattr(settings, 'SITEMAPCHECK_LIVE_CONCURRENCY',
+                              SITEMAPCHECK_LIVE_CONCURRENCY)
+    return int(concurrency)
+
+
+def use_adaptive_concurrency(requested=None):
+    if requested is not None:
+        return requested
+    return getattr(settings, 'SITEMAPCHECK_LIVE_ADAPTIVE',
+                   SITEMAPCHECK_LIVE_ADAPTIVE)
+
+
+def get_max_rate(max_rate=None):
+    if max_rate is None:
+        max_rate = getattr(settings, 'SITEMAPCHECK_LIVE_MAX_RATE',
+                           SITEMAPCHECK_LIVE_MAX_RATE)
+    return max_rate
+
+
+class ConcurrencyController(object):
+    """
+    Lets at most `limit` requests be in flight at once, starting no more
+    than `max_rate` a second, if given.
+
+    When `adaptive`, the limit starts at `initial` and grows by one for
+    every `limit` responses which come back in good time, and is cut by
+    DECREASE whenever one fails, says the server is overloaded, or the
+    average time to first byte grows past `tolerance` times its best; no
+    more than once per round trip, so the responses already on their way
+    when it's cut don't cut it again. It's kept between `floor` and
+    `ceiling`. Otherwise the limit is `initial`, throughout.
+    """
+    def __init__(self, initial, floor=1, ceiling=None, max_rate=None,
+                 adaptive=False, tolerance=None):
+        if not adaptive or ceiling is None:
+            ceiling = initial
+        if not adaptive:
+            floor = initial
+        if tolerance is None:
+            tolerance = getattr(settings,
+                                'SITEMAPCHECK_LIVE_LATENCY_TOLERANCE',
+                                SITEMAPCHECK_LIVE_LATENCY_TOLERANCE)
+        self.adaptive = adaptive
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = float(min(max(initial, self.floor), self.ceiling))
+        self.tolerance = tolerance
+        self.interval = 1.0 / max_rate if max_rate else 0
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.next_start = 0
+        self.smoothed = None
+        self.baseline = None
+        self.last_decrease = None
+        self.lowest = self.highest = self.limit
+
+    def acquire(self):
+        """
+        Waits until another request may start.
+        """
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            now = default_timer()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, status, ttfb):
+        """
+        Notes that a request has finished, with the given status and time
+        to first byte (both None if it failed).
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if self.adaptive:
+                self.adjust(status, ttfb)
+            self.condition.notify_all()
+
+    def congested(self, status):
+        if status is None or status in CONGESTION_STATUSES:
+            return True
+        return self.smoothed > self.baseline * self.tolerance
+
+    def adjust(self, status, ttfb):
+        if ttfb is not None and status not in CONGESTION_STATUSES:
+            if self.smoothed is None:
+                self.smoothed = ttfb
+            else:
+                self.smoothed += SMOOTHING * (ttfb - self.smoothed)
+            if self.baseline is None or self.smoothed < self.baseline:
+                self.baseline = self.smoothed
+            else:
+                self.baseline += BASELINE_DRIFT * (self.smoothed -
+                                                   self.baseline)
+        if self.congested(status):
+            now = default_timer()
+            if (self.last_decrease is None or
+                    now - self.last_decrease >= (self.smoothed or 0)):
+                self.limit = max(self.floor, self.limit * DECREASE)
+                self.last_decrease = now
+        else:
+            self.limit = min(self.ceiling, self.limit + 1.0 / self.limit)
+        self.lowest = min(self.lowest, self.limit)
+        self.highest = max(self.highest, self.limit)
+
+
+def get_controller(concurrency=None, adaptive=None, max_rate=None):
+    """
+    A controller as configured: when adaptive, starting from the configured
+    concurrency and kept between SITEMAPCHECK_LIVE_MIN_CONCURRENCY and
+    SITEMAPCHECK_LIVE_MAX_CONCURRENCY.
+    """
+    adaptive = use_adaptive_concurrency(adaptive)
+    floor = getattr(settings, 'SITEMAPCHECK_LIVE_MIN_CONCURRENCY',
+                    SITEMAPCHECK_LIVE_MIN_CONCURRENCY)
+    ceiling = getattr(settings, 'SITEMAPCHECK_LIVE_MAX_CONCURRENCY',
+                      SITEMAPCHECK_LIVE_MAX_CONCURRENCY)
+    return ConcurrencyController(get_concurrency(concurrency), floor=floor,
+                                 ceiling=ceiling,
+                                 max_rate=get_max_rate(max_rate),
+                                 adaptive=adaptive)
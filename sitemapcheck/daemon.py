@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Keeping the project loaded, its sitemaps found and a pool of workers started
+between runs: `sitemapcheck_daemon` listens on a Unix socket for batches of
+paths (or whole sitemap sections) to check, and streams the results back to
+`sitemapcheck_client`, which writes them up as `sitemapcheck` would.
+
+Each connection is one batch: a line of JSON asking for the paths and
+sections, answered by a line of JSON per result as each is checked, then one
+saying how many there were, or what was wrong with the request. Batches are
+checked one at a time, each with every worker.
+
+The workers are forked once the project is loaded, so the daemon has to be
+restarted to pick up changes to the code.
+"""
+import itertools
+import json
+import os
+import shutil
+import socket
+import tempfile
+from django.conf import settings
+from django.db import connections
+from django.test import Client
+from django.utils import six
+from .links import check_internal_links
+from .links import get_link_database
+from .links import use_link_database
+from .registry import get_checks
+from .settings import SITEMAPCHECK_DAEMON_SOCKET
+from .timeouts import get_retries
+from .timeouts import get_retry_backoff
+from .timeouts import get_timeout
+from .timeouts import is_transient
+from .utils import Response
+from .utils import _give_up_request
+from .utils import get_chunksize
+from .utils import get_max_in_flight
+from .utils import get_processes
+from .utils import get_view_sitemaps
+from .utils import handle_request_response
+from .utils import init_worker
+from .utils import sitemap_request_iterator
+from .utils import sitemap_section_urls_iterator
+from .workers import WorkerPool
+
+
+class DaemonError(Exception):
+    """
+    What the daemon found wrong with a request, or that there's no daemon
+    to send it to.
+    """
+
+
+def get_socket_path(path=None):
+    if path is None:
+        path = getattr(settings, 'SITEMAPCHECK_DAEMON_SOCKET',
+                       SITEMAPCHECK_DAEMON_SOCKET)
+    return path
+
+
+def close_connections():
+    # forked workers mustn't share the parent's database connections, and
+    # the daemon shouldn't hold on to them between batches.
+    for connection in connections.all():
+        connection.close()
+
+
+def claim_socket(path):
+    """
+    Removes the socket left at `path` by a daemon which has since stopped,
+    raising DaemonError if one is still listening on it.
+    """
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except socket.error:
+        os.remove(path)
+    else:
+        msg = ("A sitemapcheck daemon is already listening on "
+               "`{path!s}`".format(path=path))
+        raise DaemonError(msg)
+    finally:
+        probe.close()
+
+
+def check_in_daemon(task):
+    """
+    Checks a URL in one of the daemon's workers, first switching to the
+    link database for its batch, so that no link's status is carried over
+    from one batch to the next.
+    """
+    handler, path, lastmod, previous, links = task
+    if links != get_link_database():
+        use_link_database(links)
+    return handle_request_response(handler, path, lastmod=lastmod,
+                                   previous=previous)
+
+
+def send(fileobj, message):
+    fileobj.write((json.dumps(message) + '\n').encode('utf-8'))
+
+
+class DaemonRequestHandler(six.moves.socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line.strip():
+            # only seeing whether anything is listening.
+            return
+        try:
+            request = json.loads(line.decode('utf-8'))
+        except ValueError:
+            request = None
+        if not isinstance(request, dict):
+            send(self.wfile, {'error': "Expected a JSON object"})
+            return
+        count = 0
+        results = None
+        try:
+            results = self.server.check(request)
+            for result in results:
+                send(self.wfile, {'result': result.as_dict()})
+                count += 1
+        except socket.error:
+            # the client went away part way through.
+            pass
+        except DaemonError as e:
+            send(self.wfile, {'error': six.text_type(e)})
+        except Exception as e:
+            send(self.wfile, {'error': "{cls!s}: {error!s}".format(
+                cls=e.__class__.__name__, error=e)})
+            # for the daemon's own output.
+            raise
+        else:
+            send(self.wfile, {'done': count})
+        finally:
+            if results is not None:
+                results.close()
+
+
+class CheckerDaemon(six.moves.socketserver.UnixStreamServer):
+    """
+    Checks each batch sent to the Unix socket at `path` with a pool of
+    `processes` workers, which are started once, with the checks loaded and
+    the sitemaps found, and kept until the daemon is closed.
+    """
+    def __init__(self, path, processes=None):
+        claim_socket(path)
+        six.moves.socketserver.UnixStreamServer.__init__(
+            self, path, DaemonRequestHandler, bind_and_activate=False)
+        self.path = path
+        get_checks()
+        view_sitemaps = get_view_sitemaps()
+        self.sitemaps = view_sitemaps.sitemaps
+        close_connections()
+        self.processes = get_processes(processes)
+        self.pool = WorkerPool(self.processes, check_in_daemon,
+                               initializer=init_worker, initargs=(Client,),
+                               should_retry=is_transient,
+                               give_up=_give_up_request)
+        # before listening, so the workers don't have the socket too.
+        self.pool.start()
+        try:
+            self.server_bind()
+            self.server_activate()
+        except Exception:
+            self.pool.close()
+            self.socket.close()
+            raise
+
+    def prepare(self, request):
+        """
+        The prepared requests for the paths and sitemap sections asked for.
+        """
+        sections = request.get('sections') or ()
+        for section in sections:
+            if self.sitemaps is None or section not in self.sitemaps:
+                msg = "No sitemap section named `{section!s}`".format(
+                    section=section)
+                raise DaemonError(msg)
+        paths = ({'location': path} for path in request.get('paths') or ())
+        listed = sitemap_section_urls_iterator(
+            dict((section, self.sitemaps[section]) for section in sections))
+        return sitemap_request_iterator(itertools.chain(paths, listed))
+
+    def check(self, request):
+        """
+        Yields the result for each URL in the request as it's checked. A
+        request is a dictionary of `paths` and `sections` to check, and
+        optionally the `timeout` and `retries` to use.
+        """
+        prepared_requests = self.prepare(request)
+        self.pool.timeout = get_timeout(request.get('timeout'))
+        self.pool.retries = get_retries(request.get('retries'))
+        self.pool.backoff = get_retry_backoff()
+        link_directory = None
+        links = None
+        if check_internal_links in get_checks():
+            link_directory = tempfile.mkdtemp(prefix='sitemapcheck_links_')
+            links = os.path.join(link_directory, 'links.sqlite3')
+            use_link_database(links)
+        chunksize = get_chunksize()
+        tasks = ((x.handler, x.path, x.lastmod, x.previous, links)
+                 for x in prepared_requests)
+        try:
+            for result in self.pool.stream(
+                    tasks, chunksize,
+                    get_max_in_flight(self.processes, chunksize)):
+                yield result
+        finally:
+            close_connections()
+            if link_directory is not None:
+                use_link_database(None)
+                shutil.rmtree(link_directory)
+
+    def server_close(self):
+        six.moves.socketserver.UnixStreamServer.server_close(self)
+        self.pool.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def request_checks(paths=(), sections=(), path=None, timeout=None,
+                   retries=None):
+    """
+    Has the daemon listening at `path` check the paths and sitemap
+    sections, yielding each result as it arrives, and raising DaemonError
+    if the daemon can't be reached or refuses the request.
+    """
+    path = get_socket_path(path)
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(path)
+    except socket.error as e:
+        connection.close()
+        msg = ("No sitemapcheck daemon is listening on `{path!s}` "
+               "({error!s}); start one with `manage.py "
+               "sitemapcheck_daemon`".format(path=path, error=e))
+        raise DaemonError(msg)
+    try:
+        request = {'paths': list(paths), 'sections': list(sections),
+                   'timeout': timeout, 'retries': retries}
+        connection.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        reader = connection.makefile('rb')
+        while True:
+            line = reader.readline()
+            if not line:
+                raise DaemonError("The daemon stopped part way through")
+            message = json.loads(line.decode('utf-8'))
+            if 'result' in message:
+                yield Response.from_dict(message['result'])
+            elif 'error' in message:
+                raise DaemonError(message['error'])
+            else:
+                return
+    finally:
+        connection.close()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Dropping URLs which have already been seen, so a path listed in several
+sitemap sections is only requested & checked once.
+
+Paths are remembered exactly until there are more than a set number of them,
+after which they're moved into Bloom filters, which take a fixed number of
+bits per path however long it is, at the cost of occasionally mistaking a
+new path for one already seen.
+"""
+import hashlib
+import math
+import re
+import struct
+from django.conf import settings
+from django.utils.encoding import force_bytes
+from .settings import SITEMAPCHECK_DEDUPLICATE
+from .settings import SITEMAPCHECK_DEDUP_EXACT_LIMIT
+from .settings import SITEMAPCHECK_DEDUP_ERROR_RATE
+
+
+repeated_slashes_re = re.compile(r'/{2,}')
+percent_escape_re = re.compile(r'%[0-9a-fA-F]{2}')
+
+
+def normalise_path(path):
+    """
+    The form of a path compared when looking for duplicates: repeated
+    slashes collapsed, and percent escapes in upper case.
+    """
+    path = repeated_slashes_re.sub('/', path or '/')
+    path = percent_escape_re.sub(lambda match: match.group(0).upper(), path)
+    if not path.startswith('/'):
+        path = '/' + path
+    return path
+
+
+class BloomFilter(object):
+    """
+    Sized to hold `capacity` items with a false positive rate of at most
+    `error_rate`; each item's bits are found by double hashing the two
+    halves of its MD5.
+    """
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        bits = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.size = max(8, int(math.ceil(bits)))
+        self.hashes = max(1, int(round(self.size / float(capacity) *
+                                       math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.md5(force_bytes(item)).digest()
+        first, second = struct.unpack('>QQ', digest)
+        for number in range(self.hashes):
+            yield (first + number * second) % self.size
+
+    def __contains__(self, item):
+        for position in self.positions(item):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+class SeenPaths(object):
+    """
+    Remembers paths in a set until there are more than `exact_limit`, then
+    in a series of Bloom filters, each four times the size of the last and
+    with half its error rate, so the overall false positive rate stays below
+    `error_rate` however many paths are added.
+    """
+    growth = 4
+    tightening = 0.5
+
+    def __init__(self, exact_limit=None, error_rate=None):
+        if exact_limit is None:
+            exact_limit = getattr(settings, 'SITEMAPCHECK_DEDUP_EXACT_LIMIT',
+                                  SITEMAPCHECK_DEDUP_EXACT_LIMIT)
+        if error_rate is None:
+            error_rate = getattr(settings, 'SITEMAPCHECK_DEDUP_ERROR_RATE',
+                                 SITEMAPCHECK_DEDUP_ERROR_RATE)
+        self.exact_limit = exact_limit
+        self.error_rate = error_rate
+        self.exact = set()
+        self.filters = []
+
+    @property
+    def probabilistic(self):
+        return self.exact is None
+
+    def __contains__(self, path):
+        if self.exact is not None:
+            return path in self.exact
+        for bloom in self.filters:
+            if path in bloom:
+                return True
+        return False
+
+    def grow(self):
+        if self.filters:
+            last = self.filters[-1]
+            capacity = last.capacity * self.growth
+            error_rate = last.error_rate * self.tightening
+        else:
+            capacity = max(1, self.exact_limit) * self.growth
+            error_rate = self.error_rate * self.tightening
+        self.filters.append(BloomFilter(capacity, error_rate))
+
+    def add(self, path):
+        if self.exact is not None:
+            self.exact.add(path)
+            if len(self.exact) <= self.exact_limit:
+                return
+            exact, self.exact = self.exact, None
+            self.grow()
+            for seen in exact:
+                self.filters[-1].add(seen)
+            return
+        if self.filters[-1].full:
+            self.grow()
+        self.filters[-1].add(path)
+
+
+def use_deduplication(requested=None):
+    if requested is not None:
+        return requested
+    return getattr(settings, 'SITEMAPCHECK_DEDUPLICATE',
+                   SITEMAPCHECK_DEDUPLICATE)
+
+
+class Deduplicator(object):
+    """
+    Counts, for each sitemap section, how many of its URLs were dropped as
+    having been listed already (in it, or any section before it).
+    """
+    def __init__(self, seen=None):
+        if seen is None:
+            seen = SeenPaths()
+        self.seen = seen
+        self.duplicates = {}
+
+    def filtering(self, prepared_requests):
+        """
+        Passes through each prepared request whose path hasn't been seen.
+        """
+        for prepared in prepared_requests:
+            path = normalise_path(prepared.path)
+            if path in self.seen:
+                section = prepared.section
+                self.duplicates[section] = self.duplicates.get(section, 0) + 1
+                continue
+            self.seen.add(path)
+            yield prepared
+
+    @property
+    def total(self):
+        return sum(self.duplicates.values())
+
+    def rows(self):
+        """
+        (section, duplicates) for each section with any, by section name.
+        """
+        return sorted(self.duplicates.items(),
+                      key=lambda row: (row[0] is None, row[0] or ''))
+
+    def as_dict(self):
+        # as pairs, since a URL needn't have a section.
+        return {'duplicates': [list(row) for row in self.rows()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        The counts of a Deduplicator written out with as_dict, without the
+        paths it saw.
+        """
+        duplicates = cls()
+        duplicates.duplicates = dict(
+            (section, count) for section, count in data['duplicates'])
+        return duplicates
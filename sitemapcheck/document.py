@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import re
+from django.utils.encoding import force_text
+from .body import read_body
+
+
+DEFAULT_RE_FLAGS = re.DOTALL | re.IGNORECASE | re.MULTILINE
+title_re = re.compile(r'<title>(.+?)</title>', flags=DEFAULT_RE_FLAGS)
+head_start_re = re.compile(r'<head(?:\s[^>]*)?>', flags=DEFAULT_RE_FLAGS)
+head_end_re = re.compile(r'</head\s*>', flags=DEFAULT_RE_FLAGS)
+# matches <meta ...> and <link ...>, allowing for quoted attribute values
+# which themselves contain a `>`
+tag_re = re.compile(r'<(meta|link)\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)/?>',
+                    flags=DEFAULT_RE_FLAGS)
+attr_re = re.compile(r'([^\s"\'=<>/]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|'
+                     r'([^\s"\'=<>`]+)))?', flags=DEFAULT_RE_FLAGS)
+
+DOCUMENT_ATTRIBUTE = '_sitemapcheck_document'
+
+
+def parse_attributes(attrs):
+    parsed = {}
+    for match in attr_re.finditer(attrs):
+        name, dquoted, squoted, unquoted = match.groups()
+        name = name.lower()
+        if name in parsed:
+            continue
+        for value in (dquoted, squoted, unquoted):
+            if value is not None:
+                break
+        else:
+            value = ''
+        parsed[name] = value
+    return parsed
+
+
+class Document(object):
+    """
+    The decoded body of a response, scanned once up front so that
+    every check can look things up without decoding or searching the
+    whole body again.
+    """
+    __slots__ = ('text', 'head_start', 'head_end', 'title', 'tags')
+
+    def __init__(self, text):
+        self.text = text
+        start = head_start_re.search(text)
+        self.head_start = 0 if start is None else start.start()
+        end = head_end_re.search(text, self.head_start)
+        self.head_end = len(text) if end is None else end.end()
+        head = self.head
+        title = title_re.search(head)
+        self.title = None if title is None else title.group(1)
+        self.tags = {'meta': [], 'link': []}
+        for tag in tag_re.finditer(head):
+            tagname, attrs = tag.groups()
+            self.tags[tagname.lower()].append(parse_attributes(attrs))
+
+    @classmethod
+    def from_response(cls, response):
+        return cls.from_body(read_body(response))
+
+    @classmethod
+    def from_body(cls, body):
+        """
+        From a ReadBody; where only part of the body was kept, it may end
+        part way through a character.
+        """
+        whole = body.length is not None and body.length == len(body.content)
+        errors = 'strict' if whole else 'ignore'
+        return cls(text=force_text(body.content, errors=errors))
+
+    @property
+    def head(self):
+        return self.text[self.head_start:self.head_end]
+
+    def find(self, tagname, attr, value):
+        value = value.lower()
+        for attrs in self.tags.get(tagname, ()):
+            if attrs.get(attr, '').lower() == value:
+                return attrs
+        return None
+
+    def meta(self, name):
+        """
+        Returns the `content` of the first `<meta name="...">` or None
+        """
+        attrs = self.find('meta', 'name', name)
+        if attrs is None:
+            return None
+        return attrs.get('content') or None
+
+    def meta_charset(self):
+        for attrs in self.tags['meta']:
+            if attrs.get('charset'):
+                return attrs['charset']
+        return None
+
+    def link(self, rel):
+        """
+        Returns the `href` of the first `<link rel="...">` or None
+        """
+        attrs = self.find('link', 'rel', rel)
+        if attrs is None:
+            return None
+        return attrs.get('href') or None
+
+
+def get_document(response):
+    """
+    Fetches the Document for the given response, building it on first access
+    and remembering it on the response, so checks called one after another
+    share the same one.
+    """
+    document = getattr(response, DOCUMENT_ATTRIBUTE, None)
+    if document is None:
+        document = Document.from_response(response)
+        setattr(response, DOCUMENT_ATTRIBUTE, document)
+    return document
+
+
+def set_document(response, document):
+    setattr(response, DOCUMENT_ATTRIBUTE, document)
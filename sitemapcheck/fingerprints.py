@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+A local SQLite database of what each URL looked like on the last run, so that
+later runs can skip or cheaply re-validate URLs which haven't changed, and
+reuse their check results.
+"""
+import json
+import sqlite3
+import threading
+from django.conf import settings
+from .settings import SITEMAPCHECK_FINGERPRINT_DATABASE
+from .utils import Fingerprint
+from .utils import Response
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sitemapcheck_fingerprint (
+    path TEXT PRIMARY KEY,
+    lastmod TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    headers_hash TEXT,
+    checks_hash TEXT,
+    result TEXT NOT NULL
+)
+"""
+
+
+def get_fingerprint_database():
+    return getattr(settings, 'SITEMAPCHECK_FINGERPRINT_DATABASE',
+                   SITEMAPCHECK_FINGERPRINT_DATABASE)
+
+
+def dump_result(result):
+    data = result.as_dict()
+    # kept in their own columns, and meaningless on a later run.
+    for key in ('path', 'fingerprint', 'elapsed', 'reused', 'timings',
+                'check_times'):
+        del data[key]
+    return json.dumps(data)
+
+
+def load_result(path, fingerprint, data):
+    data = json.loads(data)
+    data.update(path=path, fingerprint=list(fingerprint))
+    return Response.from_dict(data)
+
+
+class FingerprintStore(object):
+    """
+    Only ever used from the process running the command, though possibly from
+    more than one of its threads (the pool's task feeder reads from it while
+    the command writes results to it), hence the lock.
+    """
+    def __init__(self, path, commit_every=500):
+        self.path = path
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        columns = [row[1] for row in self.connection.execute(
+            "PRAGMA table_info(sitemapcheck_fingerprint)")]
+        if columns and 'checks_hash' not in columns:
+            # written by an earlier version, without what's needed to tell
+            # whether its results still hold; they'll all be checked again.
+            self.connection.execute("DROP TABLE sitemapcheck_fingerprint")
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+    def get(self, path):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT lastmod, etag, last_modified, content_hash, "
+                "headers_hash, checks_hash, result "
+                "FROM sitemapcheck_fingerprint WHERE path = ?",
+                (path,)).fetchone()
+        if row is None:
+            return None
+        fingerprint = Fingerprint(*row[:6])
+        return load_result(path, fingerprint, row[6])
+
+    def put(self, result):
+        if result.fingerprint is None:
+            # couldn't be fetched, so there's nothing worth remembering.
+            return
+        fingerprint = result.fingerprint
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sitemapcheck_fingerprint "
+                "(path, lastmod, etag, last_modified, content_hash, "
+                "headers_hash, checks_hash, result) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (result.path, fingerprint.lastmod, fingerprint.etag,
+                 fingerprint.last_modified, fingerprint.content_hash,
+                 fingerprint.headers_hash, fingerprint.checks_hash,
+                 dump_result(result)))
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_every:
+                self.connection.commit()
+                self.uncommitted = 0
+
+    def with_previous(self, prepared_requests):
+        """
+        Attaches the stored result, if any, to each prepared request.
+        """
+        for prepared in prepared_requests:
+            yield prepared._replace(previous=self.get(prepared.path))
+
+    def recording(self, results):
+        """
+        Passes through each result, storing it as it goes.
+        """
+        try:
+            for result in results:
+                self.put(result)
+                yield result
+        finally:
+            self.close()
+
+    def close(self):
+        with self.lock:
+            self.connection.commit()
+            self.connection.close()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Measuring what it cost to produce a response in-process: the database queries
+it ran, and how long was spent rendering templates.
+"""
+import re
+import threading
+from timeit import default_timer
+from django.db import connections
+from django.template.base import Template
+from django.test.utils import CaptureQueriesContext
+
+
+_local = threading.local()
+
+# the literal values which vary between otherwise identical queries.
+sql_string_re = re.compile(r"'(?:[^']|'')*'")
+sql_number_re = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+sql_in_list_re = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)',
+                            flags=re.IGNORECASE)
+sql_whitespace_re = re.compile(r'\s+')
+
+
+def normalise_sql(sql):
+    """
+    Replaces the strings, numbers and IN (...) lists in a query with
+    placeholders, so queries differing only in their parameters compare
+    equal.
+    """
+    sql = sql_string_re.sub('?', sql)
+    sql = sql_number_re.sub('?', sql)
+    sql = sql_in_list_re.sub('IN (...)', sql)
+    return sql_whitespace_re.sub(' ', sql).strip()
+
+
+def timed_render(render):
+    """
+    Wraps a Template._render so the time spent in it is added to the
+    recorder active in this thread, if there is one.
+    """
+    def _render(self, context):
+        recorder = getattr(_local, 'recorder', None)
+        if recorder is None or recorder.rendering:
+            # not being instrumented, or an {% include %} or {% extends %}
+            # within a template whose time is already being counted.
+            return render(self, context)
+        recorder.rendering = True
+        started = default_timer()
+        try:
+            return render(self, context)
+        finally:
+            recorder.render_time += default_timer() - started
+            recorder.rendering = False
+    _render.sitemapcheck_timer = True
+    return _render
+
+
+def clear_queries(connection):
+    """
+    Empties the connection's log of the queries it ran.
+    """
+    queries_log = getattr(connection, 'queries_log', None)
+    if queries_log is not None:
+        # Django 1.8+, where `queries` is a copy of this.
+        queries_log.clear()
+    else:
+        connection.queries = []
+
+
+def install_render_timer():
+    """
+    Wraps Template._render (as the test runner's own instrumentation does),
+    if it isn't already; anything else wrapping it later (setting up the test
+    environment, for example) keeps calling through to this.
+    """
+    if not getattr(Template._render, 'sitemapcheck_timer', False):
+        Template._render = timed_render(Template._render)
+
+
+class Instrumentation(object):
+    """
+    Used as a context manager around fetching a response, records every
+    query run against each database, and the total time spent rendering
+    templates, in this thread.
+
+    Each connection's own log of queries is emptied on the way out, having
+    been copied; otherwise, with CaptureQueriesContext keeping
+    reset_queries from running as each request starts, it would grow for as
+    long as the worker lives.
+    """
+    def __init__(self, using=None):
+        if using is None:
+            using = list(connections)
+        self.captures = [CaptureQueriesContext(connections[alias])
+                         for alias in using]
+        self.captured = None
+        self.render_time = 0.0
+        self.rendering = False
+
+    def __enter__(self):
+        install_render_timer()
+        for capture in self.captures:
+            capture.__enter__()
+        _local.recorder = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.recorder = None
+        for capture in reversed(self.captures):
+            capture.__exit__(exc_type, exc_value, traceback)
+        self.captured = self.queries
+        for capture in self.captures:
+            clear_queries(capture.connection)
+
+    @property
+    def queries(self):
+        """
+        Every query run, as dictionaries of `sql` and `time` (in seconds).
+        """
+        if self.captured is not None:
+            return self.captured
+        queries = []
+        for capture in self.captures:
+            queries.extend(capture.captured_queries)
+        return queries
+
+    @property
+    def query_time(self):
+        return sum(float(query.get('time') or 0) for query in self.queries)
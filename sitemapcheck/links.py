@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+Checking the internal links on each page: the targets of its `<a href>`,
+`<link href>` and `<script src>` which are on the same site.
+
+Every distinct target is only fetched once per run, however many pages link
+to it. Its status is kept in a cache which, during a run, is a SQLite
+database shared by every worker process; whichever first claims a target
+fetches it, and the others wait for its status. Outside of a run (eg: when
+the check is called directly) the cache is this process' alone.
+
+Static and media files, which Django doesn't serve itself outside of
+development, are checked for by whether the file exists, rather than
+requested, when checking in-process.
+"""
+import os
+import re
+import socket
+import sqlite3
+import threading
+import time
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.urlresolvers import resolve, Resolver404
+from django.test import Client
+from django.utils import six
+from django.utils.translation import ugettext_lazy as _
+from .body import BODY
+from .checks import CheckedResponse
+from .checks import Error
+from .checks import Info
+from .checks import Success
+from .checks import html
+from .checks import successful
+from .document import DEFAULT_RE_FLAGS
+from .document import get_document
+from .document import parse_attributes
+from .remote import ConnectionPool
+from .remote import http_client
+from .settings import SITEMAPCHECK_LIVE_TIMEOUT
+from .timeouts import URLTimeout
+from .utils import get_request_site
+from .utils import get_worker_client
+
+
+urlsplit = six.moves.urllib_parse.urlsplit
+urljoin = six.moves.urllib_parse.urljoin
+unquote = six.moves.urllib_parse.unquote
+
+# the tags followed, and the attribute of each holding the target.
+LINK_ATTRIBUTES = {'a': 'href', 'link': 'href', 'script': 'src'}
+link_tag_re = re.compile(r'<(a|link|script)\b'
+                         r'((?:[^>"\']|"[^"]*"|\'[^\']*\')*)/?>',
+                         flags=DEFAULT_RE_FLAGS)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sitemapcheck_link (
+    target TEXT PRIMARY KEY,
+    status INTEGER
+)
+"""
+
+# stored for a target which couldn't be fetched at all, as NULL marks one
+# claimed but not fetched yet.
+UNFETCHABLE = -1
+
+# how long to wait on another process to fetch a target it has claimed,
+# before giving up and fetching it too.
+CLAIM_TIMEOUT = 30
+
+
+def extract_links(text):
+    """
+    The target of every link in the text, in the order they appear.
+    """
+    for match in link_tag_re.finditer(text):
+        tagname, attrs = match.groups()
+        target = parse_attributes(attrs).get(LINK_ATTRIBUTES[tagname.lower()])
+        if target:
+            yield target.strip()
+
+
+def internal_target(href, page, hosts):
+    """
+    The path (and query string) of the link on `page` to `href` if it's to
+    one of `hosts` (or relative), otherwise None.
+    """
+    parts = urlsplit(urljoin(page, href))
+    if parts.scheme not in ('', 'http', 'https'):
+        # mailto:, javascript:, data:, etc.
+        return None
+    if parts.netloc and parts.hostname not in hosts:
+        return None
+    target = parts.path or '/'
+    if parts.query:
+        target += '?' + parts.query
+    return target
+
+
+def is_broken(status):
+    return status is None or status >= 400
+
+
+class LinkStatusCache(object):
+    """
+    The status of each link target seen, backed by the SQLite database at
+    `path`, if given, which other processes may be reading & writing too;
+    recently seen targets are also remembered in this process, up to
+    `remember` of them.
+    """
+    def __init__(self, path=None, remember=10000):
+        self.path = path
+        self.remember = remember
+        self.recent = {}
+        self.connection = None
+        if path is not None:
+            # autocommit, so claims & statuses are seen by the other
+            # processes straight away. Only the thread which opened it uses
+            # it, but when checking over HTTP it's closed from another once
+            # the run is over.
+            self.connection = sqlite3.connect(path, timeout=CLAIM_TIMEOUT,
+                                              isolation_level=None,
+                                              check_same_thread=False)
+            self.connection.execute(SCHEMA)
+
+    def remembered(self, target, status):
+        if len(self.recent) >= self.remember:
+            self.recent.clear()
+        self.recent[target] = status
+        return status
+
+    def stored(self, target):
+        row = self.connection.execute(
+            "SELECT status FROM sitemapcheck_link WHERE target = ?",
+            (target,)).fetchone()
+        if row is None:
+            return False, None
+        return True, row[0]
+
+    def put(self, target, status):
+        """
+        Records the status of a target found some other way, eg: a page in
+        the sitemap, which was fetched anyway.
+        """
+        if self.connection is not None:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sitemapcheck_link (target, status) "
+                "VALUES (?, ?)",
+                (target, UNFETCHABLE if status is None else status))
+        self.remembered(target, status)
+
+    def status(self, target, fetch):
+        """
+        The status of the target, calling `fetch(target)` for it only if no
+        process has done so already.
+        """
+        if target in self.recent:
+            return self.recent[target]
+        if self.connection is None:
+            return self.remembered(target, fetch(target))
+        found, status = self.stored(target)
+        if not found:
+            claimed = self.connection.execute(
+                "INSERT OR IGNORE INTO sitemapcheck_link (target, status) "
+                "VALUES (?, NULL)", (target,)).rowcount
+            if claimed:
+                try:
+                    status = fetch(target)
+                except BaseException:
+                    # given up on, so leave it for another to fetch.
+                    self.connection.execute(
+                        "DELETE FROM sitemapcheck_link "
+                        "WHERE target = ? AND status IS NULL", (target,))
+                    raise
+                self.put(target, status)
+                return status
+        waited = 0.0
+        delay = 0.005
+        while status is None and waited < CLAIM_TIMEOUT:
+            time.sleep(delay)
+            waited += delay
+            delay = min(delay * 2, 0.5)
+            found, status = self.stored(target)
+        if status is None:
+            # whoever claimed it has gone away, or is taking far too long.
+            status = fetch(target)
+            self.put(target, status)
+            return status
+        return self.remembered(target,
+                               None if status == UNFETCHABLE else status)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+# the database for the run, set by the command before any workers start, and
+# the cache opened on it by each process (and thread, when checking over
+# HTTP).
+_link_database = {'path': None, 'base_url': None, 'hosts': None}
+_link_caches = {}
+# the connections each process & thread fetches targets over, when checking
+# over HTTP.
+_link_pools = {}
+
+
+def use_link_database(path, base_url=None):
+    """
+    Shares link statuses through the database at `path` (or not at all, if
+    None) for the rest of the run, fetching them from `base_url` if given,
+    rather than with the test Client.
+    """
+    if path is not None:
+        connection = sqlite3.connect(path)
+        try:
+            # lets the workers read while one of them writes.
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(SCHEMA)
+        finally:
+            connection.close()
+    _link_database.update(path=path, base_url=base_url, hosts=None)
+    for cache in _link_caches.values():
+        cache.close()
+    _link_caches.clear()
+    for pool in _link_pools.values():
+        pool.close()
+    _link_pools.clear()
+
+
+def get_link_database():
+    return _link_database['path']
+
+
+def get_link_cache():
+    # a connection mustn't be used by more than the process & thread which
+    # opened it.
+    key = (os.getpid(), threading.current_thread().ident,
+           _link_database['path'])
+    if key not in _link_caches:
+        _link_caches[key] = LinkStatusCache(_link_database['path'])
+    return _link_caches[key]
+
+
+def get_internal_hosts():
+    """
+    The hosts whose links are followed: the current Site's, the test
+    Client's, and that of the site being checked over HTTP, if it is.
+    """
+    hosts = _link_database['hosts']
+    if hosts is None:
+        hosts = set(['testserver', get_request_site().domain])
+        base_url = _link_database['base_url']
+        if base_url is not None:
+            hosts.add(urlsplit(base_url).hostname)
+        _link_database['hosts'] = hosts
+    return hosts
+
+
+def fetch_link_status(target):
+    """
+    The status code of the target, without fetching it when it obviously
+    doesn't exist, or None if it couldn't be fetched.
+    """
+    base_url = _link_database['base_url']
+    if base_url is not None:
+        return fetch_live_link_status(base_url, target)
+    path = urlsplit(target).path
+    try:
+        resolve(path)
+    except Resolver404:
+        return stored_file_status(path)
+    client = get_worker_client(Client)
+    client.cookies.clear()
+    try:
+        return client.get(target).status_code
+    except URLTimeout:
+        # the page's time ran out while fetching it, which says nothing
+        # about the target.
+        raise
+    except Exception:
+        # the test Client raises whatever the view did, where a server
+        # would have responded with an error.
+        return 500
+
+
+def static_file_exists(name):
+    if finders.find(name):
+        return True
+    try:
+        return staticfiles_storage.exists(name)
+    except ImproperlyConfigured:
+        # no STATIC_ROOT to have collected them into.
+        return False
+
+
+def stored_file_status(path):
+    """
+    The status of a path the URLconf doesn't serve: that of the static or
+    media file it's for, as those are served by the web server rather than
+    Django (outside of development), otherwise 404.
+    """
+    for url, exists in ((settings.STATIC_URL, static_file_exists),
+                        (settings.MEDIA_URL, default_storage.exists)):
+        prefix = urlsplit(url or '').path
+        if prefix.startswith('/') and path.startswith(prefix):
+            name = unquote(path[len(prefix):])
+            if name and exists(name):
+                return 200
+            return 404
+    return 404
+
+
+def fetch_live_link_status(base_url, target):
+    key = (os.getpid(), threading.current_thread().ident, base_url)
+    if key not in _link_pools:
+        timeout = getattr(settings, 'SITEMAPCHECK_LIVE_TIMEOUT',
+                          SITEMAPCHECK_LIVE_TIMEOUT)
+        _link_pools[key] = ConnectionPool(base_url, size=1, timeout=timeout)
+    try:
+        return _link_pools[key].request(target)[0]
+    except (URLTimeout, http_client.HTTPException, socket.error):
+        return None
+
+
+def check_internal_links(response, context):
+    checkname = check_internal_links.verbose_name
+    cache = get_link_cache()
+    path = getattr(context, 'path', None)
+    if path is None:
+        return CheckedResponse(msg="Unknown, without the page's path",
+                               code=Info, name=checkname)
+    # the page itself was fetched anyway, so needn't be again.
+    cache.put(path, response.status_code)
+    hosts = get_internal_hosts()
+    targets = []
+    seen = set()
+    for href in extract_links(get_document(response).text):
+        target = internal_target(href, path, hosts)
+        if target is not None and target not in seen:
+            seen.add(target)
+            targets.append(target)
+    broken = []
+    for target in targets:
+        status = cache.status(target, fetch_link_status)
+        if is_broken(status):
+            broken.append((target, status))
+    if broken:
+        msg = "{count:d} of {total:d} internal links broken: {links!s}".format(
+            count=len(broken), total=len(targets), links=', '.join(
+                '{target!s} ({status!s})'.format(
+                    target=target,
+                    status='unreachable' if status is None else status)
+                for target, status in broken))
+        return CheckedResponse(msg=msg, code=Error, name=checkname)
+    return CheckedResponse(msg="{total:d} internal links OK".format(
+        total=len(targets)), code=Success, name=checkname)
+check_internal_links.verbose_name = _("Internal links")
+check_internal_links.takes_context = True
+check_internal_links.needs = BODY
+check_internal_links.preconditions = (successful, html)
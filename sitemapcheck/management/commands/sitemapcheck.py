@@ -2,86 +2,493 @@
 from __future__ import absolute_import
 from django.template.defaultfilters import pluralize
 from django.utils.encoding import force_text
-from django.utils import six
 from django.utils.safestring import mark_safe
+from optparse import make_option
+import itertools
 import os
+import shutil
 import sys
+import tempfile
+from django.core.exceptions import ImproperlyConfigured
 from django.core.management import BaseCommand
 from sitemapcheck.checks import Error
 from sitemapcheck.checks import Caution
 from sitemapcheck.checks import Success
 from sitemapcheck.checks import Info
+from sitemapcheck.checks import Skipped
+from sitemapcheck.utils import describe_cost
 from sitemapcheck.utils import get_view_sitemaps
 from sitemapcheck.utils import sitemap_request_iterator
-from sitemapcheck.utils import sitemap_urls_iterator
+from sitemapcheck.utils import sitemap_section_urls_iterator
 from sitemapcheck.utils import use_multiprocessing
+from sitemapcheck.utils import use_incremental
+from sitemapcheck.utils import use_worker_enumeration
+from sitemapcheck.pages import pagewise_multiprocessor
+from sitemapcheck.sitemapxml import get_sitemap_xml
+from sitemapcheck.sitemapxml import sitemap_xml_urls
+from sitemapcheck.sitemapxml import source_kind
 from sitemapcheck.utils import singleprocessor
 from sitemapcheck.utils import multiprocessor
-from sitemapcheck.utils import render_report
+from sitemapcheck.registry import get_check_paths
+from sitemapcheck.registry import get_checks
+from sitemapcheck.links import check_internal_links
+from sitemapcheck.links import use_link_database
+from sitemapcheck.dedup import Deduplicator
+from sitemapcheck.dedup import use_deduplication
+from sitemapcheck.sampling import Sampler
+from sitemapcheck.sampling import get_sample
+from sitemapcheck.sampling import get_sample_seed
+from sitemapcheck.sampling import parse_sample
+from sitemapcheck.checkpoints import Checkpoint
+from sitemapcheck.checkpoints import get_checkpoint
+from sitemapcheck.progress import Progress
+from sitemapcheck.progress import count_listed
+from sitemapcheck.progress import format_duration
+from sitemapcheck.progress import get_progress_interval
+from sitemapcheck.metrics import get_metrics_path
+from sitemapcheck.metrics import write_metrics
+from sitemapcheck.profiling import CheckProfile
+from sitemapcheck.profiling import SlowestURLs
+from sitemapcheck.profiling import profile_urls
+from sitemapcheck.remote import liveprocessor
+from sitemapcheck.fingerprints import FingerprintStore
+from sitemapcheck.fingerprints import get_fingerprint_database
+from sitemapcheck.shards import parse_shard
+from sitemapcheck.shards import shard_requests
+from sitemapcheck.shards import write_shard
+from sitemapcheck.reports import get_reports
+from sitemapcheck.reports import parse_report
+from sitemapcheck.reports import write_reports
 
 
 class Command(BaseCommand):
-    # args = '<poll_id poll_id ...>'
-    # help = 'Closes the specified poll for voting'
+    help = 'Checks every URL in the sitemap and writes a report.'
+    option_list = BaseCommand.option_list + (
+        make_option('--sitemap-xml', action='store', dest='sitemap_xml',
+                    default=None, metavar='FILE_OR_URL',
+                    help='Read the URLs from this sitemap (or sitemap index) '
+                         'XML file, plain or gzipped, or from the output of '
+                         'the sitemap view at this URL, rather than from the '
+                         'Sitemap classes. Defaults to '
+                         'SITEMAPCHECK_SITEMAP_XML.'),
+        make_option('--base-url', action='store', dest='base_url',
+                    default=None,
+                    help='Fetch each URL over HTTP from this deployed site '
+                         '(eg: https://example.com) instead of using the '
+                         'test client.'),
+        make_option('--concurrency', action='store', dest='concurrency',
+                    type='int', default=None,
+                    help='How many requests to make at once when using '
+                         '--base-url (or to start with, with --adaptive).'),
+        make_option('--adaptive', action='store_true', dest='adaptive',
+                    default=None,
+                    help='With --base-url, make more requests at once while '
+                         'the server keeps up, and fewer when it slows down '
+                         'or fails.'),
+        make_option('--max-rate', action='store', dest='max_rate',
+                    type='float', default=None,
+                    help='With --base-url, start no more than this many '
+                         'requests a second.'),
+        make_option('--timeout', action='store', dest='timeout',
+                    type='float', default=None, metavar='SECONDS',
+                    help='Give up on a URL, reporting it as an error, after '
+                         'this long. Defaults to SITEMAPCHECK_TIMEOUT, or '
+                         'SITEMAPCHECK_LIVE_TIMEOUT when using --base-url.'),
+        make_option('--retries', action='store', dest='retries', type='int',
+                    default=None,
+                    help='Try a URL which timed out, could not be fetched, '
+                         'or responded 502, 503 or 504 up to this many more '
+                         'times. Defaults to SITEMAPCHECK_RETRIES.'),
+        make_option('--incremental', action='store_true', dest='incremental',
+                    default=None,
+                    help='Skip or re-validate URLs which are unchanged since '
+                         'the last incremental run, reusing their results.'),
+        make_option('--full', action='store_true', dest='full',
+                    default=False,
+                    help='Check every URL, even when running incrementally; '
+                         'the stored results are still refreshed.'),
+        make_option('--enumerate-in-workers', action='store_true',
+                    dest='enumerate_in_workers', default=None,
+                    help='When using many processes, have each list the URLs '
+                         'on whole pages of the sitemap as well as checking '
+                         'them.'),
+        make_option('--keep-duplicates', action='store_false',
+                    dest='deduplicate', default=None,
+                    help="Check a URL every time it's listed, rather than "
+                         "only the first."),
+        make_option('--sample', action='store', dest='sample',
+                    default=None, metavar='N_OR_FRACTION',
+                    help='Only check N URLs (eg: 5), or a fraction of them '
+                         '(eg: 0.1), for each URL pattern. Defaults to '
+                         'SITEMAPCHECK_SAMPLE.'),
+        make_option('--sample-seed', action='store', dest='sample_seed',
+                    default=None,
+                    help='Pick a different sample; the same seed always '
+                         'picks the same URLs.'),
+        make_option('--checkpoint', action='store', dest='checkpoint',
+                    default=None, metavar='PATH',
+                    help='Where to keep the results so far, for --resume. '
+                         'Defaults to SITEMAPCHECK_CHECKPOINT.'),
+        make_option('--resume', action='store_true', dest='resume',
+                    default=False,
+                    help='Carry on from where a stopped run got to, only '
+                         'checking the URLs it had not.'),
+        make_option('--progress-interval', action='store', type='float',
+                    dest='progress_interval', default=None,
+                    metavar='SECONDS',
+                    help='Say how far the run has got this often, or never '
+                         'if 0. Defaults to SITEMAPCHECK_PROGRESS_INTERVAL.'),
+        make_option('--metrics', action='store', dest='metrics',
+                    default=None, metavar='PATH',
+                    help='Write counts and response time histograms for the '
+                         'run to this file, in the Prometheus text format. '
+                         'Defaults to SITEMAPCHECK_METRICS.'),
+        make_option('--report', action='append', dest='reports',
+                    default=None, metavar='FORMAT[:PATH]',
+                    help='Write a report as html, jsonl, csv or junit, '
+                         'optionally to the given path; may be given more '
+                         'than once. Defaults to SITEMAPCHECK_REPORTS.'),
+        make_option('--shard', action='store', dest='shard', default=None,
+                    help='Only check share I of N of the URLs, given as I/N; '
+                         'combine the shards with sitemapcheck_merge.'),
+        make_option('--shard-output', action='store', dest='shard_output',
+                    default=None,
+                    help='Where to write the results of this shard, by '
+                         'default sitemapcheck_shard_I_of_N.jsonl'),
+        make_option('--profile-checks', action='store_true',
+                    dest='profile_checks', default=False,
+                    help='Report how long each check took across the run.'),
+        make_option('--profile-slowest', action='store', type='int',
+                    dest='profile_slowest', default=0, metavar='N',
+                    help='Afterwards, request the N slowest URLs again under '
+                         'cProfile, writing the stats to --profile-dir.'),
+        make_option('--profile-dir', action='store', dest='profile_dir',
+                    default='sitemapcheck_profiles',
+                    help='Where --profile-slowest writes its .pstats files.'),
+    )
 
     def handle(self, *args, **options):
-        view_sitemaps = get_view_sitemaps()
-        if view_sitemaps.success is False:
-            if view_sitemaps.message is not None:
-                self.stderr.write(self.style.ERROR(view_sitemaps.message))
-            # return view_sitemaps
+        try:
+            get_checks()
+        except ImproperlyConfigured as e:
+            self.stderr.write(self.style.ERROR(force_text(e)))
             return sys.exit(1)
-        iterable_sitemaps = view_sitemaps.sitemaps.values()
-        data = sitemap_urls_iterator(iterable_sitemaps)
+        sitemap_xml = get_sitemap_xml(options.get('sitemap_xml'))
+        if sitemap_xml is not None:
+            try:
+                source_kind(sitemap_xml)
+            except ValueError as e:
+                self.stderr.write(self.style.ERROR(force_text(e)))
+                return sys.exit(1)
+            sitemaps = None
+            data = sitemap_xml_urls(sitemap_xml)
+        else:
+            view_sitemaps = get_view_sitemaps()
+            if view_sitemaps.success is False:
+                if view_sitemaps.message is not None:
+                    self.stderr.write(self.style.ERROR(view_sitemaps.message))
+                # return view_sitemaps
+                return sys.exit(1)
+            sitemaps = view_sitemaps.sitemaps
+            data = sitemap_section_urls_iterator(sitemaps)
         prepared_requests = sitemap_request_iterator(sitemap_results=data)
-        if use_multiprocessing():
-            if options.get('interactive', True):
-                msg = ("You're about to check URLs using multiple "
-                       "processes, where using Ctrl-C to stop processing is "
-                       "flakey, if you have trouble with it, set "
-                       "`SITEMAPCHECK_MULTIPROCESSING` to False")
-                self.stderr.write(self.style.ERROR(msg))
-                msg = "Are you sure you wish to continue? [y/N] "
-                yes_or_no = six.moves.input(msg)
-                if not yes_or_no.lower().startswith('y'):
-                    msg = "URL checks cancelled"
-                    self.stderr.write(self.style.ERROR(msg))
-                    return sys.exit(1)
-            results = multiprocessor(prepared_requests)
+        duplicates = None
+        if use_deduplication(options.get('deduplicate')):
+            duplicates = Deduplicator()
+            prepared_requests = duplicates.filtering(prepared_requests)
+        shard = options.get('shard')
+        reports = options.get('reports')
+        if reports is None and shard is None:
+            # sharded runs leave the reports to sitemapcheck_merge, unless
+            # explicitly asked for.
+            reports = get_reports()
+        sample = get_sample(options.get('sample'))
+        sampler = None
+        # what decides which URLs are checked, which a checkpoint has to
+        # match to be resumed from.
+        run = {'sitemap_xml': sitemap_xml, 'shard': shard, 'sample': sample,
+               'sample_seed': get_sample_seed(options.get('sample_seed')),
+               'base_url': options.get('base_url')}
+        try:
+            reports = [parse_report(x, os.getcwd()) for x in reports or ()]
+            if shard is not None:
+                shard_index, shard_count = parse_shard(shard)
+            if sample is not None:
+                sample_size, sample_fraction = parse_sample(sample)
+                sampler = Sampler(size=sample_size, fraction=sample_fraction,
+                                  seed=options.get('sample_seed'))
+            checkpoint = Checkpoint(
+                get_checkpoint(options.get('checkpoint'),
+                               shard=None if shard is None else (
+                                   shard_index, shard_count)),
+                run=run, resume=options.get('resume'))
+        except (IOError, ValueError) as e:
+            self.stderr.write(self.style.ERROR(force_text(e)))
+            return sys.exit(1)
+        if sampler is not None:
+            prepared_requests = sampler.sampling(prepared_requests)
+        if shard is not None:
+            prepared_requests = shard_requests(prepared_requests, shard_index,
+                                               shard_count)
+        if checkpoint.resume:
+            prepared_requests = checkpoint.skipping(prepared_requests)
+        elif options.get('resume'):
+            msg = ("Nothing to resume from at {path!s}, so checking every "
+                   "URL".format(path=checkpoint.path))
+            self.stderr.write(self.style.WARNING(msg))
+        store = None
+        previous_database = None
+        if use_incremental(options.get('incremental')):
+            store = FingerprintStore(get_fingerprint_database())
+            if not options.get('full'):
+                prepared_requests = store.with_previous(prepared_requests)
+                previous_database = store.path
+        base_url = options.get('base_url')
+        if base_url is not None and options.get('profile_slowest'):
+            msg = "--profile-slowest can't be used with --base-url"
+            self.stderr.write(self.style.ERROR(msg))
+            return sys.exit(1)
+        listed = None
+        if sitemaps is not None and sampler is None and shard is None:
+            # otherwise only some of what's listed is checked.
+            listed = count_listed(sitemaps)
+        progress = Progress(
+            listed=listed, already=checkpoint.resumed,
+            interval=get_progress_interval(options.get('progress_interval')),
+            write=self.stderr.write)
+        prepared_requests = progress.listing(prepared_requests)
+        limits = {'timeout': options.get('timeout'),
+                  'retries': options.get('retries')}
+        if base_url is not None:
+            results = liveprocessor(prepared_requests, base_url=base_url,
+                                    concurrency=options.get('concurrency'),
+                                    adaptive=options.get('adaptive'),
+                                    max_rate=options.get('max_rate'),
+                                    **limits)
+        elif use_multiprocessing():
+            enumerate_in_workers = use_worker_enumeration(
+                options.get('enumerate_in_workers'))
+            if (enumerate_in_workers and sitemaps is not None and
+                    sampler is None and not checkpoint.resume):
+                # the workers filter & look up each URL themselves, but
+                # can't know what the others have seen.
+                if duplicates is not None:
+                    msg = ("URLs listed more than once are checked each "
+                           "time when the workers list them; pass "
+                           "--keep-duplicates to do so without this warning")
+                    self.stderr.write(self.style.WARNING(msg))
+                duplicates = None
+                results = pagewise_multiprocessor(
+                    sitemaps, database=previous_database,
+                    shard=None if shard is None else (shard_index,
+                                                      shard_count),
+                    **limits)
+            else:
+                results = multiprocessor(prepared_requests, **limits)
         else:
-            results = singleprocessor(prepared_requests)
-        results_for_reports = []
-        errors = []
-        warnings = []
-        for result in results:
-            self.stdout.write(self.style.HTTP_SUCCESS(result.path))
-            results_for_reports.append(result)
-            for check in result.check_results:
-                if check is None:
-                    continue
-                name = force_text(check.name)
-                check_msg = force_text(mark_safe(check.msg))
-                msg = '{name!s}: {msg!s}'.format(name=name, msg=check_msg)
-                if check.code == Error:
-                    errors.append(name)
-                    self.stderr.write("    " + self.style.ERROR(msg))
-                elif check.code == Caution:
-                    warnings.append(name)
-                    self.stdout.write("    " + self.style.WARNING(msg))
-                elif check.code == Success:
-                    self.stdout.write("    " + self.style.HTTP_REDIRECT(msg))
-                elif check.code == Info:
-                    self.stdout.write("    " + msg)
+            results = singleprocessor(prepared_requests, **limits)
+        results = progress.tracking(checkpoint.recording(results))
+        if store is not None:
+            results = store.recording(results)
+        if checkpoint.resume:
+            results = itertools.chain(checkpoint.previous(), results)
+        profiling = dict((key, options[key]) for key in (
+            'profile_checks', 'profile_slowest', 'profile_dir')
+            if options.get(key) is not None)
+        metrics = get_metrics_path(options.get('metrics'))
+        link_directory = None
+        if check_internal_links in get_checks():
+            # every worker shares the status of each link target through
+            # this, for this run only.
+            link_directory = tempfile.mkdtemp(prefix='sitemapcheck_links_')
+            use_link_database(os.path.join(link_directory, 'links.sqlite3'),
+                              base_url=base_url)
+        if shard is not None:
+            shard_output = options.get('shard_output')
+            if shard_output is None:
+                shard_output = os.path.join(
+                    os.getcwd(), 'sitemapcheck_shard_{index:d}_of_'
+                                 '{count:d}.jsonl'.format(
+                                     index=shard_index, count=shard_count))
+
+            def finished():
+                return not checkpoint.interrupted
+        try:
+            with checkpoint:
+                if shard is None:
+                    return self.report(
+                        results, reports=reports, duplicates=duplicates,
+                        sampler=sampler, checkpoint=checkpoint,
+                        progress=progress, metrics=metrics, **profiling)
+                with open(shard_output, 'w') as f:
+                    return self.report(
+                        write_shard(results, f, shard_index, shard_count,
+                                    finished=finished, duplicates=duplicates,
+                                    sampler=sampler),
+                        reports=reports, duplicates=duplicates,
+                        sampler=sampler, checkpoint=checkpoint,
+                        progress=progress, metrics=metrics, **profiling)
+        finally:
+            if link_directory is not None:
+                use_link_database(None)
+                shutil.rmtree(link_directory)
+
+    def report(self, results, reports=(), profile_checks=False,
+               profile_slowest=0, profile_dir='sitemapcheck_profiles',
+               duplicates=None, sampler=None, checkpoint=None,
+               progress=None, metrics=None):
+        """
+        Writes each result out as it arrives, to the console and each of the
+        `reports`, then the totals, the URLs skipped as duplicates, what the
+        sample covered, how long it all took, and any profiling asked for,
+        writes the metrics, if asked to, and exits with the number of errors
+        found (or 1 if interrupted without finding any).
+        """
+        profile = None
+        if profile_checks:
+            profile = CheckProfile(get_check_paths())
+            results = profile.collecting(results)
+        slowest = None
+        if profile_slowest:
+            slowest = SlowestURLs(profile_slowest)
+            results = slowest.collecting(results)
+        results = write_reports(results, reports, profile=profile,
+                                duplicates=duplicates, sampler=sampler)
+        error_count = 0
+        warning_count = 0
+        skipped_count = 0
+        checked_count = 0
+        interrupted = False
+        try:
+            for result in results:
+                checked_count += 1
+                if result.reused:
+                    self.stdout.write(self.style.HTTP_SUCCESS(result.path) +
+                                      " (unchanged)")
                 else:
-                    errors.append(name)
-                    self.stderr.write("    " + self.style.ERROR(msg))
-        error_count = len(errors)
-        warning_count = len(warnings)
+                    self.stdout.write(self.style.HTTP_SUCCESS(result.path))
+                cost = describe_cost(result)
+                if cost:
+                    self.stdout.write("    " + cost)
+                for check in result.check_results:
+                    if check is None:
+                        continue
+                    if check.code == Skipped:
+                        # only counted, as they say nothing about the page.
+                        skipped_count += 1
+                        continue
+                    name = force_text(check.name)
+                    check_msg = force_text(mark_safe(check.msg))
+                    msg = '{name!s}: {msg!s}'.format(name=name, msg=check_msg)
+                    if check.code == Error:
+                        error_count += 1
+                        self.stderr.write("    " + self.style.ERROR(msg))
+                    elif check.code == Caution:
+                        warning_count += 1
+                        self.stdout.write("    " + self.style.WARNING(msg))
+                    elif check.code == Success:
+                        self.stdout.write("    " +
+                                          self.style.HTTP_REDIRECT(msg))
+                    elif check.code == Info:
+                        self.stdout.write("    " + msg)
+                    else:
+                        error_count += 1
+                        self.stderr.write("    " + self.style.ERROR(msg))
+        except KeyboardInterrupt:
+            # between results, rather than while waiting on them, which
+            # the checkpoint takes care of.
+            interrupted = True
+        finally:
+            # finishing every report now, however the run ended, rather
+            # than whenever the results are garbage collected.
+            results.close()
+        if checkpoint is not None:
+            interrupted = interrupted or checkpoint.interrupted
+            checkpoint.interrupted = interrupted
         if error_count > 0:
             self.stderr.write("{count!s} error{plural}".format(
                 count=error_count, plural=pluralize(error_count)))
         if warning_count > 0:
             self.stdout.write("{count!s} warning{plural}".format(
                 count=warning_count, plural=pluralize(warning_count)))
-        render_report(results_for_reports, root_dir=os.getcwd())
+        if skipped_count > 0:
+            self.stdout.write("{count!s} check{plural} skipped, their "
+                              "preconditions not being met".format(
+                                  count=skipped_count,
+                                  plural=pluralize(skipped_count)))
+        if duplicates is not None and duplicates.total:
+            self.stdout.write("Skipped {count!s} duplicate URL{plural}".format(
+                count=duplicates.total, plural=pluralize(duplicates.total)))
+            for section, count in duplicates.rows():
+                self.stdout.write("    {section!s}: {count!s}".format(
+                    section=section, count=count))
+        if sampler is not None:
+            self.stdout.write("Checked a sample of {sampled!s} of {listed!s} "
+                              "URL{plural}:".format(
+                                  sampled=sampler.total_sampled,
+                                  listed=sampler.total_listed,
+                                  plural=pluralize(sampler.total_listed)))
+            for row in sampler.rows():
+                self.stdout.write("    {pattern!s}: {sampled!s} of {listed!s} "
+                                  "({coverage:.1f}%)".format(**row))
+        if checkpoint is not None and checkpoint.resumed:
+            self.stdout.write("Resumed from {path!s}, where {count!s} URL"
+                              "{plural} had already been checked".format(
+                                  path=checkpoint.path,
+                                  count=checkpoint.resumed,
+                                  plural=pluralize(checkpoint.resumed)))
+        if progress is not None:
+            self.write_progress(progress)
+        for name, path in reports:
+            self.stdout.write("Wrote {name!s} report to {path!s}".format(
+                name=name, path=path))
+        if progress is not None and metrics is not None:
+            write_metrics(progress, metrics, interrupted=interrupted)
+            self.stdout.write("Wrote metrics to {path!s}".format(
+                path=metrics))
+        if profile is not None:
+            self.write_check_profile(profile)
+        if slowest is not None:
+            directory = os.path.join(os.getcwd(), profile_dir)
+            for path, filename in profile_urls(slowest.paths(), directory):
+                self.stdout.write("Profiled {path!s} to {filename!s}".format(
+                    path=path, filename=filename))
+        if interrupted:
+            msg = "Interrupted after {count!s} URL{plural}".format(
+                count=checked_count, plural=pluralize(checked_count))
+            if checkpoint is not None and checkpoint.path is not None:
+                msg += (", which are kept in {path!s}; run again with "
+                        "--resume to carry on".format(path=checkpoint.path))
+            self.stderr.write(self.style.ERROR(msg))
+            return sys.exit(max(error_count, 1))
         return sys.exit(error_count)
+
+    def write_progress(self, progress):
+        self.stdout.write("Checked {count!s} URL{plural} in {elapsed!s}"
+                          "{rate!s}".format(
+                              count=progress.checked,
+                              plural=pluralize(progress.checked),
+                              elapsed=format_duration(progress.elapsed),
+                              rate='' if not progress.rate else
+                              ', {0:.1f} a second'.format(progress.rate)))
+        for worker, count, busy in progress.utilisation():
+            self.stdout.write("    worker {worker!s}: {count!s} URL{plural}, "
+                              "busy {busy:.0%} of the time".format(
+                                  worker=worker, count=count,
+                                  plural=pluralize(count), busy=busy))
+
+    def write_check_profile(self, profile):
+        self.stdout.write("Time taken by each check, in milliseconds:")
+        columns = ('calls', 'total', 'mean', 'p50', 'p90', 'p99', 'max')
+        self.stdout.write("    {check:<56} {columns!s}".format(
+            check='check', columns=' '.join('{0:>9}'.format(x)
+                                            for x in columns)))
+        for row in profile.rows():
+            values = ['{0:>9d}'.format(row['count'])]
+            for column in columns[1:]:
+                if row[column] is None:
+                    values.append('{0:>9}'.format('-'))
+                else:
+                    values.append('{0:>9.3f}'.format(row[column] * 1000))
+            self.stdout.write("    {check:<56} {values!s}".format(
+                check=row['name'], values=' '.join(values)))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from django.core.management import BaseCommand
+from django.utils.encoding import force_text
+from optparse import make_option
+import itertools
+import os
+import sys
+from sitemapcheck.management.commands.sitemapcheck import (
+    Command as SitemapCheckCommand)
+from sitemapcheck.daemon import DaemonError
+from sitemapcheck.daemon import request_checks
+from sitemapcheck.reports import get_reports
+from sitemapcheck.reports import parse_report
+
+
+class Command(SitemapCheckCommand):
+    args = '[<path> ...]'
+    help = ('Has a running `sitemapcheck_daemon` check the given paths and '
+            'sitemap sections, then writes up the results as `sitemapcheck` '
+            'does.')
+    option_list = BaseCommand.option_list + (
+        make_option('--section', action='append', dest='sections',
+                    default=None, metavar='NAME',
+                    help='Check every URL in this section of the sitemaps; '
+                         'may be given more than once.'),
+        make_option('--socket', action='store', dest='socket', default=None,
+                    metavar='PATH',
+                    help='The Unix socket the daemon is listening on. '
+                         'Defaults to SITEMAPCHECK_DAEMON_SOCKET.'),
+        make_option('--timeout', action='store', dest='timeout',
+                    type='float', default=None, metavar='SECONDS',
+                    help='Give up on a URL, reporting it as an error, after '
+                         'this long. Defaults to SITEMAPCHECK_TIMEOUT.'),
+        make_option('--retries', action='store', dest='retries', type='int',
+                    default=None,
+                    help='Try a URL which timed out, could not be fetched, '
+                         'or responded 502, 503 or 504 up to this many more '
+                         'times. Defaults to SITEMAPCHECK_RETRIES.'),
+        make_option('--report', action='append', dest='reports',
+                    default=None, metavar='FORMAT[:PATH]',
+                    help='Write a report as html, jsonl, csv or junit, '
+                         'optionally to the given path; may be given more '
+                         'than once. Defaults to SITEMAPCHECK_REPORTS.'),
+    )
+
+    def handle(self, *paths, **options):
+        sections = options.get('sections') or ()
+        if not paths and not sections:
+            msg = "Give the paths to check, or the --section to check"
+            self.stderr.write(self.style.ERROR(msg))
+            return sys.exit(1)
+        reports = options.get('reports')
+        if reports is None:
+            reports = get_reports()
+        try:
+            reports = [parse_report(x, os.getcwd()) for x in reports]
+        except (IOError, ValueError) as e:
+            self.stderr.write(self.style.ERROR(force_text(e)))
+            return sys.exit(1)
+        results = request_checks(paths, sections, path=options.get('socket'),
+                                 timeout=options.get('timeout'),
+                                 retries=options.get('retries'))
+        try:
+            # a refused request, or no daemon at all, is known by the first.
+            results = itertools.chain((next(results),), results)
+        except StopIteration:
+            results = iter(())
+        except DaemonError as e:
+            self.stderr.write(self.style.ERROR(force_text(e)))
+            return sys.exit(1)
+        try:
+            return self.report(results, reports=reports)
+        except DaemonError as e:
+            self.stderr.write(self.style.ERROR(force_text(e)))
+            return sys.exit(1)
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from django.core.management import BaseCommand
+from django.utils.encoding import force_text
+from optparse import make_option
+import signal
+import sys
+from sitemapcheck.daemon import CheckerDaemon
+from sitemapcheck.daemon import DaemonError
+from sitemapcheck.daemon import get_socket_path
+
+
+def stop(signum, frame):
+    sys.exit(0)
+
+
+class Command(BaseCommand):
+    help = ('Keeps the project loaded and a pool of workers started, '
+            'checking the URLs sent to it by `sitemapcheck_client` until '
+            'stopped.')
+    option_list = BaseCommand.option_list + (
+        make_option('--socket', action='store', dest='socket', default=None,
+                    metavar='PATH',
+                    help='The Unix socket to listen on. Defaults to '
+                         'SITEMAPCHECK_DAEMON_SOCKET.'),
+        make_option('--processes', action='store', dest='processes',
+                    type='int', default=None,
+                    help='How many worker processes to keep; by default as '
+                         'SITEMAPCHECK_MULTIPROCESSING says.'),
+    )
+
+    def handle(self, *args, **options):
+        path = get_socket_path(options.get('socket'))
+        try:
+            daemon = CheckerDaemon(path, processes=options.get('processes'))
+        except DaemonError as e:
+            self.stderr.write(self.style.ERROR(force_text(e)))
+            return sys.exit(1)
+        # so being told to stop by a process manager tidies up as Ctrl-C does.
+        signal.signal(signal.SIGTERM, stop)
+        self.stdout.write("Listening on {path!s} with {count!s} worker "
+                          "process{plural!s}; stop with Ctrl-C".format(
+                              path=path, count=daemon.processes,
+                              plural='' if daemon.processes == 1 else 'es'))
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.server_close()
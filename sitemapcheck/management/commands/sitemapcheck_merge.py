@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from django.core.management import BaseCommand
+from django.utils.encoding import force_text
+from optparse import make_option
+import os
+import sys
+from sitemapcheck.management.commands.sitemapcheck import (
+    Command as SitemapCheckCommand)
+from sitemapcheck.dedup import Deduplicator
+from sitemapcheck.shards import order_shards
+from sitemapcheck.shards import read_shard_summary
+from sitemapcheck.shards import read_shards
+from sitemapcheck.reports import get_reports
+from sitemapcheck.reports import parse_report
+from sitemapcheck.sampling import Sampler
+
+
+class Command(SitemapCheckCommand):
+    args = '<shard file> [<shard file> ...]'
+    help = ('Combines the files written by `sitemapcheck --shard=I/N` into '
+            'the usual summary and report.')
+    option_list = BaseCommand.option_list + (
+        make_option('--report', action='append', dest='reports',
+                    default=None, metavar='FORMAT[:PATH]',
+                    help='Write a report as html, jsonl, csv or junit, '
+                         'optionally to the given path; may be given more '
+                         'than once. Defaults to SITEMAPCHECK_REPORTS.'),
+        make_option('--profile-checks', action='store_true',
+                    dest='profile_checks', default=False,
+                    help='Report how long each check took across the '
+                         'shards.'),
+    )
+
+    def handle(self, *filenames, **options):
+        if not filenames:
+            msg = "Give the shard files written by `sitemapcheck --shard`"
+            self.stderr.write(self.style.ERROR(msg))
+            return sys.exit(1)
+        reports = options.get('reports')
+        if reports is None:
+            reports = get_reports()
+        try:
+            reports = [parse_report(x, os.getcwd()) for x in reports]
+            filenames = order_shards(filenames)
+            # every shard listed every URL, so each counted the same
+            # duplicates & sample.
+            summary = read_shard_summary(filenames[0])
+        except (IOError, ValueError) as e:
+            self.stderr.write(self.style.ERROR(force_text(e)))
+            return sys.exit(1)
+        duplicates = None
+        if 'duplicates' in summary:
+            duplicates = Deduplicator.from_dict(summary['duplicates'])
+        sampler = None
+        if 'sample' in summary:
+            sampler = Sampler.from_dict(summary['sample'])
+        return self.report(read_shards(filenames), reports=reports,
+                           profile_checks=options.get('profile_checks'),
+                           duplicates=duplicates, sampler=sampler)
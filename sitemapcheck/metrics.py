@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Writing what a run found out, in the Prometheus text format, for something
+like node_exporter's textfile collector to pick up: how many URLs there were
+and were checked, what they responded with, how many errors were found, how
+long it all took, how busy each worker was, and histograms of the response
+times and times to first byte.
+
+Every value is for the last run alone, so all but the histograms are
+gauges.
+"""
+import os
+import time
+from django.conf import settings
+from .settings import SITEMAPCHECK_METRICS
+
+
+PREFIX = 'sitemapcheck'
+
+
+def get_metrics_path(path=None):
+    if path is None:
+        path = getattr(settings, 'SITEMAPCHECK_METRICS', SITEMAPCHECK_METRICS)
+    return path
+
+
+def escape_label(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_sample(name, value, labels=None):
+    if labels:
+        name += '{' + ','.join(
+            '{key!s}="{value!s}"'.format(key=key, value=escape_label(value))
+            for key, value in sorted(labels.items())) + '}'
+    return '{name!s} {value!r}'.format(name=name, value=value)
+
+
+def format_metric(name, kind, help_text, samples):
+    """
+    The lines for one metric: its HELP & TYPE, then each of `samples`, a
+    (suffix, value, labels) triple.
+    """
+    name = PREFIX + '_' + name
+    lines = ['# HELP {name!s} {help!s}'.format(name=name, help=help_text),
+             '# TYPE {name!s} {kind!s}'.format(name=name, kind=kind)]
+    for suffix, value, labels in samples:
+        lines.append(format_sample(name + suffix, value, labels))
+    return lines
+
+
+def histogram_samples(histogram):
+    for bound, count in histogram.cumulative():
+        yield '_bucket', count, {'le': '{0!r}'.format(float(bound))}
+    yield '_bucket', histogram.count, {'le': '+Inf'}
+    yield '_sum', histogram.total, None
+    yield '_count', histogram.count, None
+
+
+def format_metrics(progress, interrupted=False, now=None):
+    """
+    The Prometheus text for the run `progress` kept track of.
+    """
+    if now is None:
+        now = time.time()
+    lines = []
+    if progress.listed is not None:
+        lines += format_metric(
+            'urls_listed', 'gauge', 'URLs listed in each sitemap section.',
+            [('', count, {'section': section})
+             for section, count in sorted(progress.listed.items())])
+    lines += format_metric('urls_checked', 'gauge',
+                           'URLs checked by the last run, including any '
+                           'before it was resumed.',
+                           [('', progress.already + progress.checked, None)])
+    if progress.checked_by_section:
+        lines += format_metric(
+            'section_urls_checked', 'gauge',
+            'URLs checked by the last run in each sitemap section.',
+            [('', count, {'section': section}) for section, count
+             in sorted(progress.checked_by_section.items())])
+    lines += format_metric(
+        'responses', 'gauge',
+        'Responses by status code; "failed" for none at all.',
+        [('', count, {'status': 'failed' if status is None else str(status)})
+         for status, count in sorted(progress.statuses.items(),
+                                     key=lambda x: x[0] or 0)])
+    lines += format_metric('errors', 'gauge', 'Checks failed.',
+                           [('', progress.errors, None)])
+    lines += format_metric('warnings', 'gauge', 'Checks which warned.',
+                           [('', progress.warnings, None)])
+    lines += format_metric('checks_skipped', 'gauge',
+                           'Checks skipped, their preconditions not met.',
+                           [('', progress.skipped, None)])
+    lines += format_metric('run_duration_seconds', 'gauge',
+                           'How long the last run took.',
+                           [('', progress.elapsed, None)])
+    lines += format_metric('run_interrupted', 'gauge',
+                           'Whether the last run was stopped part way.',
+                           [('', int(interrupted), None)])
+    lines += format_metric('run_finished_timestamp_seconds', 'gauge',
+                           'When the last run finished.',
+                           [('', now, None)])
+    lines += format_metric('urls_per_second', 'gauge',
+                           'URLs checked a second by the last run.',
+                           [('', progress.rate or 0.0, None)])
+    utilisation = list(progress.utilisation())
+    if utilisation:
+        lines += format_metric(
+            'worker_urls_checked', 'gauge', 'URLs checked by each worker.',
+            [('', count, {'worker': worker})
+             for worker, count, busy in utilisation])
+        lines += format_metric(
+            'worker_busy_ratio', 'gauge',
+            'The fraction of the run each worker spent checking URLs.',
+            [('', busy, {'worker': worker})
+             for worker, count, busy in utilisation])
+    lines += format_metric('response_seconds', 'histogram',
+                           'How long each URL took to fetch.',
+                           histogram_samples(progress.response_times))
+    lines += format_metric('ttfb_seconds', 'histogram',
+                           'How long each URL took to start responding.',
+                           histogram_samples(progress.ttfbs))
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(progress, path, interrupted=False):
+    """
+    Writes the metrics to `path` all at once, by way of a temporary file
+    alongside it, so whatever reads it never sees only part of them.
+    """
+    temporary = '{path!s}.{pid:d}.tmp'.format(path=path, pid=os.getpid())
+    with open(temporary, 'w') as f:
+        f.write(format_metrics(progress, interrupted=interrupted))
+    # os.replace is Python 3.3+; os.rename already replaces on POSIX.
+    getattr(os, 'replace', os.rename)(temporary, path)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Checking the sitemap a page at a time: each worker process is handed a
+(section, page) of the sitemap, lists the URLs on it with the section's own
+queryset, and checks them, so that listing URLs is spread over the pool as
+well as fetching them.
+"""
+from collections import namedtuple
+import functools
+from django.db import connections
+from django.test import Client
+from .fingerprints import FingerprintStore
+from .shards import shard_requests
+from .timeouts import get_retries
+from .timeouts import get_retry_backoff
+from .timeouts import get_timeout
+from .utils import failed_response
+from .utils import get_processes
+from .utils import get_request_site
+from .utils import get_view_sitemaps
+from .utils import handle_within_limits
+from .utils import init_worker
+from .utils import sitemap_page_urls
+from .utils import sitemap_request_iterator
+from .workers import WorkerPool
+
+
+SitemapPage = namedtuple('SitemapPage', 'section page')
+
+
+def sitemap_pages_iterator(sitemaps):
+    """
+    Every (section, page) of a dictionary of sitemaps, as the sitemap view
+    is given them; only counts each section, rather than listing its URLs.
+    """
+    for section in sorted(sitemaps):
+        site = sitemaps[section]
+        if callable(site):
+            site = site()
+        for page in site.paginator.page_range:
+            yield SitemapPage(section=section, page=page)
+
+
+# what each worker process resolves once, and reuses for every page.
+_worker_state = {}
+
+
+def get_worker_sitemaps():
+    try:
+        return _worker_state['sitemaps'], _worker_state['request_site']
+    except KeyError:
+        view_sitemaps = get_view_sitemaps()
+        if view_sitemaps.success is False:
+            raise ValueError(view_sitemaps.message)
+        _worker_state['sitemaps'] = view_sitemaps.sitemaps
+        _worker_state['request_site'] = get_request_site()
+        return _worker_state['sitemaps'], _worker_state['request_site']
+
+
+def get_worker_store(path):
+    key = ('store', path)
+    if key not in _worker_state:
+        _worker_state[key] = FingerprintStore(path)
+    return _worker_state[key]
+
+
+def check_sitemap_page(args):
+    """
+    Lists the URLs on a page of a sitemap section and checks each of them,
+    returning every result for the page. Only the URLs in `shard` (an
+    (index, count) pair) are checked, if given, and each is compared with
+    its result in the fingerprint database at `database`, if given.
+
+    Each URL is given up on after `timeout` seconds, where the view can be
+    interrupted, and tried up to `retries` more times. One which raises an
+    exception fails by itself, without losing the rest of the page.
+    """
+    handler, section, page, shard, database, timeout, retries = args
+    sitemaps, request_site = get_worker_sitemaps()
+    urls = sitemap_page_urls(sitemaps[section], page, request_site)
+    prepared_requests = sitemap_request_iterator(urls, client=handler)
+    if shard is not None:
+        prepared_requests = shard_requests(prepared_requests, *shard)
+    if database is not None:
+        prepared_requests = get_worker_store(database).with_previous(
+            prepared_requests)
+    return [handle_within_limits(x.handler, x.path, lastmod=x.lastmod,
+                                 previous=x.previous, timeout=timeout,
+                                 retries=retries)
+            for x in prepared_requests]
+
+
+def give_up_sitemap_page(sitemaps, task, msg, elapsed):
+    """
+    The results for a page whose worker was lost part way through it: the
+    page's URLs are listed again here, each failing with `msg`.
+    """
+    handler, section, page, shard = task[:4]
+    urls = sitemap_page_urls(sitemaps[section], page, get_request_site())
+    prepared_requests = sitemap_request_iterator(urls, client=handler)
+    if shard is not None:
+        prepared_requests = shard_requests(prepared_requests, *shard)
+    results = []
+    for x in prepared_requests:
+        result = failed_response(path=x.path, msg=msg, elapsed=elapsed)
+        # made by the parent, for a worker which has gone.
+        result.worker = None
+        results.append(result)
+    # workers started after this mustn't share the parent's connections.
+    for connection in connections.all():
+        connection.close()
+    return results
+
+
+def pagewise_multiprocessor(sitemaps, handler=Client, processes=None,
+                            shard=None, database=None, max_in_flight=None,
+                            timeout=None, retries=None):
+    """
+    Checks every URL in the sitemaps using a pool of processes, each given a
+    whole page of a section at a time, yielding results a page at a time as
+    each finishes. Only `max_in_flight` pages (by default two per process)
+    are handed out ahead of the results consumed so far.
+
+    Each URL is timed within its worker, so unlike for multiprocessor, the
+    pool itself doesn't time the pages; a page whose worker dies is tried
+    again up to `retries` times, then each of its URLs fails.
+    """
+    processes = get_processes(processes)
+    if max_in_flight is None:
+        max_in_flight = processes * 2
+    timeout = get_timeout(timeout)
+    retries = get_retries(retries)
+    tasks = ((handler, x.section, x.page, shard, database, timeout, retries)
+             for x in sitemap_pages_iterator(sitemaps))
+    # counting the pages may have opened connections, which forked workers
+    # mustn't share with the parent.
+    for connection in connections.all():
+        connection.close()
+    pool = WorkerPool(processes, check_sitemap_page,
+                      initializer=init_worker, initargs=(handler,),
+                      retries=retries, backoff=get_retry_backoff(),
+                      give_up=functools.partial(give_up_sitemap_page,
+                                                sitemaps))
+    for results in pool.stream(tasks, chunksize=1,
+                               max_in_flight=max_in_flight):
+        for result in results:
+            yield result
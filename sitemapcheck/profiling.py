@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Where the time goes: how long each check took across the whole run, and
+cProfile dumps of the views behind the slowest URLs.
+"""
+import cProfile
+import heapq
+import math
+import os
+from django.test import Client
+from django.utils.encoding import force_text
+from django.utils.text import slugify
+from .utils import get_worker_client
+
+
+class Histogram(object):
+    """
+    Durations counted into buckets a tenth of a decade wide (so each is ~26%
+    wider than the last), from a microsecond upwards; percentiles are the
+    upper bound of the bucket they fall in, which keeps memory constant
+    however many durations are added.
+    """
+    smallest = 1e-6
+    buckets_per_decade = 10
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def bucket(self, seconds):
+        if seconds <= self.smallest:
+            return 0
+        return int(math.ceil(math.log10(seconds / self.smallest) *
+                             self.buckets_per_decade))
+
+    def upper_bound(self, bucket):
+        return self.smallest * 10 ** (float(bucket) / self.buckets_per_decade)
+
+    def add(self, seconds):
+        bucket = self.bucket(seconds)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return None
+        wanted = self.count * percent / 100.0
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= wanted:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        if self.count == 0:
+            return None
+        return self.total / self.count
+
+
+class CheckProfile(object):
+    """
+    Adds up the time each check took, from every result's `check_times`;
+    `names` are the checks' dotted paths, in the order they're run.
+    """
+    percentiles = (50, 90, 99)
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.histograms = [Histogram() for name in self.names]
+
+    def add(self, result):
+        times = result.check_times
+        if times is None or len(times) != len(self.names):
+            # reused from an earlier run, never fetched, or checked with
+            # some other configuration.
+            return
+        for histogram, seconds in zip(self.histograms, times):
+            histogram.add(seconds)
+
+    def collecting(self, results):
+        """
+        Passes through each result, adding its check times as it goes.
+        """
+        for result in results:
+            self.add(result)
+            yield result
+
+    def rows(self):
+        """
+        A dictionary per check, the most expensive overall first.
+        """
+        rows = []
+        for name, histogram in zip(self.names, self.histograms):
+            row = {'name': name, 'count': histogram.count,
+                   'total': histogram.total, 'mean': histogram.mean,
+                   'max': histogram.max}
+            for percent in self.percentiles:
+                row['p{0:d}'.format(percent)] = histogram.percentile(percent)
+            rows.append(row)
+        rows.sort(key=lambda row: row['total'], reverse=True)
+        return rows
+
+
+class SlowestURLs(object):
+    """
+    Keeps the paths of the `count` slowest URLs seen.
+    """
+    def __init__(self, count):
+        self.count = count
+        self.heap = []
+
+    def add(self, result):
+        if result.elapsed is None or result.status_code is None:
+            return
+        item = (result.elapsed, result.path)
+        if len(self.heap) < self.count:
+            heapq.heappush(self.heap, item)
+        elif item > self.heap[0]:
+            heapq.heapreplace(self.heap, item)
+
+    def collecting(self, results):
+        for result in results:
+            self.add(result)
+            yield result
+
+    def paths(self):
+        return [path for elapsed, path in sorted(self.heap, reverse=True)]
+
+
+def profile_urls(paths, directory, handler=Client):
+    """
+    Requests each path again under cProfile, writing the stats for each to a
+    numbered .pstats file in `directory`, and yielding (path, filename).
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    client = get_worker_client(handler)
+    for number, path in enumerate(paths, 1):
+        if isinstance(client, Client):
+            client.cookies.clear()
+        profiler = cProfile.Profile()
+        profiler.runcall(client.get, path)
+        filename = '{number:02d}-{slug!s}.pstats'.format(
+            number=number, slug=slugify(force_text(path)) or 'root')
+        filename = os.path.join(directory, filename)
+        profiler.dump_stats(filename)
+        yield path, filename
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+How far a run has got: how many URLs have been checked of how many the
+sitemaps list (per section, where known), how quickly, how long is left, and
+how busy each worker has been. The same counts, with histograms of the
+response times, can be written out for Prometheus; see sitemapcheck.metrics.
+"""
+import bisect
+from timeit import default_timer
+from django.conf import settings
+from django.template.defaultfilters import pluralize
+from .checks import Caution
+from .checks import Info
+from .checks import Skipped
+from .checks import Success
+from .settings import SITEMAPCHECK_PROGRESS_INTERVAL
+
+
+# the upper bounds, in seconds, of the response time histograms' buckets.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def get_progress_interval(interval=None):
+    if interval is None:
+        interval = getattr(settings, 'SITEMAPCHECK_PROGRESS_INTERVAL',
+                           SITEMAPCHECK_PROGRESS_INTERVAL)
+    return interval
+
+
+def count_listed(sitemaps):
+    """
+    How many URLs each section of the sitemaps lists, going by its
+    paginator, which counts them without listing them all.
+    """
+    listed = {}
+    for section in sitemaps:
+        site = sitemaps[section]
+        if callable(site):
+            site = site()
+        listed[section] = site.paginator.count
+    return listed
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return '{h:d}h{m:02d}m'.format(h=seconds // 3600,
+                                       m=seconds % 3600 // 60)
+    if seconds >= 60:
+        return '{m:d}m{s:02d}s'.format(m=seconds // 60, s=seconds % 60)
+    return '{s:d}s'.format(s=seconds)
+
+
+class LatencyHistogram(object):
+    """
+    Durations counted into the fixed buckets Prometheus expects, each
+    holding those up to its bound which didn't fit in the last.
+    """
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        index = bisect.bisect_left(self.bounds, seconds)
+        if index < len(self.bounds):
+            self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+
+    def cumulative(self):
+        """
+        (bound, how many were no longer than it) for each bucket.
+        """
+        running = 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            yield bound, running
+
+
+class Progress(object):
+    """
+    Counts the results as they arrive. `listed` is how many URLs each
+    sitemap section lists, or None when the run won't check them all (eg:
+    a shard or sample) or they can't be counted up front (eg: sitemap XML),
+    and `already` how many were checked before the run was resumed.
+
+    Every `interval` seconds, `write` is called with a line saying how far
+    the run has got.
+    """
+    def __init__(self, listed=None, already=0, interval=None, write=None,
+                 clock=default_timer):
+        self.listed = listed
+        self.already = already
+        self.interval = interval
+        self.write = write
+        self.clock = clock
+        self.started = None
+        self.finished = None
+        self.last_written = None
+        # the section of each URL handed over to be checked, until it is.
+        self.sections = {}
+        self.checked = 0
+        self.checked_by_section = {}
+        self.statuses = {}
+        self.errors = 0
+        self.warnings = 0
+        self.skipped = 0
+        # how many URLs each worker has checked, and the seconds it spent.
+        self.workers = {}
+        self.response_times = LatencyHistogram()
+        self.ttfbs = LatencyHistogram()
+
+    def listing(self, prepared_requests):
+        """
+        Passes through the prepared requests, noting each one's section.
+        """
+        for prepared in prepared_requests:
+            if prepared.section is not None:
+                self.sections[prepared.path] = prepared.section
+            yield prepared
+
+    def add(self, result):
+        self.checked += 1
+        section = self.sections.pop(result.path, None)
+        if section is not None:
+            self.checked_by_section[section] = (
+                self.checked_by_section.get(section, 0) + 1)
+        self.statuses[result.status_code] = (
+            self.statuses.get(result.status_code, 0) + 1)
+        for check in result.check_results:
+            if check is None or check.code in (Success, Info):
+                continue
+            if check.code == Skipped:
+                self.skipped += 1
+            elif check.code == Caution:
+                self.warnings += 1
+            else:
+                self.errors += 1
+        if result.elapsed is not None:
+            self.response_times.add(result.elapsed)
+        if result.timings is not None and result.timings.ttfb is not None:
+            self.ttfbs.add(result.timings.ttfb)
+        if result.worker is not None:
+            busy = (result.elapsed or 0) + sum(result.check_times or ())
+            count, seconds = self.workers.get(result.worker, (0, 0.0))
+            self.workers[result.worker] = (count + 1, seconds + busy)
+
+    def tracking(self, results):
+        """
+        Passes through each result, counting it, and saying how far the run
+        has got whenever it's time to.
+        """
+        self.started = self.last_written = self.clock()
+        try:
+            for result in results:
+                self.add(result)
+                yield result
+                now = self.clock()
+                if (self.write is not None and self.interval and
+                        now - self.last_written >= self.interval):
+                    self.last_written = now
+                    self.write(self.describe())
+        finally:
+            self.finished = self.clock()
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or self.clock()) - self.started
+
+    @property
+    def rate(self):
+        """
+        URLs checked a second, not counting any from before resuming.
+        """
+        elapsed = self.elapsed
+        if not elapsed:
+            return None
+        return self.checked / elapsed
+
+    @property
+    def total(self):
+        if self.listed is None:
+            return None
+        return sum(self.listed.values())
+
+    @property
+    def remaining(self):
+        if self.total is None:
+            return None
+        return max(0, self.total - self.already - self.checked)
+
+    @property
+    def eta(self):
+        """
+        The seconds left at the current rate, if that's known.
+        """
+        if self.remaining is None or not self.rate:
+            return None
+        return self.remaining / self.rate
+
+    def utilisation(self):
+        """
+        (worker, URLs checked, fraction of the run spent checking them) for
+        each worker.
+        """
+        elapsed = self.elapsed
+        for worker in sorted(self.workers):
+            count, busy = self.workers[worker]
+            yield worker, count, (busy / elapsed if elapsed else 0.0)
+
+    def describe(self):
+        done = self.already + self.checked
+        if self.total:
+            parts = ['Checked {done:d} of {total:d} URL{plural!s} '
+                     '({percent:.0f}%)'.format(
+                         done=done, total=self.total,
+                         plural=pluralize(self.total),
+                         percent=100.0 * done / self.total)]
+        else:
+            parts = ['Checked {done:d} URL{plural!s}'.format(
+                done=done, plural=pluralize(done))]
+        if self.rate is not None:
+            parts.append('{rate:.1f} a second'.format(rate=self.rate))
+        if self.eta is not None:
+            parts.append('about {eta!s} left'.format(
+                eta=format_duration(self.eta)))
+        line = ', '.join(parts)
+        if self.listed and self.checked_by_section and not self.already:
+            line += '; ' + ', '.join(
+                '{section!s} {done:d}/{total:d}'.format(
+                    section=section, total=self.listed[section],
+                    done=self.checked_by_section.get(section, 0))
+                for section in sorted(self.listed))
+        busy = [fraction for worker, count, fraction in self.utilisation()]
+        if len(busy) == 1:
+            line += '; the worker {busy:.0%} busy'.format(busy=busy[0])
+        elif busy:
+            line += ('; {count:d} workers {mean:.0%} busy on average '
+                     '({low:.0%}-{high:.0%})'.format(
+                         count=len(busy), mean=sum(busy) / len(busy),
+                         low=min(busy), high=max(busy)))
+        return line
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import hashlib
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from .body import NEEDS
+from .body import check_needs
+from .settings import SITEMAPCHECK_CHECKS
+
+try:  # try for Django 1.7+ first.
+    from django.utils.module_loading import import_string
+except ImportError:  # < Django 1.7
+    from django.utils.module_loading import import_by_path as import_string
+
+
+# resolved checks, keyed by the tuple of dotted paths they came from, so that
+# changing the setting (eg: in tests) doesn't serve stale callables.
+_resolved_checks = {}
+
+
+def get_check_paths():
+    return tuple(getattr(settings, 'SITEMAPCHECK_CHECKS', SITEMAPCHECK_CHECKS))
+
+
+def get_checks_hash(paths=None):
+    """
+    A hash of the configured checks, so results checked with different ones
+    can be told apart.
+    """
+    if paths is None:
+        paths = get_check_paths()
+    return hashlib.sha1('\n'.join(paths).encode('utf-8')).hexdigest()
+
+
+def load_checks(paths):
+    """
+    Imports every dotted path, raising ImproperlyConfigured naming the
+    offending entry if it can't be imported, isn't callable, or says it
+    `needs` something unknown.
+    """
+    checks = []
+    for path in paths:
+        try:
+            check = import_string(path)
+        except (ImportError, ImproperlyConfigured) as e:
+            msg = ("SITEMAPCHECK_CHECKS entry `{path!s}` could not be "
+                   "imported: {error!s}".format(path=path, error=e))
+            raise ImproperlyConfigured(msg)
+        if not callable(check):
+            msg = ("SITEMAPCHECK_CHECKS entry `{path!s}` is not "
+                   "callable".format(path=path))
+            raise ImproperlyConfigured(msg)
+        if check_needs(check) not in NEEDS:
+            msg = ("SITEMAPCHECK_CHECKS entry `{path!s}` needs `{needs!s}`, "
+                   "expected one of: {names!s}".format(
+                       path=path, needs=check_needs(check),
+                       names=', '.join(NEEDS)))
+            raise ImproperlyConfigured(msg)
+        checks.append(check)
+    return tuple(checks)
+
+
+def get_checks():
+    """
+    Returns the configured checks as a tuple of callables, importing them
+    only the first time they're asked for in this process.
+    """
+    paths = get_check_paths()
+    try:
+        return _resolved_checks[paths]
+    except KeyError:
+        checks = load_checks(paths)
+        _resolved_checks[paths] = checks
+        return checks
+
+
+def clear_checks():
+    _resolved_checks.clear()
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+Checking a deployed site over real HTTP, rather than through the test Client,
+so that whatever sits in front of Django (web server, CDN, compression) is
+part of what gets checked.
+"""
+from multiprocessing.pool import ThreadPool
+import socket
+import threading
+import time
+from timeit import default_timer
+import zlib
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import six
+from .concurrency import get_controller
+from .settings import SITEMAPCHECK_LIVE_TIMEOUT
+from .timeouts import URLTimeout
+from .timeouts import describe_timeout
+from .timeouts import with_retries
+from .utils import conditional_headers
+from .utils import current_worker
+from .utils import failed_response
+from .utils import get_chunksize
+from .utils import get_max_in_flight
+from .utils import stream_from_pool
+from .utils import summarise_response
+from .utils import Timings
+from .utils import unchanged_since
+
+
+http_client = six.moves.http_client
+urlsplit = six.moves.urllib_parse.urlsplit
+
+# response headers which describe the transfer rather than the content, and
+# so make no sense once the body has been read & decoded.
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'transfer-encoding',
+                      'content-encoding', 'content-length')
+
+
+# how often the watchdog looks for responses which have run out of time.
+WATCHDOG_INTERVAL = 0.1
+
+
+class Watchdog(object):
+    """
+    Shuts the socket of any connection whose response hasn't all come back
+    in time, so that one which keeps arriving a byte at a time (which the
+    socket's own timeout, being for each read, never catches) is given up on
+    too. A single thread watches every connection, while any is waiting.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.deadlines = {}
+        self.expired = set()
+        self.thread = None
+
+    def watch(self, connection, due):
+        with self.lock:
+            self.deadlines[connection] = due
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+
+    def release(self, connection):
+        """
+        Stops watching the connection, returning whether it ran out of time.
+        """
+        with self.lock:
+            self.deadlines.pop(connection, None)
+            if connection in self.expired:
+                self.expired.discard(connection)
+                return True
+            return False
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.deadlines:
+                    self.thread = None
+                    return
+                now = default_timer()
+                for connection, due in list(self.deadlines.items()):
+                    if due <= now:
+                        del self.deadlines[connection]
+                        self.expired.add(connection)
+                        self.expire(connection)
+            time.sleep(WATCHDOG_INTERVAL)
+
+    def expire(self, connection):
+        sock = connection.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                # already closed.
+                pass
+
+
+class ConnectionPool(object):
+    """
+    A fixed number of persistent (keep-alive) connections to one host,
+    shared between threads. A connection is taken for the duration of a
+    single request & response, then handed back for the next one.
+    """
+    def __init__(self, base_url, size, timeout=None):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ('http', 'https'):
+            msg = ("Expected an http:// or https:// URL, "
+                   "got `{url!s}`".format(url=base_url))
+            raise ValueError(msg)
+        if parts.scheme == 'https':
+            self.connection_class = http_client.HTTPSConnection
+        else:
+            self.connection_class = http_client.HTTPConnection
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.size = size
+        self.watchdog = Watchdog()
+        self.connections = six.moves.queue.LifoQueue()
+        for _ in range(size):
+            self.connections.put(None)
+
+    def new_connection(self):
+        return self.connection_class(self.host, self.port,
+                                     timeout=self.timeout)
+
+    def request(self, path, headers=None):
+        """
+        Returns the status code, headers and raw body for a GET of `path`,
+        and the seconds until the status line & headers came back.
+        A connection the server has since closed is replaced and the request
+        tried again, once. URLTimeout is raised if the whole response hasn't
+        come back within the pool's timeout.
+        """
+        headers = dict(headers or {})
+        headers.setdefault('Accept-Encoding', 'gzip')
+        connection = self.connections.get()
+        try:
+            for attempt in (1, 2):
+                reused = connection is not None
+                if connection is None:
+                    connection = self.new_connection()
+                expired = False
+                try:
+                    started = default_timer()
+                    connection.request('GET', self.prefix + path,
+                                       headers=headers)
+                    if self.timeout:
+                        self.watchdog.watch(connection,
+                                            started + self.timeout)
+                    try:
+                        response = connection.getresponse()
+                        ttfb = default_timer() - started
+                        body = response.read()
+                    finally:
+                        expired = self.watchdog.release(connection)
+                except (http_client.HTTPException, socket.error):
+                    connection.close()
+                    connection = None
+                    if expired:
+                        raise URLTimeout(describe_timeout(self.timeout))
+                    if reused and attempt == 1:
+                        continue
+                    raise
+                if expired:
+                    # the body may just have been cut short.
+                    connection.close()
+                    connection = None
+                    raise URLTimeout(describe_timeout(self.timeout))
+                if response.will_close:
+                    connection.close()
+                    connection = None
+                return response.status, response.getheaders(), body, ttfb
+        finally:
+            self.connections.put(connection)
+
+    def close(self):
+        for _ in range(self.size):
+            connection = self.connections.get()
+            if connection is not None:
+                connection.close()
+            self.connections.put(None)
+
+
+class UndecodableBody(Exception):
+    """
+    Raised for a body which isn't encoded as its Content-Encoding says.
+    """
+
+
+def decode_body(headers, body):
+    encoding = dict((k.lower(), v) for k, v in headers).get('content-encoding')
+    try:
+        if encoding is not None and encoding.lower() in ('gzip', 'x-gzip'):
+            return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        if encoding is not None and encoding.lower() == 'deflate':
+            return zlib.decompress(body)
+    except zlib.error as e:
+        msg = "Couldn't decode the {encoding!s} body: {error!s}".format(
+            encoding=encoding, error=e)
+        raise UndecodableBody(msg)
+    return body
+
+
+def build_response(status, headers, body):
+    """
+    Wraps what came back over the wire as an HttpResponse, so every check
+    sees the same kind of object it would from the test Client.
+    """
+    response = HttpResponse(content=decode_body(headers, body), status=status)
+    del response['Content-Type']
+    for name, value in headers:
+        if name.lower() not in HOP_BY_HOP_HEADERS:
+            response[name] = value
+    return response
+
+
+def handle_live_request(pool, path, lastmod=None, previous=None,
+                        controller=None):
+    if unchanged_since(previous, lastmod):
+        return previous.copy(elapsed=None, reused=True, timings=None,
+                             check_times=None, worker=current_worker())
+    if controller is not None:
+        controller.acquire()
+    status = ttfb = None
+    started = default_timer()
+    try:
+        status, headers, body, ttfb = pool.request(
+            path, headers=conditional_headers(previous))
+    except URLTimeout as e:
+        elapsed = default_timer() - started
+        return failed_response(path=path, msg=six.text_type(e),
+                               elapsed=elapsed)
+    except (http_client.HTTPException, socket.error) as e:
+        elapsed = default_timer() - started
+        msg = "{cls!s}: {error!s}".format(cls=e.__class__.__name__, error=e)
+        return failed_response(path=path, msg=msg, elapsed=elapsed)
+    finally:
+        if controller is not None:
+            controller.release(status, ttfb)
+    elapsed = default_timer() - started
+    try:
+        response = build_response(status, headers, body)
+    except UndecodableBody as e:
+        return failed_response(path=path, msg=six.text_type(e),
+                               elapsed=elapsed)
+    # queries & rendering happen on the far side, out of sight.
+    timings = Timings(ttfb=ttfb, queries=None, query_time=None,
+                      render_time=None)
+    return summarise_response(path=path, response=response, elapsed=elapsed,
+                              lastmod=lastmod, previous=previous,
+                              timings=timings)
+
+
+def liveprocessor(prepared_requests, base_url, concurrency=None,
+                  timeout=None, chunksize=None, max_in_flight=None,
+                  retries=None, adaptive=None, max_rate=None,
+                  controller=None):
+    """
+    Fetches each of the prepared requests from `base_url` over HTTP, using
+    `concurrency` threads sharing as many keep-alive connections, yielding
+    results as each one finishes. A URL which times out, can't be fetched,
+    or gets a 502, 503 or 504 is tried up to `retries` more times.
+
+    If `adaptive`, the number of requests made at once starts at
+    `concurrency` and changes with how the server copes, within the
+    configured bounds; either way, no more than `max_rate` are started a
+    second. A `controller` deciding this (see sitemapcheck.concurrency)
+    may be given instead.
+    """
+    if controller is None:
+        controller = get_controller(concurrency, adaptive=adaptive,
+                                    max_rate=max_rate)
+    # enough threads & connections for the most it may ever allow at once.
+    concurrency = controller.ceiling
+    if timeout is None:
+        timeout = getattr(settings, 'SITEMAPCHECK_LIVE_TIMEOUT',
+                          SITEMAPCHECK_LIVE_TIMEOUT)
+    chunksize = get_chunksize(chunksize)
+    max_in_flight = get_max_in_flight(concurrency, chunksize, max_in_flight)
+    connections = ConnectionPool(base_url, size=concurrency, timeout=timeout)
+
+    def fetch(task):
+        return with_retries(
+            lambda: handle_live_request(connections, *task,
+                                        controller=controller),
+            retries=retries)
+
+    threads = ThreadPool(concurrency)
+    tasks = ((x.path, x.lastmod, x.previous) for x in prepared_requests)
+    try:
+        for result in stream_from_pool(threads, fetch, tasks, chunksize,
+                                       max_in_flight):
+            yield result
+    finally:
+        connections.close()
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+Writers which each turn the results into a file, one result at a time as
+they arrive, so that nothing needs to hold every result at once.
+"""
+import csv
+import io
+import json
+import os
+import tempfile
+from xml.sax.saxutils import escape, quoteattr
+from django.conf import settings
+from django.template import Context
+from django.template.loader import get_template
+from django.utils import six
+from django.utils.encoding import force_text
+from django.utils.html import format_html
+from django.utils.text import slugify
+from .checks import Caution
+from .checks import Error
+from .checks import Info
+from .checks import Skipped
+from .checks import Success
+from .settings import SITEMAPCHECK_REPORTS
+from .utils import Timings
+
+
+def render_template(template, context):
+    # Django 1.8+ hands back a backend template wanting a dict, earlier
+    # versions the template itself, wanting a Context.
+    if hasattr(template, 'template'):
+        return template.render(context)
+    return template.render(Context(context))
+
+
+class ReportWriter(object):
+    """
+    Subclasses implement start, write (called once per result) & finish.
+
+    Used as a context manager, the document is started on the way in, and
+    always finished and closed on the way out, however the run ended, so
+    that what was written of it can still be read.
+    """
+    extension = None
+
+    def __init__(self, path, profile=None, duplicates=None, sampler=None):
+        self.path = path
+        self.profile = profile
+        self.duplicates = duplicates
+        self.sampler = sampler
+        self.count = 0
+        self.errors = 0
+        self.warnings = 0
+        self.skipped = 0
+        self.file = self.open(path)
+
+    def open(self, path):
+        return io.open(path, mode='w', encoding='utf-8')
+
+    def start(self):
+        pass
+
+    def write(self, result):
+        raise NotImplementedError
+
+    def finish(self):
+        pass
+
+    def add(self, result):
+        self.count += 1
+        for check in result.check_results:
+            if check is None:
+                continue
+            if check.code == Caution:
+                self.warnings += 1
+            elif check.code == Skipped:
+                self.skipped += 1
+            elif check.code not in (Success, Info):
+                self.errors += 1
+        self.write(result)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        try:
+            self.start()
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.finish()
+        finally:
+            self.close()
+
+
+class JsonLinesReportWriter(ReportWriter):
+    extension = 'jsonl'
+
+    def write(self, result):
+        self.file.write(force_text(json.dumps(result.as_dict())) + u'\n')
+
+
+class CsvReportWriter(ReportWriter):
+    """
+    One row per check, repeating the URL's details on each.
+    """
+    extension = 'csv'
+    columns = ('path', 'status_code', 'content_length', 'elapsed', 'ttfb',
+               'queries', 'query_time', 'render_time', 'check', 'result',
+               'message')
+
+    def open(self, path):
+        if six.PY2:
+            return open(path, 'wb')
+        return io.open(path, mode='w', encoding='utf-8', newline='')
+
+    def writerow(self, values):
+        if six.PY2:
+            values = [force_text(x).encode('utf-8') for x in values]
+        self.csv.writerow(values)
+
+    def start(self):
+        self.csv = csv.writer(self.file)
+        self.writerow(self.columns)
+
+    def write(self, result):
+        timings = result.timings or Timings(None, None, None, None)
+        details = (result.path, result.status_code, result.content_length,
+                   result.elapsed) + tuple(timings)
+        details = ['' if x is None else x for x in details]
+        for check in result.check_results:
+            if check is None:
+                continue
+            self.writerow(details + [check.name, check.code, check.msg])
+
+
+class JUnitReportWriter(ReportWriter):
+    """
+    A testsuite per URL, with a testcase per check; errors are failures,
+    skipped checks are skipped, and everything else passes. Counts are only
+    given per testsuite, as they're not known for the whole run until the
+    end. The size & timings of each URL are given as the testsuite's
+    properties.
+    """
+    extension = 'xml'
+
+    def start(self):
+        self.file.write(u'<?xml version="1.0" encoding="utf-8"?>\n'
+                        u'<testsuites name="sitemapcheck">\n')
+
+    def write(self, result):
+        checks = [(x, x.code not in (Success, Info, Caution, Skipped))
+                  for x in result.check_results if x is not None]
+        failures = len([failed for check, failed in checks if failed])
+        skipped = len([check for check, failed in checks
+                       if check.code == Skipped])
+        elapsed = result.elapsed or 0
+        self.file.write(
+            u'<testsuite name={name} tests="{tests:d}" failures="{failures:d}"'
+            u' errors="0" skipped="{skipped:d}" time="{time:.6f}">\n'.format(
+                name=quoteattr(force_text(result.path)), tests=len(checks),
+                failures=failures, skipped=skipped, time=elapsed))
+        properties = [('content_length', result.content_length)]
+        if result.timings is not None:
+            properties.extend(zip(Timings._fields, result.timings))
+        properties = [(k, v) for k, v in properties if v is not None]
+        if properties:
+            self.file.write(u'  <properties>\n')
+            for name, value in properties:
+                self.file.write(u'    <property name="{name!s}" '
+                                u'value="{value!s}"/>\n'.format(name=name,
+                                                                value=value))
+            self.file.write(u'  </properties>\n')
+        for check, failed in checks:
+            self.file.write(u'  <testcase classname={path} '
+                            u'name={name}>'.format(
+                                path=quoteattr(force_text(result.path)),
+                                name=quoteattr(force_text(check.name))))
+            message = escape(force_text(check.msg))
+            if failed:
+                self.file.write(u'<failure message={msg}>{body}'
+                                u'</failure>'.format(
+                                    msg=quoteattr(force_text(check.msg)),
+                                    body=message))
+            elif check.code == Skipped:
+                self.file.write(u'<skipped message={msg}/>'.format(
+                    msg=quoteattr(force_text(check.msg))))
+            else:
+                self.file.write(u'<system-out>{body}</system-out>'.format(
+                    body=message))
+            self.file.write(u'</testcase>\n')
+        self.file.write(u'</testsuite>\n')
+
+    def finish(self):
+        self.file.write(u'</testsuites>\n')
+
+
+class HtmlReportWriter(ReportWriter):
+    """
+    Renders each result as it arrives, leaving the index of URLs to the
+    end of the document; the paths for it are kept on disk until then.
+    """
+    extension = 'html'
+    header_template = 'sitemapcheck/report_header.html'
+    result_template = 'sitemapcheck/report_result.html'
+    footer_template = 'sitemapcheck/report_footer.html'
+    # where in the rendered footer the index of URLs goes.
+    index_marker = u'<!-- index -->'
+
+    def context(self, **extra):
+        context = {'Success': Success, 'Warning': Caution, 'Caution': Caution,
+                   'Info': Info, 'Error': Error, 'Skipped': Skipped}
+        context.update(extra)
+        return context
+
+    def start(self):
+        self.index = tempfile.TemporaryFile(mode='w+')
+        self.result = get_template(self.result_template)
+        header = get_template(self.header_template)
+        self.file.write(force_text(render_template(header, self.context())))
+
+    def write(self, result):
+        self.index.write(json.dumps(force_text(result.path)) + '\n')
+        self.file.write(force_text(render_template(
+            self.result, self.context(result=result))))
+
+    def finish(self):
+        footer = get_template(self.footer_template)
+        check_profile = None
+        if self.profile is not None:
+            # everything but the total in milliseconds.
+            check_profile = [
+                dict(row, **dict((key, None if row[key] is None
+                                  else row[key] * 1000)
+                                 for key in ('mean', 'p50', 'p90', 'p99',
+                                             'max')))
+                for row in self.profile.rows()]
+        duplicates = None
+        if self.duplicates is not None:
+            duplicates = self.duplicates.rows()
+        sample = None
+        if self.sampler is not None:
+            sample = self.sampler.rows()
+        footer = force_text(render_template(footer, self.context(
+            count=self.count, errors=self.errors, warnings=self.warnings,
+            skipped=self.skipped, check_profile=check_profile,
+            duplicates=duplicates, sample=sample)))
+        before, marker, after = footer.partition(self.index_marker)
+        self.file.write(before)
+        self.index.seek(0)
+        for line in self.index:
+            path = json.loads(line)
+            self.file.write(format_html(
+                u'    <li><a href="#link-{0}">{1}</a></li>\n',
+                slugify(path), path))
+        self.file.write(after)
+
+    def close(self):
+        if getattr(self, 'index', None) is not None:
+            self.index.close()
+        super(HtmlReportWriter, self).close()
+
+
+REPORT_WRITERS = {
+    'html': HtmlReportWriter,
+    'jsonl': JsonLinesReportWriter,
+    'csv': CsvReportWriter,
+    'junit': JUnitReportWriter,
+}
+
+
+def parse_report(spec, root_dir):
+    """
+    Turns `format` or `format:path` into the format and where to write it,
+    by default sitemapcheck_report.<extension> within `root_dir`.
+    """
+    name, _, path = spec.partition(':')
+    if name not in REPORT_WRITERS:
+        msg = ("Unknown report format `{name!s}`, expected one of: "
+               "{names!s}".format(name=name,
+                                  names=', '.join(sorted(REPORT_WRITERS))))
+        raise ValueError(msg)
+    if not path:
+        path = 'sitemapcheck_report.{ext!s}'.format(
+            ext=REPORT_WRITERS[name].extension)
+    return name, os.path.realpath(os.path.join(root_dir, path))
+
+
+def get_reports():
+    return getattr(settings, 'SITEMAPCHECK_REPORTS', SITEMAPCHECK_REPORTS)
+
+
+def write_reports(results, reports, profile=None, duplicates=None,
+                  sampler=None):
+    """
+    Passes through each result, handing it to every writer as it goes.
+    `reports` is a sequence of (format, path) pairs; a CheckProfile, the
+    Deduplicator which dropped repeated URLs, and the Sampler which picked
+    the URLs checked, if given, are included where the format allows.
+    """
+    writers = []
+    try:
+        for name, path in reports:
+            writer = REPORT_WRITERS[name](path, profile=profile,
+                                          duplicates=duplicates,
+                                          sampler=sampler)
+            writers.append(writer.__enter__())
+        for result in results:
+            for writer in writers:
+                writer.add(result)
+            yield result
+    finally:
+        exit_writers(writers)
+
+
+def exit_writers(writers):
+    """
+    Finishes & closes every writer, even if one of them fails to.
+    """
+    if writers:
+        try:
+            writers[0].__exit__(None, None, None)
+        finally:
+            exit_writers(writers[1:])
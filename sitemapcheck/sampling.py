@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Checking a sample of the URLs rendered by each view, rather than all of
+them, on the basis that URLs sharing a view mostly share a template too.
+
+Which URLs are sampled depends on the seed and the paths themselves, rather
+than on chance, so the same seed picks the same URLs on every run.
+"""
+import hashlib
+import heapq
+from django.conf import settings
+from django.core.urlresolvers import resolve, Resolver404
+from django.utils.encoding import force_bytes
+from .settings import SITEMAPCHECK_SAMPLE
+from .settings import SITEMAPCHECK_SAMPLE_SEED
+
+
+UNRESOLVED = '(unresolved)'
+
+# sample keys are the first 8 bytes of an MD5, as an integer.
+KEY_RANGE = 2 ** 64
+
+
+def get_sample(sample=None):
+    if sample is None:
+        sample = getattr(settings, 'SITEMAPCHECK_SAMPLE', SITEMAPCHECK_SAMPLE)
+    return sample
+
+
+def get_sample_seed(seed=None):
+    if seed is None:
+        seed = getattr(settings, 'SITEMAPCHECK_SAMPLE_SEED',
+                       SITEMAPCHECK_SAMPLE_SEED)
+    return seed
+
+
+def parse_sample(value):
+    """
+    Turns a number of URLs (eg: 5) or a fraction of them (eg: 0.1) to check
+    per URL pattern into a (size, fraction) pair, one of which is None.
+    """
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        number = None
+    if number is not None and 0 < number < 1:
+        return None, number
+    if number is not None and number >= 1 and number == int(number):
+        return int(number), None
+    msg = ("Expected a number of URLs (eg: 5) or a fraction of them (eg: "
+           "0.1) to sample, not `{value!s}`".format(value=value))
+    raise ValueError(msg)
+
+
+def url_pattern(path):
+    """
+    What to group a path by: the (namespaced) name of the URL pattern it
+    resolves to, or failing that the dotted path of its view.
+    """
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return UNRESOLVED
+    if match.url_name:
+        return ':'.join(tuple(match.namespaces) + (match.url_name,))
+    func = match.func
+    return '{module!s}.{name!s}'.format(
+        module=getattr(func, '__module__', None),
+        name=getattr(func, '__name__', func.__class__.__name__))
+
+
+def sample_key(seed, path):
+    digest = hashlib.md5(force_bytes(u'{seed!s}:{path!s}'.format(
+        seed=seed, path=path)))
+    return int(digest.hexdigest()[:16], 16)
+
+
+class Sampler(object):
+    """
+    Picks `size` URLs per pattern (those with the lowest keys for the
+    seed), or roughly `fraction` of them (those whose key falls below it),
+    counting how many each pattern had listed and how many were picked.
+
+    Picking a fixed number means every URL has to be listed before any are
+    known to be in the sample, so they're only passed on once the sitemap
+    is exhausted, holding at most `size` per pattern until then; picking a
+    fraction passes each on as soon as it's listed, and always includes the
+    first URL of each pattern, so none go unchecked.
+    """
+    def __init__(self, size=None, fraction=None, seed=None):
+        if (size is None) == (fraction is None):
+            raise ValueError("Sample either a size or a fraction")
+        self.size = size
+        self.fraction = fraction
+        self.seed = get_sample_seed(seed)
+        self.listed = {}
+        self.sampled = {}
+
+    def sampling(self, prepared_requests):
+        """
+        Passes through the prepared requests which are in the sample, in the
+        order they were listed.
+        """
+        if self.size is not None:
+            return self.sample_size(prepared_requests)
+        return self.sample_fraction(prepared_requests)
+
+    def sample_fraction(self, prepared_requests):
+        threshold = self.fraction * KEY_RANGE
+        for prepared in prepared_requests:
+            pattern = url_pattern(prepared.path)
+            first = pattern not in self.listed
+            self.listed[pattern] = self.listed.get(pattern, 0) + 1
+            if first or sample_key(self.seed, prepared.path) < threshold:
+                self.sampled[pattern] = self.sampled.get(pattern, 0) + 1
+                yield prepared
+
+    def sample_size(self, prepared_requests):
+        # per pattern, a heap of the `size` lowest keys seen, with the
+        # largest of them (negated) at the top.
+        kept = {}
+        for number, prepared in enumerate(prepared_requests):
+            pattern = url_pattern(prepared.path)
+            self.listed[pattern] = self.listed.get(pattern, 0) + 1
+            item = (-sample_key(self.seed, prepared.path), number, prepared)
+            heap = kept.setdefault(pattern, [])
+            if len(heap) < self.size:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+        picked = []
+        for pattern, heap in kept.items():
+            self.sampled[pattern] = len(heap)
+            picked.extend((number, prepared) for key, number, prepared in heap)
+        picked.sort(key=lambda item: item[0])
+        for number, prepared in picked:
+            yield prepared
+
+    @property
+    def total_listed(self):
+        return sum(self.listed.values())
+
+    @property
+    def total_sampled(self):
+        return sum(self.sampled.values())
+
+    def rows(self):
+        """
+        A dictionary of `pattern`, `sampled`, `listed` and `coverage` (as a
+        percentage) for each pattern, by pattern.
+        """
+        rows = []
+        for pattern in sorted(self.listed):
+            listed = self.listed[pattern]
+            sampled = self.sampled.get(pattern, 0)
+            rows.append({'pattern': pattern, 'sampled': sampled,
+                         'listed': listed,
+                         'coverage': 100.0 * sampled / listed})
+        return rows
+
+    def as_dict(self):
+        return {'size': self.size, 'fraction': self.fraction,
+                'seed': self.seed, 'listed': self.listed,
+                'sampled': self.sampled}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        The counts of a Sampler written out with as_dict.
+        """
+        sampler = cls(size=data['size'], fraction=data['fraction'],
+                      seed=data['seed'])
+        sampler.listed = dict(data['listed'])
+        sampler.sampled = dict(data['sampled'])
+        return sampler
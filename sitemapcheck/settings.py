@@ -17,7 +17,126 @@ SITEMAPCHECK_CHECKS = (
     'sitemapcheck.checks.check_content_type_nosniff_header',
     'sitemapcheck.checks.check_html_rel_home',
     'sitemapcheck.checks.check_html_schemaorg_breadcrumbs',
+    'sitemapcheck.checks.check_query_budget',
+    'sitemapcheck.checks.check_repeated_queries',
 )
 
+# the most database queries a single URL may run before it's flagged ...
+SITEMAPCHECK_QUERY_BUDGET = 50
+
+# ... and how many times one query, ignoring its parameters, may be repeated
+# before it's flagged as a likely N+1.
+SITEMAPCHECK_REPEATED_QUERY_LIMIT = 5
+
 
 SITEMAPCHECK_MULTIPROCESSING = False
+
+# when using many processes, have each of them list the URLs on whole pages
+# of the sitemap, and check them, rather than listing every URL up front in
+# the parent; `--enumerate-in-workers` turns this on for a single run.
+SITEMAPCHECK_ENUMERATE_IN_WORKERS = False
+
+# how many URLs are handed to a worker process at a time.
+SITEMAPCHECK_CHUNKSIZE = 4
+
+# the most URLs which may be dispatched to the pool but not yet reported on;
+# None means 2 chunks for every process.
+SITEMAPCHECK_MAX_IN_FLIGHT = None
+
+# how many seconds a URL may take before it's given up on, and reported as an
+# error; None waits for ever. With many processes, a worker which goes over
+# is killed and replaced. `--timeout` replaces this.
+SITEMAPCHECK_TIMEOUT = 60
+
+# how many more times to try a URL which timed out, couldn't be fetched, or
+# responded 502, 503 or 504, waiting SITEMAPCHECK_RETRY_BACKOFF seconds before
+# the first retry and twice as long before each after it; `--retries`
+# replaces this.
+SITEMAPCHECK_RETRIES = 0
+SITEMAPCHECK_RETRY_BACKOFF = 1.0
+
+# when the checks only look at the <head> of each page, how much of the body
+# to read at most while looking for the end of it.
+SITEMAPCHECK_HEAD_BYTES = 256 * 1024
+
+# response headers kept in each result, for the report; the body and every
+# other header are thrown away once the checks have run.
+SITEMAPCHECK_RESULT_HEADERS = (
+    'Content-Type',
+    'Location',
+    'Cache-Control',
+    'ETag',
+    'Last-Modified',
+)
+
+# a sitemap (or sitemap index) XML file, plain or gzipped, or the URL of the
+# sitemap view, to read the URLs from instead of the Sitemap classes; eg: the
+# sitemap.xml django-static-sitemaps writes. `--sitemap-xml` replaces this.
+SITEMAPCHECK_SITEMAP_XML = None
+
+# skip URLs whose path has already been listed, in the same sitemap section
+# or another; paths are remembered exactly up to SITEMAPCHECK_DEDUP_EXACT_LIMIT
+# of them, then in Bloom filters, which may mistake at most
+# SITEMAPCHECK_DEDUP_ERROR_RATE of new paths for ones already seen.
+SITEMAPCHECK_DEDUPLICATE = True
+SITEMAPCHECK_DEDUP_EXACT_LIMIT = 100000
+SITEMAPCHECK_DEDUP_ERROR_RATE = 0.0001
+
+# check only a sample of the URLs each URL pattern (or view) renders: either
+# a number of them (eg: 5) or a fraction (eg: 0.1); `--sample` replaces this.
+# The same seed picks the same URLs every time.
+SITEMAPCHECK_SAMPLE = None
+SITEMAPCHECK_SAMPLE_SEED = 0
+
+# when checking a deployed site over HTTP (`--base-url`), how many requests
+# are made at once, each over its own keep-alive connection ...
+SITEMAPCHECK_LIVE_CONCURRENCY = 8
+
+# ... and how many seconds to wait on the server before giving up on a URL.
+SITEMAPCHECK_LIVE_TIMEOUT = 30
+
+# rather than always making SITEMAPCHECK_LIVE_CONCURRENCY requests at once,
+# start there and adapt to how the server copes (`--adaptive` turns this on
+# for a single run): make more at once while responses keep coming back in
+# good time, and fewer when they fail, say the server's overloaded (429,
+# 502, 503, 504) or take over SITEMAPCHECK_LIVE_LATENCY_TOLERANCE times as
+# long as they did at best; always between the MIN and MAX given here.
+SITEMAPCHECK_LIVE_ADAPTIVE = False
+SITEMAPCHECK_LIVE_MIN_CONCURRENCY = 1
+SITEMAPCHECK_LIVE_MAX_CONCURRENCY = 32
+SITEMAPCHECK_LIVE_LATENCY_TOLERANCE = 2.0
+
+# start no more than this many requests a second, adapting or not, or None
+# for no limit; `--max-rate` replaces this.
+SITEMAPCHECK_LIVE_MAX_RATE = None
+
+# re-use the results of the last run for URLs which haven't changed, unless
+# `--full` is given; `--incremental` turns this on for a single run.
+SITEMAPCHECK_INCREMENTAL = False
+
+# where the incremental mode keeps what each URL looked like last time.
+SITEMAPCHECK_FINGERPRINT_DATABASE = '.sitemapcheck.sqlite3'
+
+# where each result is written as soon as it arrives, so a run which is
+# stopped part way through can be carried on with `--resume`; removed once a
+# run finishes. `--checkpoint` replaces this, and None writes no checkpoint.
+SITEMAPCHECK_CHECKPOINT = 'sitemapcheck_checkpoint.jsonl'
+
+# how often, in seconds, to say how far a run has got: how many URLs are
+# done of how many are listed, how fast, how long is left, and how busy the
+# workers are; `--progress-interval` replaces this, and None (or 0) says
+# nothing until the end.
+SITEMAPCHECK_PROGRESS_INTERVAL = 10
+
+# where to write the run's counts and response time histograms, in the
+# Prometheus text format, once it's over (eg: for node_exporter's textfile
+# collector to pick up); `--metrics` replaces this, and None writes nothing.
+SITEMAPCHECK_METRICS = None
+
+# the Unix socket `sitemapcheck_daemon` listens on, and `sitemapcheck_client`
+# sends its URLs to; `--socket` replaces this for either.
+SITEMAPCHECK_DAEMON_SOCKET = 'sitemapcheck.sock'
+
+# the reports written by default, each as `format` or `format:path`, where
+# format is one of html, jsonl, csv or junit; `--report` replaces these.
+SITEMAPCHECK_REPORTS = ('html',)
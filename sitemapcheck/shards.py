@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Splitting the sitemap's URLs between several machines, each checking a
+disjoint share of them, and combining what each wrote back into one set
+of results.
+"""
+import hashlib
+import json
+from django.utils.encoding import force_bytes
+from .utils import Response
+
+
+def parse_shard(value):
+    """
+    Turns `I/N` into a tuple of (I, N), where 1 <= I <= N.
+    """
+    try:
+        index, count = (int(x) for x in value.split('/'))
+    except ValueError:
+        msg = ("Expected a shard in the form I/N, eg: 1/4, "
+               "got `{value!s}`".format(value=value))
+        raise ValueError(msg)
+    if count < 1 or not 1 <= index <= count:
+        msg = ("Shard `{value!s}` is out of range; I must be between 1 and "
+               "N".format(value=value))
+        raise ValueError(msg)
+    return index, count
+
+
+def shard_for_path(path, count):
+    """
+    The (1-based) shard a path belongs to. md5 rather than hash() so that
+    every machine, Python version and process agrees.
+    """
+    digest = hashlib.md5(force_bytes(path)).hexdigest()
+    return int(digest[:8], 16) % count + 1
+
+
+def shard_requests(prepared_requests, index, count):
+    for prepared in prepared_requests:
+        if shard_for_path(prepared.path, count) == index:
+            yield prepared
+
+
+def write_shard(results, fileobj, index, count, finished=None,
+                duplicates=None, sampler=None):
+    """
+    Passes through each result, writing it to `fileobj` as a line of JSON,
+    after a first line saying which shard this is. Once they're all written,
+    a last line says how many there were, unless `finished` (if given) says
+    the run was stopped part way; a shard file without one is incomplete.
+
+    The last line also holds the counts of the Deduplicator and Sampler, if
+    given, which are for every URL listed rather than the shard's alone.
+    """
+    header = {'sitemapcheck_shard': {'index': index, 'count': count}}
+    fileobj.write(json.dumps(header) + '\n')
+    written = 0
+    for result in results:
+        fileobj.write(json.dumps(result.as_dict()) + '\n')
+        written += 1
+        yield result
+    if finished is None or finished():
+        summary = {'count': written}
+        if duplicates is not None:
+            summary['duplicates'] = duplicates.as_dict()
+        if sampler is not None:
+            summary['sample'] = sampler.as_dict()
+        footer = {'sitemapcheck_shard_end': summary}
+        fileobj.write(json.dumps(footer) + '\n')
+    fileobj.flush()
+
+
+def read_shard_header(fileobj, name):
+    try:
+        header = json.loads(fileobj.readline())['sitemapcheck_shard']
+        return header['index'], header['count']
+    except (ValueError, KeyError, TypeError):
+        msg = "`{name!s}` isn't a sitemapcheck shard file".format(name=name)
+        raise ValueError(msg)
+
+
+def check_shard_complete(fileobj, name):
+    """
+    Makes sure the rest of the shard file ends by saying how many results it
+    holds, and that it holds that many, as it won't if the run writing it
+    didn't finish, returning what that last line says.
+    """
+    lines = 0
+    last = None
+    for line in fileobj:
+        if line.strip():
+            lines += 1
+            last = line
+    try:
+        summary = json.loads(last)['sitemapcheck_shard_end']
+        written = summary['count']
+    except (ValueError, KeyError, TypeError):
+        written = None
+    if written != lines - 1:
+        msg = ("`{name!s}` is incomplete, the run writing it having been "
+               "stopped part way; check that shard again".format(name=name))
+        raise ValueError(msg)
+    return summary
+
+
+def read_shard_summary(filename):
+    """
+    What the last line of a complete shard file says: how many results it
+    holds, and the counts of duplicates & of the sample, if there were any.
+    """
+    with open(filename) as f:
+        read_shard_header(f, filename)
+        return check_shard_complete(f, filename)
+
+
+def order_shards(filenames):
+    """
+    Makes sure the given shard files are exactly the shards 1 to N of the
+    same split, and that each is complete, returning them in order.
+    """
+    headers = {}
+    for filename in filenames:
+        with open(filename) as f:
+            index, count = read_shard_header(f, filename)
+            check_shard_complete(f, filename)
+        if (index, count) in headers:
+            msg = ("`{a!s}` and `{b!s}` are both shard "
+                   "{index:d}/{count:d}".format(a=headers[(index, count)],
+                                                b=filename, index=index,
+                                                count=count))
+            raise ValueError(msg)
+        headers[(index, count)] = filename
+    counts = set(count for index, count in headers)
+    if len(counts) > 1:
+        msg = "The shard files come from splits of different sizes"
+        raise ValueError(msg)
+    for count in counts:
+        missing = [str(index) for index in range(1, count + 1)
+                   if (index, count) not in headers]
+        if missing:
+            msg = ("Missing shard {missing!s} of {count:d}".format(
+                missing=', '.join(missing), count=count))
+            raise ValueError(msg)
+    return [headers[key] for key in sorted(headers)]
+
+
+def read_shards(filenames):
+    """
+    Yields every result from the given shard files.
+    """
+    for filename in filenames:
+        with open(filename) as f:
+            f.readline()
+            for line in f:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if 'sitemapcheck_shard_end' not in data:
+                    yield Response.from_dict(data)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Reading the URLs to check from sitemap XML which already exists, either as
+files on disk (as written by django-static-sitemaps, plain or gzipped) or as
+the output of a sitemap view, instead of from the Sitemap classes behind it.
+
+Each document is parsed incrementally, throwing away every <url> once it's
+been read, so memory use doesn't grow with the size of the sitemap.
+"""
+import gzip
+import io
+import os
+from xml.etree.ElementTree import iterparse
+from django.conf import settings
+from django.test import Client
+from django.utils import six
+from .settings import SITEMAPCHECK_SITEMAP_XML
+from .utils import get_worker_client
+
+
+urlsplit = six.moves.urllib_parse.urlsplit
+urlunsplit = six.moves.urllib_parse.urlunsplit
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# the elements of a <url> (or an index's <sitemap>) which are kept.
+URL_FIELDS = ('loc', 'lastmod', 'changefreq', 'priority')
+
+
+def get_sitemap_xml(source=None):
+    if source is None:
+        source = getattr(settings, 'SITEMAPCHECK_SITEMAP_XML',
+                         SITEMAPCHECK_SITEMAP_XML)
+    return source
+
+
+def local_name(tag):
+    # ignores the namespace, which isn't always given.
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_sitemap_xml(fileobj):
+    """
+    Yields ('url', info) for each <url> of a urlset, and ('sitemap', info)
+    for each <sitemap> of a sitemap index, where info is a dictionary of
+    `location`, `lastmod`, `changefreq` and `priority` (as Sitemap.get_urls
+    gives them, but as text); the latter three may be None.
+    """
+    root = None
+    for event, element in iterparse(fileobj, events=('start', 'end')):
+        if root is None:
+            root = element
+            continue
+        if event != 'end':
+            continue
+        kind = local_name(element.tag)
+        if kind not in ('url', 'sitemap'):
+            continue
+        values = dict((local_name(child.tag), (child.text or '').strip())
+                      for child in element
+                      if local_name(child.tag) in URL_FIELDS)
+        element.clear()
+        # drop the now empty element from the root too.
+        root.clear()
+        location = values.pop('loc', None)
+        if not location:
+            continue
+        info = {'location': location}
+        for field in URL_FIELDS[1:]:
+            info[field] = values.get(field) or None
+        yield kind, info
+
+
+def open_sitemap_file(path):
+    """
+    Opens a sitemap file for reading bytes, decompressing it if it's gzipped
+    (whatever it's named).
+    """
+    fileobj = io.open(path, mode='rb')
+    magic = fileobj.read(len(GZIP_MAGIC))
+    fileobj.seek(0)
+    if magic == GZIP_MAGIC:
+        fileobj.close()
+        return gzip.open(path, 'rb')
+    return fileobj
+
+
+def fetch_sitemap(path, client=Client):
+    """
+    The output of the sitemap view at `path`, as a file-like object.
+    """
+    client = get_worker_client(client)
+    response = client.get(path)
+    if response.status_code != 200:
+        msg = ("Fetching the sitemap at `{path!s}` returned "
+               "{status:d}".format(path=path, status=response.status_code))
+        raise ValueError(msg)
+    content = response.content
+    if content[:len(GZIP_MAGIC)] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=io.BytesIO(content), mode='rb')
+    return io.BytesIO(content)
+
+
+def is_url(source):
+    return urlsplit(source).scheme in ('http', 'https')
+
+
+def source_kind(source):
+    """
+    Whether `source` is a 'file', or a 'url' (or just the path of one) to
+    request from the sitemap view.
+    """
+    if not is_url(source) and os.path.isfile(source):
+        return 'file'
+    if is_url(source) or source.startswith('/'):
+        return 'url'
+    msg = "No sitemap file or URL `{source!s}`".format(source=source)
+    raise ValueError(msg)
+
+
+def open_sitemap(source, client=Client):
+    if source_kind(source) == 'file':
+        return open_sitemap_file(source)
+    parts = urlsplit(source)
+    # keeping the query, as an index lists each page after a section's first
+    # as `?p=N`.
+    return fetch_sitemap(urlunsplit(('', '', parts.path, parts.query, '')),
+                         client=client)
+
+
+def index_entry_source(location, parent):
+    """
+    Where to read a sitemap listed in an index from. For an index read from a
+    file, that's the file of the same name alongside it (or the same name
+    gzipped); otherwise it's requested from its URL.
+    """
+    if source_kind(parent) == 'url':
+        return location
+    name = os.path.basename(urlsplit(location).path)
+    candidate = os.path.join(os.path.dirname(parent), name)
+    if not os.path.isfile(candidate) and os.path.isfile(candidate + '.gz'):
+        candidate += '.gz'
+    return candidate
+
+
+def section_name(source):
+    """
+    The name of the sitemap file or URL, without its extensions, standing in
+    for the name of a sitemap section.
+    """
+    name = os.path.basename(urlsplit(source).path)
+    for extension in ('.gz', '.xml'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name or source
+
+
+def sitemap_xml_urls(source, client=Client):
+    """
+    Yields the information for each URL in the sitemap at `source`, following
+    a sitemap index to each of the sitemaps it lists, in a form
+    sitemap_request_iterator accepts; the `section` of each is the name of
+    the sitemap which listed it.
+    """
+    pending = [source]
+    seen = set()
+    while pending:
+        current = pending.pop(0)
+        if current in seen:
+            continue
+        seen.add(current)
+        children = []
+        section = section_name(current)
+        fileobj = open_sitemap(current, client=client)
+        try:
+            for kind, info in parse_sitemap_xml(fileobj):
+                if kind == 'url':
+                    info['section'] = section
+                    yield info
+                else:
+                    children.append(index_entry_source(info['location'],
+                                                       parent=current))
+        finally:
+            fileobj.close()
+        # an index's sitemaps are read in the order given, before anything
+        # else still to be read.
+        pending[:0] = children
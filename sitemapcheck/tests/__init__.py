@@ -1,3 +1,24 @@
 # -*- coding: utf-8 -*-
+from .test_body import *
+from .test_checkpoints import *
 from .test_checks import *
+from .test_concurrency import *
+from .test_daemon import *
+from .test_dedup import *
+from .test_document import *
+from .test_fingerprints import *
+from .test_instrumentation import *
+from .test_links import *
+from .test_metrics import *
+from .test_pages import *
+from .test_profiling import *
+from .test_progress import *
+from .test_registry import *
+from .test_remote import *
+from .test_reports import *
+from .test_sampling import *
+from .test_shards import *
+from .test_sitemapxml import *
+from .test_timeouts import *
 from .test_utils import *
+from .test_workers import *
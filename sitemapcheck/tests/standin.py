@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+A local HTTP server standing in for a deployed site, for testing the
+checks which fetch URLs over a real connection.
+"""
+import gzip
+import io
+import socket
+import threading
+import time
+from django.utils import six
+
+
+PAGE = b"""<!doctype html>
+<html><head><title>Stand-in</title></head><body>yay</body></html>"""
+
+
+def gzipped(content):
+    buf = io.BytesIO()
+    f = gzip.GzipFile(fileobj=buf, mode='wb')
+    try:
+        f.write(content)
+    finally:
+        f.close()
+    return buf.getvalue()
+
+
+class StandInHandler(six.moves.BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.server.record_connection()
+        six.moves.BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+    def do_GET(self):
+        self.server.record_request(self.path, self.headers)
+        route = self.server.routes.get(self.path)
+        if route is None:
+            status, headers, body = 404, {}, b'not here'
+        else:
+            status, headers, body = route
+            headers = dict(headers)
+        latency = self.server.begin()
+        try:
+            if latency:
+                time.sleep(latency)
+        finally:
+            self.server.end()
+        # seconds between each byte of the body, sent one at a time.
+        trickle = headers.pop('trickle', 0)
+        accepts = self.headers.get('Accept-Encoding') or ''
+        if headers.pop('gzip', False) and 'gzip' in accepts:
+            body = gzipped(body)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not trickle:
+            self.wfile.write(body)
+            return
+        self.wfile.flush()
+        try:
+            for index in range(len(body)):
+                # straight to the socket, so nothing is left buffered to
+                # fail again once the client has gone.
+                self.connection.sendall(body[index:index + 1])
+                time.sleep(trickle)
+        except socket.error:
+            # given up on.
+            self.close_connection = True
+
+
+class StandInServer(six.moves.socketserver.ThreadingMixIn,
+                    six.moves.BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, routes=None, latency=0, capacity=None,
+                 overload_latency=0):
+        six.moves.BaseHTTPServer.HTTPServer.__init__(
+            self, ('127.0.0.1', 0), StandInHandler)
+        self.routes = routes or {}
+        self.latency = latency
+        # beyond `capacity` requests at once, each more adds this much to
+        # every response, as a server with too much on would.
+        self.capacity = capacity
+        self.overload_latency = overload_latency
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = []
+        self.active = 0
+        self.busiest = 0
+
+    @property
+    def base_url(self):
+        return 'http://{0}:{1:d}'.format(*self.server_address)
+
+    def record_connection(self):
+        with self.lock:
+            self.connections += 1
+
+    def record_request(self, path, headers):
+        with self.lock:
+            self.requests.append((path, headers))
+
+    def begin(self):
+        """
+        Notes a request being handled, returning how long it should take.
+        """
+        with self.lock:
+            self.active += 1
+            self.busiest = max(self.busiest, self.active)
+            latency = self.latency
+            if self.capacity is not None and self.active > self.capacity:
+                latency += (self.overload_latency *
+                            (self.active - self.capacity))
+            return latency
+
+    def end(self):
+        with self.lock:
+            self.active -= 1
+
+    def route(self, path, status=200, headers=None, body=PAGE):
+        self.routes[path] = (status, headers or {}, body)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       kwargs={'poll_interval': 0.05})
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+import hashlib
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase as Test
+from django.test.utils import override_settings
+from sitemapcheck.body import BODY
+from sitemapcheck.body import HEAD
+from sitemapcheck.body import HEADERS
+from sitemapcheck.body import get_needs
+from sitemapcheck.body import read_body
+from sitemapcheck.checks import check_html_rel_home
+from sitemapcheck.checks import check_html_title
+from sitemapcheck.checks import check_status_code
+from sitemapcheck.document import Document
+from sitemapcheck.registry import load_checks
+from sitemapcheck.utils import summarise_response
+
+
+HTML = (b'<!doctype html><html><head><title>yay</title></head>'
+        b'<body>' + b'x' * 1000 + b'</body></html>')
+
+
+def unknown_check(response):
+    return None
+unknown_check.needs = 'everything'
+
+
+def undeclared_check(response):
+    return None
+
+
+class Chunks(object):
+    """
+    Hands out the chunks, remembering how many were asked for.
+    """
+    def __init__(self, *chunks):
+        self.chunks = chunks
+        self.taken = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.taken += 1
+            yield chunk
+
+
+class NeedsTestCase(Test):
+    def test_get_needs(self):
+        self.assertEqual(get_needs(()), HEADERS)
+        self.assertEqual(get_needs((check_status_code,)), HEADERS)
+        self.assertEqual(get_needs((check_status_code, check_html_title)),
+                         HEAD)
+        self.assertEqual(get_needs((check_html_title, check_html_rel_home)),
+                         BODY)
+        self.assertEqual(get_needs((check_status_code, undeclared_check)),
+                         BODY)
+
+    def test_unknown_needs(self):
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'everything'):
+            load_checks(('sitemapcheck.tests.test_body.unknown_check',))
+
+
+class ReadBodyTestCase(Test):
+    def test_in_memory_head(self):
+        response = HttpResponse([HTML[:20], HTML[20:]])
+        body = read_body(response, HEAD)
+        self.assertEqual(body.content,
+                         b'<!doctype html><html><head><title>yay</title>'
+                         b'</head>')
+        self.assertTrue(body.complete)
+        self.assertEqual(body.length, len(HTML))
+        self.assertEqual(body.sha1, hashlib.sha1(HTML).hexdigest())
+
+    def test_in_memory_headers(self):
+        body = read_body(HttpResponse(HTML), HEADERS)
+        self.assertEqual(body.content, b'')
+        self.assertEqual(body.length, len(HTML))
+
+    def test_in_memory_body(self):
+        body = read_body(HttpResponse(HTML), BODY)
+        self.assertEqual(body.content, HTML)
+
+    def test_streaming_head_stops_early(self):
+        chunks = Chunks(b'<html><head><title>yay</tit', b'le></he',
+                        b'ad ><body>', b'x' * 1000, b'</body>')
+        body = read_body(StreamingHttpResponse(chunks), HEAD)
+        self.assertEqual(body.content,
+                         b'<html><head><title>yay</title></head >')
+        self.assertFalse(body.complete)
+        self.assertIsNone(body.length)
+        self.assertIsNone(body.sha1)
+        self.assertEqual(chunks.taken, 3)
+
+    def test_streaming_headers_reads_nothing(self):
+        chunks = Chunks(HTML)
+        body = read_body(StreamingHttpResponse(chunks), HEADERS)
+        self.assertEqual(chunks.taken, 0)
+        self.assertFalse(body.complete)
+
+    def test_streaming_body(self):
+        chunks = Chunks(HTML[:100], HTML[100:])
+        body = read_body(StreamingHttpResponse(chunks), BODY)
+        self.assertEqual(body.content, HTML)
+        self.assertTrue(body.complete)
+        self.assertEqual(body.length, len(HTML))
+
+    def test_head_bytes(self):
+        chunks = Chunks(b'<html><head>', b'y' * 100, b'</head>')
+        body = read_body(StreamingHttpResponse(chunks), HEAD, head_bytes=50)
+        self.assertEqual(len(body.content), 50)
+        self.assertEqual(chunks.taken, 2)
+
+    def test_cut_part_way_through_a_character(self):
+        title = u'<html><head><title>café</title>'.encode('utf-8')
+        chunks = Chunks(title, b'</head>')
+        body = read_body(StreamingHttpResponse(chunks), HEAD,
+                         head_bytes=len(title) - 9)
+        self.assertEqual(Document.from_body(body).text,
+                         u'<html><head><title>caf')
+
+
+class SummariseStreamingTestCase(Test):
+    @override_settings(SITEMAPCHECK_CHECKS=(
+        'sitemapcheck.checks.check_status_code',
+        'sitemapcheck.checks.check_html_title'))
+    def test_head_only(self):
+        chunks = Chunks(HTML[:60], HTML[60:])
+        response = StreamingHttpResponse(chunks)
+        result = summarise_response('/', response)
+        self.assertEqual([x.msg for x in result.check_results],
+                         ['OK!', 'yay'])
+        self.assertEqual(chunks.taken, 1)
+        self.assertIsNone(result.content_length)
+        self.assertIsNone(result.fingerprint.content_hash)
+
+    @override_settings(SITEMAPCHECK_CHECKS=(
+        'sitemapcheck.checks.check_status_code',))
+    def test_headers_only(self):
+        result = summarise_response('/', HttpResponse(HTML))
+        self.assertEqual(result.content_length, len(HTML))
+        self.assertEqual(result.fingerprint.content_hash,
+                         hashlib.sha1(HTML).hexdigest())
+
+    def test_whole_body(self):
+        chunks = Chunks(HTML[:60], HTML[60:])
+        result = summarise_response('/', StreamingHttpResponse(chunks))
+        self.assertEqual(chunks.taken, 2)
+        self.assertEqual(result.content_length, len(HTML))
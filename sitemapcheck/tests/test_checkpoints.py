@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+from xml.etree import ElementTree
+from django.core.management.base import OutputWrapper
+from django.test import SimpleTestCase as Test
+from django.utils import six
+from sitemapcheck.checkpoints import Checkpoint
+from sitemapcheck.checkpoints import get_checkpoint
+from sitemapcheck.checkpoints import read_checkpoint
+from sitemapcheck.management.commands.sitemapcheck import Command
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import SitemapRequestResponse
+
+
+def results(*paths):
+    for path in paths:
+        yield Response(path=path, status_code=200)
+
+
+def interrupted_after(*paths):
+    for result in results(*paths):
+        yield result
+    raise KeyboardInterrupt
+
+
+def prepare(*paths):
+    return [SitemapRequestResponse(handler=None, path=path,
+                                   sitemap_item=None)
+            for path in paths]
+
+
+class InterruptingOutput(object):
+    """
+    Stands in for Ctrl-C being pressed between results, as the first one is
+    written out. The report at `path` is read as it's said to be written.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.interrupted = False
+        self.report = None
+
+    def write(self, msg):
+        if not self.interrupted:
+            self.interrupted = True
+            raise KeyboardInterrupt
+        if msg.startswith('Wrote'):
+            with open(self.path, 'rb') as f:
+                self.report = f.read()
+
+    def flush(self):
+        pass
+
+
+class CheckpointTestCase(Test):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'checkpoint.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_finished(self):
+        checkpoint = Checkpoint(self.path)
+        seen = []
+        for result in checkpoint.recording(results('/a/', '/b/')):
+            seen.append(result.path)
+            # written before being passed on.
+            self.assertIn(result.path, [x.path for x in
+                                        read_checkpoint(self.path)])
+        self.assertEqual(seen, ['/a/', '/b/'])
+        self.assertFalse(checkpoint.interrupted)
+        checkpoint.finish()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_interrupted(self):
+        checkpoint = Checkpoint(self.path)
+        seen = [x.path for x in checkpoint.recording(
+            interrupted_after('/a/', '/b/'))]
+        self.assertEqual(seen, ['/a/', '/b/'])
+        self.assertTrue(checkpoint.interrupted)
+        checkpoint.finish()
+        self.assertEqual([x.path for x in read_checkpoint(self.path)],
+                         ['/a/', '/b/'])
+
+    def test_failed(self):
+        with self.assertRaises(ValueError):
+            with Checkpoint(self.path) as checkpoint:
+                list(checkpoint.recording(results('/a/')))
+                raise ValueError("the report couldn't be written")
+        self.assertTrue(checkpoint.interrupted)
+        self.assertTrue(os.path.exists(self.path))
+        checkpoint = Checkpoint(self.path, resume=True)
+        self.assertEqual(checkpoint.resumed, 1)
+
+    def test_exited(self):
+        with self.assertRaises(SystemExit):
+            with Checkpoint(self.path) as checkpoint:
+                list(checkpoint.recording(results('/a/')))
+                raise SystemExit(1)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_resume(self):
+        checkpoint = Checkpoint(self.path, run={'shard': '1/2'})
+        list(checkpoint.recording(interrupted_after('/a/', '/b/')))
+        checkpoint = Checkpoint(self.path, run={'shard': '1/2'}, resume=True)
+        self.assertTrue(checkpoint.resume)
+        self.assertEqual(checkpoint.resumed, 2)
+        left = checkpoint.skipping(prepare('/a/', '/c/', '/b/', '/d/'))
+        self.assertEqual([x.path for x in left], ['/c/', '/d/'])
+        self.assertEqual([x.path for x in checkpoint.previous()],
+                         ['/a/', '/b/'])
+        list(checkpoint.recording(interrupted_after('/c/')))
+        self.assertEqual([x.path for x in read_checkpoint(self.path)],
+                         ['/a/', '/b/', '/c/'])
+
+    def test_nothing_to_resume(self):
+        checkpoint = Checkpoint(self.path, resume=True)
+        self.assertFalse(checkpoint.resume)
+        self.assertEqual(list(checkpoint.previous()), [])
+
+    def test_different_run(self):
+        list(Checkpoint(self.path, run={'shard': '1/2'}).recording(
+            interrupted_after('/a/')))
+        with self.assertRaises(ValueError):
+            Checkpoint(self.path, run={'shard': '2/2'}, resume=True)
+
+    def test_not_a_checkpoint(self):
+        with open(self.path, 'w') as f:
+            f.write(json.dumps({'sitemapcheck_shard': {}}) + '\n')
+        with self.assertRaises(ValueError):
+            Checkpoint(self.path, resume=True)
+
+    def test_incomplete_last_line(self):
+        list(Checkpoint(self.path).recording(interrupted_after('/a/')))
+        with open(self.path, 'a') as f:
+            f.write('{"path": "/b')
+        self.assertEqual([x.path for x in read_checkpoint(self.path)],
+                         ['/a/'])
+
+    def test_resume_after_incomplete_last_line(self):
+        list(Checkpoint(self.path).recording(interrupted_after('/a/')))
+        with open(self.path, 'a') as f:
+            f.write('{"path": "/b/", "status_code": 200}')
+        checkpoint = Checkpoint(self.path, resume=True)
+        self.assertEqual(checkpoint.resumed, 1)
+        list(checkpoint.recording(results('/b/', '/c/')))
+        self.assertEqual([x.path for x in read_checkpoint(self.path)],
+                         ['/a/', '/b/', '/c/'])
+
+    def test_named_for_the_shard(self):
+        self.assertEqual(get_checkpoint(shard=(2, 4)),
+                         'sitemapcheck_checkpoint.shard-2-of-4.jsonl')
+        self.assertEqual(get_checkpoint('mine.jsonl', shard=(2, 4)),
+                         'mine.jsonl')
+        with self.settings(SITEMAPCHECK_CHECKPOINT=None):
+            self.assertIsNone(get_checkpoint(shard=(2, 4)))
+
+    def test_nowhere(self):
+        checkpoint = Checkpoint(None)
+        seen = [x.path for x in checkpoint.recording(
+            interrupted_after('/a/'))]
+        self.assertEqual(seen, ['/a/'])
+        self.assertTrue(checkpoint.interrupted)
+        checkpoint.finish()
+
+
+class InterruptedReportTestCase(Test):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_reports_finished(self):
+        path = os.path.join(self.root, 'report.xml')
+        output = InterruptingOutput(path)
+        command = Command()
+        command.stdout = OutputWrapper(output)
+        command.stderr = OutputWrapper(six.StringIO())
+        with self.assertRaises(SystemExit):
+            command.report(results('/a/', '/b/'), reports=[('junit', path)])
+        suites = ElementTree.fromstring(output.report).findall('testsuite')
+        self.assertEqual([x.get('name') for x in suites], ['/a/'])
+        self.assertIn('Interrupted after 1 URL',
+                      command.stderr._out.getvalue())
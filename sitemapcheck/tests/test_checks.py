@@ -3,11 +3,20 @@ from django.http import HttpResponse
 from django.http import HttpResponseRedirect
 from django.test import TestCase as DbTest
 from django.test import SimpleTestCase as Test
+from django.test import Client
+from django.test.utils import override_settings
 from sitemapcheck.checks import CheckedResponse
+from sitemapcheck.checks import CheckContext
 from sitemapcheck.checks import Success
 from sitemapcheck.checks import Error
 from sitemapcheck.checks import Caution
 from sitemapcheck.checks import Info
+from sitemapcheck.checks import Skipped
+from sitemapcheck.checks import get_check_name
+from sitemapcheck.checks import html
+from sitemapcheck.checks import passed
+from sitemapcheck.checks import successful
+from sitemapcheck.checks import unmet_precondition
 from sitemapcheck.checks import check_status_code
 from sitemapcheck.checks import check_html_title
 from sitemapcheck.checks import check_html_meta_description
@@ -25,6 +34,10 @@ from sitemapcheck.checks import check_frameorigin_header
 from sitemapcheck.checks import check_content_type_nosniff_header
 from sitemapcheck.checks import check_html_rel_home
 from sitemapcheck.checks import check_html_schemaorg_breadcrumbs
+from sitemapcheck.checks import check_query_budget
+from sitemapcheck.checks import check_repeated_queries
+from sitemapcheck.utils import handle_request_response
+from sitemapcheck.utils import run_checks_over_response
 
 
 class StatusCodeTestCase(Test):
@@ -411,3 +424,147 @@ class SchemaBreadcrumbsTestCase(Test):
         self.assertIsInstance(checked, CheckedResponse)
         self.assertEqual(checked.code, Info)
         self.assertEqual(checked.msg, "Doesn't have breadcrumbs itemtype")
+
+
+def query_context(*sqls):
+    queries = [{'sql': sql, 'time': '0.001'} for sql in sqls]
+    return CheckContext(path='/', queries=queries, timings=None)
+
+
+class QueryBudgetTestCase(Test):
+    def test_unknown(self):
+        checked = check_query_budget(HttpResponse(), None)
+        self.assertEqual(checked.code, Info)
+        context = CheckContext(path='/', queries=None, timings=None)
+        checked = check_query_budget(HttpResponse(), context)
+        self.assertEqual(checked.code, Info)
+
+    @override_settings(SITEMAPCHECK_QUERY_BUDGET=2)
+    def test_within_budget(self):
+        context = query_context('SELECT 1', 'SELECT 2')
+        checked = check_query_budget(HttpResponse(), context)
+        self.assertEqual(checked.code, Success)
+        self.assertEqual(checked.msg, '2 queries')
+
+    @override_settings(SITEMAPCHECK_QUERY_BUDGET=2)
+    def test_over_budget(self):
+        context = query_context('SELECT 1', 'SELECT 2', 'SELECT 3')
+        checked = check_query_budget(HttpResponse(), context)
+        self.assertEqual(checked.code, Caution)
+
+
+class RepeatedQueriesTestCase(Test):
+    def test_unknown(self):
+        checked = check_repeated_queries(HttpResponse(), None)
+        self.assertEqual(checked.code, Info)
+
+    @override_settings(SITEMAPCHECK_REPEATED_QUERY_LIMIT=2)
+    def test_distinct_queries(self):
+        context = query_context('SELECT a FROM x WHERE id = 1',
+                                'SELECT a FROM x WHERE id = 2',
+                                'SELECT b FROM y WHERE id = 1')
+        checked = check_repeated_queries(HttpResponse(), context)
+        self.assertEqual(checked.code, Success)
+
+    @override_settings(SITEMAPCHECK_REPEATED_QUERY_LIMIT=2)
+    def test_repeated_with_different_parameters(self):
+        context = query_context("SELECT a FROM x WHERE id = 1",
+                                "SELECT a FROM x WHERE id = 2",
+                                "SELECT a FROM x WHERE  id = 3",
+                                "SELECT b FROM y WHERE name = 'a'")
+        checked = check_repeated_queries(HttpResponse(), context)
+        self.assertEqual(checked.code, Caution)
+        self.assertIn('3 times', checked.msg)
+        self.assertIn('SELECT a FROM x WHERE id = ?', checked.msg)
+
+
+class RepeatedQueriesViewTestCase(DbTest):
+    def test_n_plus_one_view(self):
+        checks = ('sitemapcheck.checks.check_status_code',
+                  'sitemapcheck.checks.check_query_budget',
+                  'sitemapcheck.checks.check_repeated_queries')
+        with self.settings(SITEMAPCHECK_CHECKS=checks):
+            result = handle_request_response(Client, '/n_plus_one/')
+        status, budget, repeated = result.check_results
+        self.assertEqual(status.code, Success)
+        self.assertEqual(budget.msg, '10 queries')
+        self.assertEqual(repeated.code, Caution)
+        self.assertIn('worst 10 times', repeated.msg)
+
+
+def check_after_title(response):
+    return CheckedResponse(msg='ran', code=Success, name='After title')
+check_after_title.preconditions = (passed(check_html_title),)
+
+
+class PreconditionsTestCase(Test):
+    def test_successful(self):
+        self.assertTrue(successful(HttpResponse(status=204), {}))
+        self.assertFalse(successful(HttpResponse(status=404), {}))
+        self.assertFalse(successful(HttpResponseRedirect('/'), {}))
+
+    def test_html(self):
+        self.assertTrue(html(HttpResponse(), {}))
+        response = HttpResponse(content_type='application/xhtml+xml')
+        self.assertTrue(html(response, {}))
+        self.assertFalse(html(HttpResponse(content_type='text/plain'), {}))
+
+    def test_passed(self):
+        precondition = passed(check_html_title)
+        title = CheckedResponse(msg='yay', code=Success, name='HTML title')
+        self.assertTrue(precondition(HttpResponse(),
+                                     {check_html_title: title}))
+        self.assertFalse(precondition(HttpResponse(), {
+            check_html_title: title._replace(code=Caution)}))
+        self.assertFalse(precondition(HttpResponse(), {}))
+        # not known yet.
+        self.assertTrue(precondition(HttpResponse(), None))
+        self.assertEqual(precondition.reason,
+                         'Needs HTML title to succeed first')
+
+    def test_unmet_precondition(self):
+        self.assertIsNone(unmet_precondition(check_html_title,
+                                             HttpResponse()))
+        self.assertEqual(unmet_precondition(check_html_title,
+                                            HttpResponse(status=500)),
+                         successful.reason)
+        self.assertIsNone(unmet_precondition(check_status_code,
+                                             HttpResponse(status=500)))
+
+    def test_check_name(self):
+        self.assertEqual(get_check_name(check_html_title), 'HTML title')
+        self.assertEqual(get_check_name(check_after_title),
+                         'check_after_title')
+
+    def test_skipped_when_not_met(self):
+        checks = (check_status_code, check_html_title, check_after_title,
+                  check_frameorigin_header)
+        response = HttpResponse('<title>Gone</title>', status=404)
+        status, title, after, frame = run_checks_over_response(
+            response, checks=checks)
+        self.assertEqual(status.code, Error)
+        self.assertEqual((title.code, title.name, title.msg),
+                         (Skipped, 'HTML title', successful.reason))
+        self.assertEqual(after.code, Skipped)
+        self.assertEqual(frame.code, Skipped)
+
+    def test_dependency(self):
+        checks = (check_html_title, check_after_title)
+        title, after = run_checks_over_response(
+            HttpResponse('<title>yay</title>'), checks=checks)
+        self.assertEqual(after.msg, 'ran')
+        title, after = run_checks_over_response(
+            HttpResponse('<p>no title</p>'), checks=checks)
+        self.assertEqual(title.code, Error)
+        self.assertEqual(after.code, Skipped)
+
+    def test_failed_response_only_checks_status(self):
+        checks = ('sitemapcheck.checks.check_status_code',
+                  'sitemapcheck.checks.check_html_title',
+                  'sitemapcheck.checks.check_html_rel_home')
+        with self.settings(SITEMAPCHECK_CHECKS=checks):
+            result = handle_request_response(Client, '/test/')
+        self.assertEqual(result.status_code, 404)
+        self.assertEqual([x.code for x in result.check_results],
+                         [Error, Skipped, Skipped])
+        self.assertEqual(len(result.check_times), 3)
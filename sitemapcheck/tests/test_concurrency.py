@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import threading
+from timeit import default_timer
+from django.test import SimpleTestCase as Test
+from django.test.utils import override_settings
+from sitemapcheck.concurrency import ConcurrencyController
+from sitemapcheck.concurrency import DECREASE
+from sitemapcheck.concurrency import get_controller
+from sitemapcheck.remote import liveprocessor
+from .standin import StandInServer
+from .test_remote import prepare
+
+
+def respond(controller, status=200, ttfb=0.01, times=1):
+    for _ in range(times):
+        controller.acquire()
+        controller.release(status, ttfb)
+
+
+class ControllerTestCase(Test):
+    def test_fixed_unless_adaptive(self):
+        controller = ConcurrencyController(4, floor=1, ceiling=16)
+        respond(controller, status=503, ttfb=None, times=5)
+        respond(controller, times=50)
+        self.assertEqual(controller.limit, 4)
+        self.assertEqual(controller.ceiling, 4)
+
+    def test_additive_increase(self):
+        controller = ConcurrencyController(2, ceiling=16, adaptive=True)
+        respond(controller, times=2)
+        self.assertGreater(controller.limit, 2)
+        self.assertLess(controller.limit, 3)
+        respond(controller, times=3)
+        self.assertGreaterEqual(controller.limit, 3)
+        self.assertLess(controller.limit, 4)
+
+    def test_ceiling(self):
+        controller = ConcurrencyController(2, ceiling=4, adaptive=True)
+        respond(controller, times=100)
+        self.assertEqual(controller.limit, 4)
+
+    def test_decrease_when_overloaded(self):
+        controller = ConcurrencyController(8, ceiling=16, adaptive=True)
+        respond(controller, status=503, ttfb=None)
+        self.assertEqual(controller.limit, 8 * DECREASE)
+
+    def test_decrease_when_unreachable(self):
+        controller = ConcurrencyController(8, ceiling=16, adaptive=True)
+        respond(controller, status=None, ttfb=None)
+        self.assertEqual(controller.limit, 8 * DECREASE)
+
+    def test_floor(self):
+        controller = ConcurrencyController(8, floor=2, ceiling=16,
+                                           adaptive=True)
+        respond(controller, status=None, ttfb=None, times=20)
+        self.assertEqual(controller.limit, 2)
+        self.assertEqual(controller.lowest, 2)
+
+    def test_decrease_when_slower(self):
+        controller = ConcurrencyController(8, ceiling=16, adaptive=True,
+                                           tolerance=2)
+        respond(controller, ttfb=0.01, times=5)
+        before = controller.limit
+        respond(controller, ttfb=1)
+        self.assertEqual(controller.limit, before * DECREASE)
+
+    def test_decrease_once_per_round_trip(self):
+        controller = ConcurrencyController(8, ceiling=16, adaptive=True)
+        # responses take (a long) 10 seconds, so the second failure is
+        # from a request made before the first cut.
+        respond(controller, ttfb=10)
+        before = controller.limit
+        respond(controller, status=503, ttfb=None, times=2)
+        self.assertEqual(controller.limit, before * DECREASE)
+
+    def test_waits_for_a_slot(self):
+        controller = ConcurrencyController(1)
+        controller.acquire()
+        acquired = threading.Event()
+
+        def other():
+            controller.acquire()
+            acquired.set()
+            controller.release(200, 0.01)
+
+        thread = threading.Thread(target=other)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        controller.release(200, 0.01)
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_max_rate(self):
+        controller = ConcurrencyController(4, max_rate=50)
+        started = default_timer()
+        respond(controller, times=5)
+        self.assertGreaterEqual(default_timer() - started, 4 / 50.0)
+
+    @override_settings(SITEMAPCHECK_LIVE_CONCURRENCY=3,
+                       SITEMAPCHECK_LIVE_MIN_CONCURRENCY=2,
+                       SITEMAPCHECK_LIVE_MAX_CONCURRENCY=6)
+    def test_get_controller(self):
+        controller = get_controller(adaptive=True)
+        self.assertEqual((controller.floor, controller.limit,
+                          controller.ceiling), (2, 3, 6))
+        controller = get_controller(concurrency=5)
+        self.assertEqual((controller.floor, controller.limit,
+                          controller.ceiling), (5, 5, 5))
+
+
+class AdaptiveLiveTestCase(Test):
+    def setUp(self):
+        # slows down by 20ms a response for each request beyond 4 at once.
+        self.server = StandInServer(latency=0.02, capacity=4,
+                                    overload_latency=0.02).start()
+        self.server.route('/ok/')
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_fixed(self):
+        results = tuple(liveprocessor(prepare(*['/ok/'] * 24),
+                                      base_url=self.server.base_url,
+                                      concurrency=8, chunksize=1))
+        self.assertEqual(len(results), 24)
+        self.assertLessEqual(self.server.busiest, 8)
+        self.assertGreater(self.server.busiest, 4)
+
+    def test_adapts_to_the_server(self):
+        controller = ConcurrencyController(2, ceiling=32, adaptive=True)
+        results = tuple(liveprocessor(prepare(*['/ok/'] * 150),
+                                      base_url=self.server.base_url,
+                                      chunksize=1, controller=controller))
+        self.assertEqual(set(x.status_code for x in results), set([200]))
+        # it found more could be made at once, but backed off well before
+        # making as many as it was allowed to.
+        self.assertGreater(controller.highest, 4)
+        self.assertLess(controller.highest, 24)
+        self.assertLess(self.server.busiest, 16)
+
+    def test_max_rate(self):
+        started = default_timer()
+        results = tuple(liveprocessor(prepare(*['/ok/'] * 11),
+                                      base_url=self.server.base_url,
+                                      concurrency=4, chunksize=1,
+                                      max_rate=100))
+        self.assertEqual(len(results), 11)
+        self.assertGreaterEqual(default_timer() - started, 10 / 100.0)
+        self.assertLessEqual(self.server.busiest, 4)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import socket
+import tempfile
+import threading
+from django.test import SimpleTestCase as Test
+from django.test.utils import override_settings
+from sitemapcheck.daemon import CheckerDaemon
+from sitemapcheck.daemon import DaemonError
+from sitemapcheck.daemon import claim_socket
+from sitemapcheck.daemon import request_checks
+from sitemapcheck.utils import Response
+
+
+@override_settings(ROOT_URLCONF='sitemapcheck.tests.test_pages')
+class CheckerDaemonTestCase(Test):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'sitemapcheck.sock')
+        self.daemon = CheckerDaemon(self.path, processes=2)
+        self.thread = threading.Thread(target=self.daemon.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.thread.join()
+        self.daemon.server_close()
+        shutil.rmtree(self.directory)
+
+    def request(self, paths=(), sections=()):
+        return list(request_checks(paths, sections, path=self.path))
+
+    def test_paths(self):
+        results = self.request(paths=['/page/1/', '/page/other/'])
+        self.assertTrue(all(isinstance(x, Response) for x in results))
+        self.assertEqual(sorted(x.path for x in results),
+                         ['/page/1/', '/page/other/'])
+        self.assertEqual([x.status_code for x in results], [200, 200])
+
+    def test_sections(self):
+        results = self.request(sections=['paged'])
+        self.assertEqual(sorted(x.path for x in results),
+                         ['/page/0/', '/page/1/', '/page/2/', '/page/3/',
+                          '/page/4/'])
+
+    def test_workers_kept(self):
+        started = set(str(x.process.pid) for x in self.daemon.pool.workers)
+        for attempt in range(2):
+            results = self.request(sections=['paged'])
+            self.assertLessEqual(set(x.worker for x in results), started)
+
+    def test_unknown_section(self):
+        with self.assertRaisesRegexp(DaemonError, '`nope`'):
+            self.request(sections=['nope'])
+        # and is still there for the next.
+        self.assertEqual(len(self.request(paths=['/page/1/'])), 1)
+
+    def test_not_json(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.path)
+            connection.sendall(b'[1, 2]\n')
+            reply = connection.makefile('rb').readline()
+        finally:
+            connection.close()
+        self.assertEqual(reply, b'{"error": "Expected a JSON object"}\n')
+
+    def test_already_listening(self):
+        with self.assertRaises(DaemonError):
+            claim_socket(self.path)
+        self.assertTrue(os.path.exists(self.path))
+
+
+class NoDaemonTestCase(Test):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'sitemapcheck.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_not_listening(self):
+        with self.assertRaisesRegexp(DaemonError, 'No sitemapcheck daemon'):
+            list(request_checks(['/'], path=self.path))
+
+    def test_stale_socket(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.path)
+        stale.close()
+        claim_socket(self.path)
+        self.assertFalse(os.path.exists(self.path))
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from django.contrib.sitemaps import Sitemap
+from django.test import TestCase as DbTest
+from django.test import SimpleTestCase as Test
+from sitemapcheck.dedup import BloomFilter
+from sitemapcheck.dedup import Deduplicator
+from sitemapcheck.dedup import SeenPaths
+from sitemapcheck.dedup import normalise_path
+from sitemapcheck.reports import write_reports
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import SitemapRequestResponse
+from sitemapcheck.utils import sitemap_request_iterator
+from sitemapcheck.utils import sitemap_section_urls_iterator
+
+
+def prepared(path, section=None):
+    return SitemapRequestResponse(handler=None, path=path, sitemap_item={},
+                                  section=section)
+
+
+class ListedSitemap(Sitemap):
+    paths = ()
+
+    def items(self):
+        return list(self.paths)
+
+    def location(self, obj):
+        return obj
+
+
+class NewsSitemap(ListedSitemap):
+    paths = ('/a/', '/news/1/', '/news/2/')
+
+
+class PagesSitemap(ListedSitemap):
+    paths = ('/a/', '/b/', '/b/', '/news//1/')
+
+
+class NormalisePathTestCase(Test):
+    def test_normalise(self):
+        self.assertEqual(normalise_path('/a//b///c/'), '/a/b/c/')
+        self.assertEqual(normalise_path('/caf%c3%a9/'), '/caf%C3%A9/')
+        self.assertEqual(normalise_path('a/'), '/a/')
+        self.assertEqual(normalise_path(''), '/')
+
+
+class BloomFilterTestCase(Test):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        paths = ['/page/{0:d}/'.format(x) for x in range(1000)]
+        for path in paths:
+            bloom.add(path)
+        for path in paths:
+            self.assertIn(path, bloom)
+        self.assertTrue(bloom.full)
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for x in range(1000):
+            bloom.add('/page/{0:d}/'.format(x))
+        false_positives = len([x for x in range(10000)
+                               if '/other/{0:d}/'.format(x) in bloom])
+        # allowing for chance, well within twice the intended rate.
+        self.assertLess(false_positives, 200)
+
+    def test_size(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        # ~9.6 bits & 7 hashes per item.
+        self.assertEqual(bloom.hashes, 7)
+        self.assertEqual(len(bloom.bits), 1199)
+
+
+class SeenPathsTestCase(Test):
+    def test_exact_until_limit(self):
+        seen = SeenPaths(exact_limit=3, error_rate=0.01)
+        for path in ('/a/', '/b/', '/c/'):
+            seen.add(path)
+        self.assertFalse(seen.probabilistic)
+        self.assertIn('/a/', seen)
+        self.assertNotIn('/d/', seen)
+
+    def test_switches_to_bloom_filters(self):
+        seen = SeenPaths(exact_limit=3, error_rate=0.01)
+        paths = ['/{0:d}/'.format(x) for x in range(100)]
+        for path in paths:
+            seen.add(path)
+        self.assertTrue(seen.probabilistic)
+        self.assertIsNone(seen.exact)
+        # 12, then 48, then 192 paths.
+        self.assertEqual([x.capacity for x in seen.filters], [12, 48, 192])
+        self.assertEqual([x.error_rate for x in seen.filters],
+                         [0.005, 0.0025, 0.00125])
+        for path in paths:
+            self.assertIn(path, seen)
+
+
+class DeduplicatorTestCase(Test):
+    def test_filtering(self):
+        duplicates = Deduplicator(SeenPaths(exact_limit=10))
+        requests = [prepared('/a/', 'news'), prepared('/b/', 'news'),
+                    prepared('/a/', 'pages'), prepared('//b/', 'pages'),
+                    prepared('/c/', 'pages'), prepared('/c/', 'pages'),
+                    prepared('/a/')]
+        kept = list(duplicates.filtering(requests))
+        self.assertEqual([x.path for x in kept], ['/a/', '/b/', '/c/'])
+        self.assertEqual(duplicates.total, 4)
+        self.assertEqual(duplicates.rows(), [('pages', 3), (None, 1)])
+
+    def test_reported(self):
+        root = tempfile.mkdtemp()
+        try:
+            duplicates = Deduplicator()
+            kept = list(duplicates.filtering([prepared('/a/', 'news'),
+                                              prepared('/a/', 'pages')]))
+            path = os.path.join(root, 'report.html')
+            results = [Response(path=x.path, status_code=200) for x in kept]
+            list(write_reports(results, [('html', path)],
+                               duplicates=duplicates))
+            with open(path) as f:
+                html = f.read()
+        finally:
+            shutil.rmtree(root)
+        self.assertIn('Duplicate URLs skipped', html)
+        self.assertIn('<td>pages</td>', html)
+
+
+class SectionUrlsTestCase(DbTest):
+    def test_across_sections(self):
+        sitemaps = {'pages': PagesSitemap, 'news': NewsSitemap}
+        data = sitemap_section_urls_iterator(sitemaps)
+        duplicates = Deduplicator()
+        kept = list(duplicates.filtering(sitemap_request_iterator(data)))
+        self.assertEqual([(x.path, x.section) for x in kept], [
+            ('/a/', 'news'), ('/news/1/', 'news'), ('/news/2/', 'news'),
+            ('/b/', 'pages'),
+        ])
+        self.assertEqual(duplicates.rows(), [('pages', 3)])
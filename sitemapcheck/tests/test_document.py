@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from django.http import HttpResponse
+from django.test import SimpleTestCase as Test
+from sitemapcheck.document import Document
+from sitemapcheck.document import get_document
+from sitemapcheck.document import parse_attributes
+
+
+class ParseAttributesTestCase(Test):
+    def test_quoting_styles(self):
+        attrs = parse_attributes(""" name="a" content='b c' data-x=d async""")
+        self.assertEqual(attrs, {
+            'name': 'a',
+            'content': 'b c',
+            'data-x': 'd',
+            'async': '',
+        })
+
+    def test_first_attribute_wins(self):
+        attrs = parse_attributes(' NAME="a" name="b"')
+        self.assertEqual(attrs, {'name': 'a'})
+
+
+class DocumentTestCase(Test):
+    def test_head_span(self):
+        text = "<html><head><title>x</title></head><body>yay</body></html>"
+        document = Document(text)
+        self.assertEqual(document.head, "<head><title>x</title></head>")
+        self.assertEqual(document.title, "x")
+
+    def test_no_head_uses_everything(self):
+        text = '<meta name="description" content="test">'
+        document = Document(text)
+        self.assertEqual(document.head, text)
+        self.assertEqual(document.meta('description'), 'test')
+
+    def test_tags_in_body_are_ignored(self):
+        text = """<html><head></head><body>
+        <meta name="description" content="test"><title>nope</title>
+        </body></html>"""
+        document = Document(text)
+        self.assertIsNone(document.meta('description'))
+        self.assertIsNone(document.title)
+
+    def test_attribute_order_and_case(self):
+        text = """<html><head>
+        <META content="test" NAME="Description">
+        <link href="/a/" rel="canonical" />
+        <meta charset=utf-8>
+        </head></html>"""
+        document = Document(text)
+        self.assertEqual(document.meta('description'), 'test')
+        self.assertEqual(document.link('canonical'), '/a/')
+        self.assertEqual(document.meta_charset(), 'utf-8')
+        self.assertIsNone(document.meta('keywords'))
+        self.assertIsNone(document.link('home'))
+
+    def test_quoted_greater_than(self):
+        text = '<head><meta name="description" content="a > b"></head>'
+        document = Document(text)
+        self.assertEqual(document.meta('description'), 'a > b')
+
+    def test_empty_content_is_missing(self):
+        text = '<head><meta name="description" content=""></head>'
+        document = Document(text)
+        self.assertIsNone(document.meta('description'))
+
+
+class GetDocumentTestCase(Test):
+    def test_built_once_per_response(self):
+        response = HttpResponse(content="<head><title>x</title></head>")
+        document = get_document(response)
+        self.assertIs(get_document(response), document)
+        self.assertEqual(document.title, 'x')
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sqlite3
+import tempfile
+from django.test import SimpleTestCase as Test, Client
+from sitemapcheck.checks import CheckedResponse
+from sitemapcheck.checks import Success
+from sitemapcheck.fingerprints import FingerprintStore
+from sitemapcheck.utils import Fingerprint
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import SitemapRequestResponse
+from sitemapcheck.utils import handle_request_response
+from sitemapcheck.utils import singleprocessor
+
+
+class FingerprintStoreTestCase(Test):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'fingerprints.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_round_trip(self):
+        fingerprint = Fingerprint(lastmod='2014-01-01', etag='"x"',
+                                  last_modified=None, content_hash='abc')
+        result = Response(path='/test/', status_code=200, content_length=4,
+                          headers=(('Content-Type', 'text/html'),),
+                          elapsed=0.1, fingerprint=fingerprint,
+                          check_results=(
+                              CheckedResponse(msg='OK!', code='Success',
+                                              name='Status code'),
+                              None))
+        store = FingerprintStore(self.path)
+        store.put(result)
+        store.close()
+        stored = FingerprintStore(self.path).get('/test/')
+        self.assertEqual(stored.fingerprint, fingerprint)
+        self.assertEqual(stored.status_code, 200)
+        self.assertEqual(stored.content_length, 4)
+        self.assertEqual(stored.header('content-type'), 'text/html')
+        self.assertEqual(stored.check_results, result.check_results)
+        self.assertIsNone(stored.elapsed)
+
+    def test_earlier_schema_replaced(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            "CREATE TABLE sitemapcheck_fingerprint (path TEXT PRIMARY KEY, "
+            "lastmod TEXT, etag TEXT, last_modified TEXT, content_hash TEXT, "
+            "result TEXT NOT NULL)")
+        connection.execute(
+            "INSERT INTO sitemapcheck_fingerprint VALUES "
+            "('/test/', NULL, NULL, NULL, 'abc', '{}')")
+        connection.commit()
+        connection.close()
+        store = FingerprintStore(self.path)
+        self.assertIsNone(store.get('/test/'))
+        store.put(Response(path='/test/', status_code=200,
+                           fingerprint=Fingerprint(None, None, None, 'abc',
+                                                   'def', 'ghi')))
+        self.assertEqual(store.get('/test/').fingerprint.checks_hash, 'ghi')
+
+    def test_unfetchable_not_stored(self):
+        store = FingerprintStore(self.path)
+        store.put(Response(path='/test/', status_code=None))
+        self.assertIsNone(store.get('/test/'))
+
+    def test_incremental_runs(self):
+        def run(lastmod, store):
+            prepared = (SitemapRequestResponse(handler=Client, path=path,
+                                               sitemap_item=None,
+                                               lastmod=lastmod)
+                        for path in ('/sitemap_c.xml', '/conditional/'))
+            prepared = store.with_previous(prepared)
+            results = store.recording(singleprocessor(prepared))
+            return dict((x.path, x) for x in results)
+
+        first = run('2014-01-01', FingerprintStore(self.path))
+        self.assertFalse(any(x.reused for x in first.values()))
+        # the same lastmod: nothing is fetched at all.
+        second = run('2014-01-01', FingerprintStore(self.path))
+        self.assertTrue(all(x.reused for x in second.values()))
+        self.assertTrue(all(x.elapsed is None for x in second.values()))
+        # a newer lastmod, but the content is the same or not modified.
+        third = run('2014-02-01', FingerprintStore(self.path))
+        self.assertTrue(all(x.reused for x in third.values()))
+        self.assertTrue(all(x.elapsed is not None for x in third.values()))
+        self.assertEqual(
+            third['/conditional/'].check_results,
+            first['/conditional/'].check_results)
+        stored = FingerprintStore(self.path).get('/sitemap_c.xml')
+        self.assertEqual(stored.fingerprint.lastmod, '2014-02-01')
+
+
+class ReuseTestCase(Test):
+    def test_not_modified(self):
+        previous = handle_request_response(Client, '/conditional/')
+        self.assertEqual(previous.fingerprint.etag, '"v1"')
+        result = handle_request_response(Client, '/conditional/',
+                                         previous=previous)
+        self.assertTrue(result.reused)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.check_results[0].code, Success)
+
+    def test_changed_content(self):
+        previous = handle_request_response(Client, '/sitemap_c.xml')
+        previous = previous.copy(fingerprint=previous.fingerprint._replace(
+            content_hash='different'), check_results=())
+        result = handle_request_response(Client, '/sitemap_c.xml',
+                                         previous=previous)
+        self.assertFalse(result.reused)
+        self.assertGreater(len(result.check_results), 0)
+
+    def test_changed_headers(self):
+        previous = handle_request_response(Client, '/sitemap_c.xml')
+        previous = previous.copy(fingerprint=previous.fingerprint._replace(
+            headers_hash='different'), check_results=())
+        result = handle_request_response(Client, '/sitemap_c.xml',
+                                         previous=previous)
+        self.assertFalse(result.reused)
+        self.assertGreater(len(result.check_results), 0)
+
+    def test_changed_checks(self):
+        previous = handle_request_response(Client, '/conditional/',
+                                           lastmod='2014-01-01')
+        with self.settings(SITEMAPCHECK_CHECKS=(
+                'sitemapcheck.checks.check_status_code',)):
+            result = handle_request_response(Client, '/conditional/',
+                                             lastmod='2014-01-01',
+                                             previous=previous)
+        self.assertFalse(result.reused)
+        self.assertEqual(len(result.check_results), 1)
+
+    def test_failure_checked_again(self):
+        previous = handle_request_response(Client, '/nowhere/',
+                                           lastmod='2014-01-01')
+        self.assertEqual(previous.status_code, 404)
+        result = handle_request_response(Client, '/nowhere/',
+                                         lastmod='2014-01-01',
+                                         previous=previous)
+        self.assertFalse(result.reused)
+        self.assertIsNotNone(result.elapsed)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from django.contrib.sites.models import Site
+from django.template import Context, Template
+from django.test import SimpleTestCase as Test
+from django.test import TestCase as DbTest
+from sitemapcheck.instrumentation import Instrumentation
+from sitemapcheck.instrumentation import install_render_timer
+from sitemapcheck.instrumentation import normalise_sql
+
+
+class InstrumentationTestCase(DbTest):
+    def test_captures_queries(self):
+        with Instrumentation() as instrumentation:
+            list(Site.objects.all())
+            Site.objects.count()
+        self.assertEqual(len(instrumentation.queries), 2)
+        self.assertIn('SELECT', instrumentation.queries[0]['sql'])
+        self.assertGreaterEqual(instrumentation.query_time, 0)
+
+    def test_only_captures_within(self):
+        Site.objects.count()
+        with Instrumentation() as instrumentation:
+            pass
+        Site.objects.count()
+        self.assertEqual(instrumentation.queries, [])
+
+    def test_render_time(self):
+        template = Template("{% for x in items %}{{ x }}{% endfor %}")
+        with Instrumentation() as instrumentation:
+            template.render(Context({'items': range(100)}))
+        self.assertGreater(instrumentation.render_time, 0)
+
+    def test_nested_rendering_counted_once(self):
+        inner = Template("{{ x }}")
+        outer = Template("{% for x in items %}{% include inner %}{% endfor %}")
+        with Instrumentation() as instrumentation:
+            outer.render(Context({'items': range(50), 'inner': inner}))
+            total = instrumentation.render_time
+        self.assertGreater(total, 0)
+        self.assertFalse(instrumentation.rendering)
+
+    def test_installed_once(self):
+        install_render_timer()
+        render = Template.__dict__['_render']
+        install_render_timer()
+        self.assertIs(Template.__dict__['_render'], render)
+
+    def test_not_recording_outside(self):
+        instrumentation = Instrumentation()
+        Template("{{ x }}").render(Context({'x': 1}))
+        self.assertEqual(instrumentation.render_time, 0)
+
+
+class NormaliseSqlTestCase(Test):
+    def test_parameters_replaced(self):
+        self.assertEqual(
+            normalise_sql('SELECT "t1"."a" FROM "t1" WHERE "t1"."id" = 10 '
+                          "AND name = 'it''s'  LIMIT 21"),
+            'SELECT "t1"."a" FROM "t1" WHERE "t1"."id" = ? AND name = ? '
+            'LIMIT ?')
+
+    def test_in_lists_collapsed(self):
+        self.assertEqual(normalise_sql('SELECT a FROM b WHERE id IN (1, 2)'),
+                         normalise_sql('SELECT a FROM b WHERE id IN (3)'))
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+from multiprocessing import Process, Value
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from django.conf.urls import patterns, url
+from django.http import HttpResponse
+from django.test import Client
+from django.test import TestCase as DbTest
+from django.test import SimpleTestCase as Test
+from django.test.utils import override_settings
+from sitemapcheck import links
+from sitemapcheck.checks import Error
+from sitemapcheck.checks import Success
+from sitemapcheck.links import LinkStatusCache
+from sitemapcheck.links import extract_links
+from sitemapcheck.links import internal_target
+from sitemapcheck.links import fetch_live_link_status
+from sitemapcheck.links import use_link_database
+from sitemapcheck.utils import handle_request_response
+from sitemapcheck.utils import handle_within_limits
+from .standin import StandInServer
+
+
+fetched = []
+
+
+def linking(request, name):
+    return HttpResponse(
+        '<!doctype html><html><head><title>{name!s}</title>'
+        '<link rel="stylesheet" href="/ok/?v=1">'
+        '<script src="//testserver/ok/"></script></head><body>'
+        '<a href="/ok/">ok</a> <a href="/ok/#part">again</a> '
+        '<a href="../../missing/">missing</a> <a href="/error/">error</a> '
+        '<a href="http://elsewhere.example/">external</a> '
+        '<a href="mailto:a@example.com">mail</a> <a href=/linking/b/>b</a>'
+        '</body></html>'.format(name=name))
+
+
+def ok(request):
+    fetched.append(request.get_full_path())
+    return HttpResponse('<!doctype html><title>ok</title>')
+
+
+def error(request):
+    raise ValueError("oops")
+
+
+def slow(request):
+    time.sleep(30)
+    return HttpResponse('<!doctype html><title>slow</title>')
+
+
+def linking_slow(request):
+    return HttpResponse('<!doctype html><title>slow</title>'
+                        '<a href="/slow/">slow</a>')
+
+
+urlpatterns = patterns('',
+    url(r'^linking/(?P<name>\w+)/$', linking),
+    url(r'^ok/$', ok),
+    url(r'^error/$', error),
+    url(r'^slow/$', slow),
+    url(r'^slowly/$', linking_slow),
+)
+
+
+HTML = ('<a href="/a/">a</a><A HREF=\'/b/\'>b</a><link rel=x href="/c.css">'
+        '<script src="/d.js"></script><a name="nowhere">x</a>'
+        '<img src="/not-followed.png">')
+
+
+class ExtractLinksTestCase(Test):
+    def test_extract(self):
+        self.assertEqual(list(extract_links(HTML)),
+                         ['/a/', '/b/', '/c.css', '/d.js'])
+
+    def test_internal_target(self):
+        hosts = set(['example.com'])
+        self.assertEqual(internal_target('b/', '/a/', hosts), '/a/b/')
+        self.assertEqual(internal_target('../b/', '/a/c/', hosts), '/a/b/')
+        self.assertEqual(internal_target('/b/?x=1#y', '/a/', hosts),
+                         '/b/?x=1')
+        self.assertEqual(internal_target('https://example.com/b/', '/a/',
+                                         hosts), '/b/')
+        self.assertEqual(internal_target('#top', '/a/', hosts), '/a/')
+        self.assertIsNone(internal_target('https://other.com/b/', '/a/',
+                                          hosts))
+        self.assertIsNone(internal_target('mailto:a@example.com', '/a/',
+                                          hosts))
+        self.assertIsNone(internal_target('javascript:void(0)', '/a/',
+                                          hosts))
+
+
+def count_fetches(path, counter, targets):
+    cache = LinkStatusCache(path)
+
+    def fetch(target):
+        with counter.get_lock():
+            counter.value += 1
+        return 200
+    for target in targets:
+        cache.status(target, fetch)
+    cache.close()
+
+
+class LinkStatusCacheTestCase(Test):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'links.sqlite3')
+        use_link_database(self.path)
+
+    def tearDown(self):
+        use_link_database(None)
+        shutil.rmtree(self.root)
+
+    def test_in_memory(self):
+        calls = []
+        cache = LinkStatusCache()
+        for target in ('/a/', '/b/', '/a/'):
+            cache.status(target, lambda target: calls.append(target) or 200)
+        self.assertEqual(calls, ['/a/', '/b/'])
+
+    def test_shared(self):
+        calls = []
+        first = LinkStatusCache(self.path)
+        second = LinkStatusCache(self.path)
+        self.assertEqual(first.status('/a/', lambda x: calls.append(x) or 404),
+                         404)
+        self.assertEqual(second.status('/a/', lambda x: calls.append(x)), 404)
+        second.put('/b/', None)
+        self.assertIsNone(first.status('/b/', lambda x: calls.append(x)))
+        self.assertEqual(calls, ['/a/'])
+
+    def test_gives_up_waiting_on_a_claim(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("INSERT INTO sitemapcheck_link (target, status) "
+                           "VALUES ('/a/', NULL)")
+        connection.commit()
+        connection.close()
+        timeout = links.CLAIM_TIMEOUT
+        links.CLAIM_TIMEOUT = 0.05
+        try:
+            status = LinkStatusCache(self.path).status('/a/', lambda x: 200)
+        finally:
+            links.CLAIM_TIMEOUT = timeout
+        self.assertEqual(status, 200)
+
+    def test_each_target_fetched_once_across_processes(self):
+        counter = Value('i', 0)
+        targets = ['/{0:d}/'.format(x) for x in range(50)]
+        processes = [Process(target=count_fetches,
+                             args=(self.path, counter, targets))
+                     for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(counter.value, 50)
+
+
+@override_settings(ROOT_URLCONF='sitemapcheck.tests.test_links',
+                   SITEMAPCHECK_CHECKS=(
+                       'sitemapcheck.checks.check_status_code',
+                       'sitemapcheck.links.check_internal_links'))
+class CheckInternalLinksTestCase(DbTest):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        use_link_database(os.path.join(self.root, 'links.sqlite3'))
+        del fetched[:]
+
+    def tearDown(self):
+        use_link_database(None)
+        shutil.rmtree(self.root)
+
+    def test_reports_broken_links(self):
+        result = handle_request_response(Client, '/linking/a/')
+        status, checked = result.check_results
+        self.assertEqual(checked.code, Error)
+        self.assertEqual(checked.msg,
+                         "2 of 5 internal links broken: /missing/ (404), "
+                         "/error/ (500)")
+
+    def test_each_target_fetched_once(self):
+        handle_request_response(Client, '/linking/a/')
+        result = handle_request_response(Client, '/linking/b/')
+        self.assertEqual(fetched, ['/ok/?v=1', '/ok/'])
+        # /linking/b/ was linked to, but is already known from the sitemap.
+        self.assertEqual(result.check_results[1].code, Error)
+
+    def test_page_timed_out_on_a_link(self):
+        result = handle_within_limits(Client, '/slowly/', timeout=0.2)
+        self.assertIsNone(result.status_code)
+        self.assertEqual(result.check_results[0].msg, 'Timed out after 0.2s')
+        # nothing was learnt about the target.
+        connection = sqlite3.connect(links.get_link_database())
+        try:
+            rows = connection.execute(
+                "SELECT * FROM sitemapcheck_link WHERE target = '/slow/'"
+            ).fetchall()
+        finally:
+            connection.close()
+        self.assertEqual(rows, [])
+
+    def test_static_and_media_files(self):
+        os.makedirs(os.path.join(self.root, 'static', 'css'))
+        os.makedirs(os.path.join(self.root, 'media'))
+        for name in (os.path.join('static', 'css', 'site.css'),
+                     os.path.join('media', 'photo 1.jpg')):
+            open(os.path.join(self.root, name), 'w').close()
+        response = HttpResponse(
+            '<link rel="stylesheet" href="/static/css/site.css">'
+            '<script src="/static/app.js"></script>'
+            '<a href="/media/photo%201.jpg">photo</a>'
+            '<a href="/media/gone.jpg">gone</a>')
+        with self.settings(
+                SITEMAPCHECK_CHECKS=(
+                    'sitemapcheck.links.check_internal_links',),
+                STATIC_URL='/static/', MEDIA_URL='/media/',
+                STATICFILES_DIRS=(os.path.join(self.root, 'static'),),
+                MEDIA_ROOT=os.path.join(self.root, 'media')):
+            from sitemapcheck.utils import summarise_response
+            result = summarise_response('/somewhere/', response)
+        self.assertEqual(result.check_results[0].msg,
+                         "2 of 4 internal links broken: /static/app.js (404), "
+                         "/media/gone.jpg (404)")
+
+    def test_all_fine(self):
+        response = HttpResponse('<a href="/ok/">ok</a>')
+        with self.settings(SITEMAPCHECK_CHECKS=(
+                'sitemapcheck.links.check_internal_links',)):
+            from sitemapcheck.utils import summarise_response
+            result = summarise_response('/somewhere/', response)
+        self.assertEqual(result.check_results[0].code, Success)
+        self.assertEqual(result.check_results[0].msg, '1 internal links OK')
+
+
+class LiveLinkStatusTestCase(Test):
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.server.route('/ok/')
+        self.server.route('/trickle/', headers={'trickle': 0.05})
+
+    def tearDown(self):
+        use_link_database(None)
+        self.server.stop()
+
+    def test_fetched(self):
+        self.assertEqual(fetch_live_link_status(self.server.base_url,
+                                                '/ok/'), 200)
+        self.assertEqual(fetch_live_link_status(self.server.base_url,
+                                                '/missing/'), 404)
+
+    def test_given_up_on(self):
+        started = time.time()
+        with self.settings(SITEMAPCHECK_LIVE_TIMEOUT=0.3):
+            self.assertIsNone(fetch_live_link_status(self.server.base_url,
+                                                     '/trickle/'))
+        self.assertLess(time.time() - started, 2)
+
+    def test_closed_with_the_run(self):
+        fetch_live_link_status(self.server.base_url, '/ok/')
+        self.assertTrue(links._link_pools)
+        use_link_database(None)
+        self.assertEqual(links._link_pools, {})
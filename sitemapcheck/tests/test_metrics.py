@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from django.test import SimpleTestCase as Test
+from sitemapcheck.checks import Error
+from sitemapcheck.metrics import escape_label
+from sitemapcheck.metrics import format_metrics
+from sitemapcheck.metrics import write_metrics
+from sitemapcheck.progress import Progress
+from .test_progress import FakeClock
+from .test_progress import prepare
+from .test_progress import result
+
+
+def samples(text):
+    """
+    Each sample in the text, by name (with its labels).
+    """
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            values[name] = float(value)
+    return values
+
+
+class MetricsTestCase(Test):
+    def setUp(self):
+        clock = FakeClock()
+        self.progress = Progress(listed={'pages': 3}, clock=clock)
+        list(self.progress.listing([prepare('/1/', 'pages'),
+                                    prepare('/2/', 'pages')]))
+        for x in self.progress.tracking([
+                result('/1/', elapsed=0.2),
+                result('/2/', elapsed=3, codes=(Error,), status=500)]):
+            clock.now += 2
+
+    def test_format(self):
+        text = format_metrics(self.progress, now=1000)
+        values = samples(text)
+        self.assertEqual(values['sitemapcheck_urls_listed{section="pages"}'],
+                         3)
+        self.assertEqual(values['sitemapcheck_urls_checked'], 2)
+        self.assertEqual(
+            values['sitemapcheck_section_urls_checked{section="pages"}'], 2)
+        self.assertEqual(values['sitemapcheck_responses{status="200"}'], 1)
+        self.assertEqual(values['sitemapcheck_responses{status="500"}'], 1)
+        self.assertEqual(values['sitemapcheck_errors'], 1)
+        self.assertEqual(values['sitemapcheck_run_duration_seconds'], 4)
+        self.assertEqual(values['sitemapcheck_run_interrupted'], 0)
+        self.assertEqual(values['sitemapcheck_run_finished_timestamp_seconds'],
+                         1000)
+        self.assertEqual(values['sitemapcheck_urls_per_second'], 0.5)
+        self.assertEqual(values['sitemapcheck_worker_urls_checked'
+                                '{worker="1"}'], 2)
+        # 3.2s fetching and 1s checking, in a 4s run (made up times).
+        self.assertAlmostEqual(values['sitemapcheck_worker_busy_ratio'
+                                      '{worker="1"}'], 1.05)
+        self.assertIn('# TYPE sitemapcheck_response_seconds histogram', text)
+        self.assertEqual(values['sitemapcheck_response_seconds_bucket'
+                                '{le="0.25"}'], 1)
+        self.assertEqual(values['sitemapcheck_response_seconds_bucket'
+                                '{le="5.0"}'], 2)
+        self.assertEqual(values['sitemapcheck_response_seconds_bucket'
+                                '{le="+Inf"}'], 2)
+        self.assertEqual(values['sitemapcheck_response_seconds_count'], 2)
+        self.assertAlmostEqual(values['sitemapcheck_response_seconds_sum'],
+                               3.2)
+        self.assertEqual(values['sitemapcheck_ttfb_seconds_count'], 2)
+
+    def test_interrupted(self):
+        values = samples(format_metrics(self.progress, interrupted=True))
+        self.assertEqual(values['sitemapcheck_run_interrupted'], 1)
+
+    def test_failed_responses(self):
+        progress = Progress(clock=FakeClock())
+        list(progress.tracking([result('/1/', status=None, elapsed=None)]))
+        values = samples(format_metrics(progress))
+        self.assertEqual(values['sitemapcheck_responses{status="failed"}'], 1)
+        self.assertNotIn('sitemapcheck_urls_listed', values)
+
+    def test_escape_label(self):
+        self.assertEqual(escape_label('a"b\\c\nd'), 'a\\"b\\\\c\\nd')
+
+    def test_write(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'sitemapcheck.prom')
+        with open(path, 'w') as f:
+            f.write('old')
+        write_metrics(self.progress, path)
+        with open(path) as f:
+            self.assertEqual(samples(f.read())['sitemapcheck_urls_checked'],
+                             2)
+        self.assertEqual(os.listdir(directory), ['sitemapcheck.prom'])
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+from django.conf.urls import patterns, url
+from django.contrib.sitemaps import Sitemap
+from django.contrib.sitemaps.views import sitemap
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import TestCase as DbTest
+from django.test.utils import override_settings
+from django.utils import six
+from sitemapcheck import pages
+from sitemapcheck.checks import Error
+from sitemapcheck.pages import SitemapPage
+from sitemapcheck.pages import check_sitemap_page
+from sitemapcheck.pages import pagewise_multiprocessor
+from sitemapcheck.pages import sitemap_pages_iterator
+from sitemapcheck.shards import shard_for_path
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import get_request_site
+
+
+def page(request, pk):
+    return HttpResponse("<!doctype html><title>{0!s}</title>".format(pk))
+
+
+def dying(request):
+    os._exit(3)
+
+
+def broken(request):
+    raise ValueError("bad view")
+
+
+class PagedSitemap(Sitemap):
+    limit = 2
+
+    def items(self):
+        return ['/page/{0:d}/'.format(x) for x in range(5)]
+
+    def location(self, obj):
+        return obj
+
+
+class OtherSitemap(PagedSitemap):
+    def items(self):
+        return ['/page/other/']
+
+
+class DyingSitemap(PagedSitemap):
+    def items(self):
+        return ['/page/3/', '/dying/']
+
+
+class BrokenSitemap(PagedSitemap):
+    def items(self):
+        return ['/page/3/', '/broken/']
+
+
+SITEMAPS = {'paged': PagedSitemap, 'other': OtherSitemap}
+
+urlpatterns = patterns('',
+    url(r'^sitemap\.xml$', sitemap, {'sitemaps': SITEMAPS}),
+    url(r'^page/(?P<pk>\w+)/$', page),
+    url(r'^dying/$', dying),
+    url(r'^broken/$', broken),
+)
+
+
+@override_settings(ROOT_URLCONF='sitemapcheck.tests.test_pages')
+class PagesTestCase(DbTest):
+    def setUp(self):
+        pages._worker_state.clear()
+
+    def tearDown(self):
+        pages._worker_state.clear()
+
+    def test_pages(self):
+        self.assertEqual(list(sitemap_pages_iterator(SITEMAPS)), [
+            SitemapPage(section='other', page=1),
+            SitemapPage(section='paged', page=1),
+            SitemapPage(section='paged', page=2),
+            SitemapPage(section='paged', page=3),
+        ])
+
+    def test_check_sitemap_page(self):
+        results = check_sitemap_page((pages.Client, 'paged', 2, None, None,
+                                      None, None))
+        self.assertEqual([x.path for x in results],
+                         ['/page/2/', '/page/3/'])
+        self.assertTrue(all(isinstance(x, Response) for x in results))
+        self.assertEqual([x.status_code for x in results], [200, 200])
+
+    def test_check_sitemap_page_gone(self):
+        self.assertEqual(
+            check_sitemap_page((pages.Client, 'paged', 9, None, None, None,
+                                None)), [])
+
+    def test_check_sitemap_page_shard(self):
+        results = check_sitemap_page((pages.Client, 'paged', 1, (1, 2), None,
+                                      None, None))
+        expected = [x for x in ('/page/0/', '/page/1/')
+                    if shard_for_path(x, 2) == 1]
+        self.assertEqual([x.path for x in results], expected)
+
+    def test_pagewise_multiprocessor(self):
+        results = list(pagewise_multiprocessor(SITEMAPS, processes=2))
+        self.assertEqual(sorted(x.path for x in results),
+                         ['/page/0/', '/page/1/', '/page/2/', '/page/3/',
+                          '/page/4/', '/page/other/'])
+        self.assertTrue(all(x.status_code == 200 for x in results))
+
+    def test_pagewise_multiprocessor_worker_dies(self):
+        sitemaps = {'paged': PagedSitemap, 'dying': DyingSitemap}
+        # handed to the forked workers, in place of the urlconf's.
+        pages._worker_state['sitemaps'] = sitemaps
+        pages._worker_state['request_site'] = get_request_site()
+        results = list(pagewise_multiprocessor(sitemaps, processes=2,
+                                               retries=0))
+        self.assertEqual(sorted(x.path for x in results),
+                         ['/dying/', '/page/0/', '/page/1/', '/page/2/',
+                          '/page/3/', '/page/3/', '/page/4/'])
+        lost = [x for x in results if x.status_code is None]
+        self.assertEqual(sorted(x.path for x in lost),
+                         ['/dying/', '/page/3/'])
+        for result in lost:
+            self.assertEqual(result.check_results[0].code, Error)
+            self.assertIn('died', result.check_results[0].msg)
+
+    def test_pagewise_multiprocessor_view_raises(self):
+        sitemaps = {'broken': BrokenSitemap}
+        pages._worker_state['sitemaps'] = sitemaps
+        pages._worker_state['request_site'] = get_request_site()
+        results = list(pagewise_multiprocessor(sitemaps, processes=2))
+        results = dict((x.path, x) for x in results)
+        self.assertEqual(sorted(results), ['/broken/', '/page/3/'])
+        self.assertEqual(results['/page/3/'].status_code, 200)
+        self.assertIsNone(results['/broken/'].status_code)
+        check = results['/broken/'].check_results[0]
+        self.assertEqual(check.code, Error)
+        self.assertEqual(check.msg, 'ValueError: bad view')
+
+    def run_command(self, **options):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        stderr = six.StringIO()
+        with override_settings(SITEMAPCHECK_MULTIPROCESSING=2):
+            with self.assertRaises(SystemExit):
+                call_command('sitemapcheck', enumerate_in_workers=True,
+                             reports=[], stdout=six.StringIO(), stderr=stderr,
+                             checkpoint=os.path.join(root, 'checkpoint'),
+                             **options)
+        return stderr.getvalue()
+
+    def test_pagewise_warns_duplicates_kept(self):
+        self.assertIn('URLs listed more than once are checked each time',
+                      self.run_command(deduplicate=True))
+
+    def test_pagewise_keep_duplicates(self):
+        self.assertNotIn('URLs listed more than once',
+                         self.run_command(deduplicate=False))
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import os
+import pstats
+import shutil
+import tempfile
+from django.http import HttpResponse
+from django.test import Client
+from django.test import SimpleTestCase as Test
+from sitemapcheck.checks import check_html_title
+from sitemapcheck.checks import check_status_code
+from sitemapcheck.profiling import CheckProfile
+from sitemapcheck.profiling import Histogram
+from sitemapcheck.profiling import SlowestURLs
+from sitemapcheck.profiling import profile_urls
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import handle_request_response
+from sitemapcheck.utils import run_checks_over_response
+
+
+class HistogramTestCase(Test):
+    def test_empty(self):
+        histogram = Histogram()
+        self.assertIsNone(histogram.percentile(50))
+        self.assertIsNone(histogram.mean)
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for x in range(1, 101):
+            histogram.add(x / 1000.0)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.total, 5.05)
+        self.assertEqual(histogram.max, 0.1)
+        # within a bucket's width of the true value, and never over the max.
+        self.assertTrue(0.05 <= histogram.percentile(50) <= 0.05 * 1.26)
+        self.assertTrue(0.09 <= histogram.percentile(90) <= 0.1)
+        self.assertAlmostEqual(histogram.percentile(100), 0.1)
+
+    def test_bounded(self):
+        histogram = Histogram()
+        for x in range(10000):
+            histogram.add(0.001 + (x % 7) / 10000.0)
+        self.assertLess(len(histogram.buckets), 10)
+
+
+class CheckProfileTestCase(Test):
+    def test_adds_up_by_check(self):
+        profile = CheckProfile(['a', 'b'])
+        results = [Response(path='/', status_code=200, check_times=(0.1, 1)),
+                   Response(path='/', status_code=200, check_times=(0.3, 2)),
+                   Response(path='/', status_code=200, check_times=None),
+                   Response(path='/', status_code=200, check_times=(1,))]
+        self.assertEqual(list(profile.collecting(results)), results)
+        rows = profile.rows()
+        self.assertEqual([row['name'] for row in rows], ['b', 'a'])
+        self.assertEqual(rows[0]['count'], 2)
+        self.assertEqual(rows[0]['total'], 3)
+        self.assertAlmostEqual(rows[1]['mean'], 0.2)
+        self.assertEqual(rows[1]['max'], 0.3)
+
+    def test_run_checks_records_times(self):
+        times = []
+        response = HttpResponse("<title>x</title>")
+        results = list(run_checks_over_response(
+            response, checks=(check_status_code, check_html_title),
+            times=times))
+        self.assertEqual(len(results), 2)
+        self.assertEqual(len(times), 2)
+        self.assertTrue(all(x >= 0 for x in times))
+
+    def test_results_carry_times(self):
+        checks = ('sitemapcheck.checks.check_status_code',
+                  'sitemapcheck.checks.check_html_title')
+        with self.settings(SITEMAPCHECK_CHECKS=checks):
+            result = handle_request_response(Client, '/sitemap_c.xml')
+        self.assertEqual(len(result.check_times), 2)
+        loaded = Response.from_dict(result.as_dict())
+        self.assertEqual(loaded.check_times, result.check_times)
+
+
+class SlowestURLsTestCase(Test):
+    def test_keeps_slowest(self):
+        slowest = SlowestURLs(2)
+        for x, elapsed in enumerate((0.1, 0.5, 0.2, None, 0.4)):
+            slowest.add(Response(path='/{0:d}/'.format(x), status_code=200,
+                                 elapsed=elapsed))
+        self.assertEqual(slowest.paths(), ['/1/', '/4/'])
+
+    def test_ignores_failures(self):
+        slowest = SlowestURLs(2)
+        slowest.add(Response(path='/', status_code=None, elapsed=5))
+        self.assertEqual(slowest.paths(), [])
+
+
+class ProfileUrlsTestCase(Test):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_writes_stats(self):
+        directory = os.path.join(self.root, 'profiles')
+        written = list(profile_urls(['/sitemap_c.xml', '/'], directory))
+        self.assertEqual([path for path, filename in written],
+                         ['/sitemap_c.xml', '/'])
+        names = [os.path.basename(filename) for path, filename in written]
+        self.assertEqual(names, ['01-sitemap_cxml.pstats',
+                                 '02-root.pstats'])
+        stats = pstats.Stats(written[0][1])
+        self.assertGreater(stats.total_calls, 0)
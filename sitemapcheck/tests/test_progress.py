@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+from django.test import SimpleTestCase as Test
+from django.test import TestCase as DbTest
+from sitemapcheck.checks import Caution
+from sitemapcheck.checks import CheckedResponse
+from sitemapcheck.checks import Error
+from sitemapcheck.checks import Skipped
+from sitemapcheck.checks import Success
+from sitemapcheck.progress import LatencyHistogram
+from sitemapcheck.progress import Progress
+from sitemapcheck.progress import count_listed
+from sitemapcheck.progress import format_duration
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import SitemapRequestResponse
+from sitemapcheck.utils import Timings
+from .test_pages import SITEMAPS
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def prepare(path, section):
+    return SitemapRequestResponse(handler=None, path=path, sitemap_item=None,
+                                  section=section)
+
+
+def result(path, worker='1', elapsed=1.0, codes=(Success,), status=200):
+    checks = tuple(CheckedResponse(msg='', code=code, name='check')
+                   for code in codes)
+    timings = None
+    if elapsed is not None:
+        timings = Timings(ttfb=elapsed / 2, queries=None, query_time=None,
+                          render_time=None)
+    return Response(path=path, status_code=status, elapsed=elapsed,
+                    check_results=checks, worker=worker, timings=timings,
+                    check_times=(0.5,))
+
+
+class ProgressTestCase(Test):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.written = []
+        self.progress = Progress(listed={'a': 4, 'b': 6}, interval=5,
+                                 write=self.written.append, clock=self.clock)
+
+    def run_through(self, results, seconds=1):
+        """
+        Tracks the results, each arriving `seconds` after the last.
+        """
+        tracked = []
+        for x in self.progress.tracking(results):
+            tracked.append(x)
+            self.clock.now += seconds
+        return tracked
+
+    def test_counts(self):
+        prepared = [prepare('/a/1/', 'a'), prepare('/a/2/', 'a'),
+                    prepare('/b/1/', 'b')]
+        list(self.progress.listing(prepared))
+        results = [result('/a/1/', codes=(Success, Error, Skipped)),
+                   result('/a/2/', codes=(Caution,), status=404),
+                   result('/b/1/', worker='2', status=None, elapsed=None)]
+        self.assertEqual(self.run_through(results), results)
+        self.assertEqual(self.progress.checked, 3)
+        self.assertEqual(self.progress.checked_by_section, {'a': 2, 'b': 1})
+        self.assertEqual(self.progress.statuses, {200: 1, 404: 1, None: 1})
+        self.assertEqual((self.progress.errors, self.progress.warnings,
+                          self.progress.skipped), (1, 1, 1))
+        self.assertEqual(self.progress.response_times.count, 2)
+        self.assertEqual(self.progress.sections, {})
+
+    def test_rate_and_eta(self):
+        self.run_through([result('/{0:d}/'.format(x)) for x in range(4)],
+                         seconds=2)
+        self.assertEqual(self.progress.elapsed, 8)
+        self.assertEqual(self.progress.rate, 0.5)
+        self.assertEqual(self.progress.remaining, 6)
+        self.assertEqual(self.progress.eta, 12)
+
+    def test_resumed(self):
+        self.progress.already = 4
+        self.run_through([result('/1/'), result('/2/')])
+        self.assertEqual(self.progress.remaining, 4)
+        self.assertTrue(self.progress.describe().startswith(
+            'Checked 6 of 10 URLs (60%)'))
+
+    def test_unknown_total(self):
+        progress = Progress(clock=self.clock)
+        self.progress = progress
+        self.run_through([result('/1/', elapsed=0.25)])
+        self.assertIsNone(progress.eta)
+        self.assertEqual(progress.describe(),
+                         'Checked 1 URL, 1.0 a second; the worker 75% busy')
+
+    def test_utilisation(self):
+        self.run_through([result('/1/', worker='1', elapsed=1),
+                          result('/2/', worker='2', elapsed=0.5),
+                          result('/3/', worker='1', elapsed=0.5)], seconds=2)
+        self.assertEqual(list(self.progress.utilisation()),
+                         [('1', 2, 2.5 / 6), ('2', 1, 1.0 / 6)])
+
+    def test_describe(self):
+        list(self.progress.listing([prepare('/a/1/', 'a')]))
+        self.run_through([result('/a/1/', elapsed=0.5)], seconds=2)
+        self.assertEqual(self.progress.describe(),
+                         'Checked 1 of 10 URLs (10%), 0.5 a second, '
+                         'about 18s left; a 1/4, b 0/6; the worker 50% busy')
+
+    def test_writes_every_interval(self):
+        self.run_through([result('/{0:d}/'.format(x)) for x in range(10)],
+                         seconds=2)
+        # after the 3rd, 6th and 9th, 6 seconds apart.
+        self.assertEqual(len(self.written), 3)
+        self.assertTrue(self.written[0].startswith('Checked 3 of 10'))
+
+
+class LatencyHistogramTestCase(Test):
+    def test_cumulative(self):
+        histogram = LatencyHistogram(bounds=(0.1, 1, 10))
+        for seconds in (0.05, 0.1, 0.5, 20):
+            histogram.add(seconds)
+        self.assertEqual(list(histogram.cumulative()),
+                         [(0.1, 2), (1, 3), (10, 3)])
+        self.assertEqual(histogram.count, 4)
+        self.assertAlmostEqual(histogram.total, 20.65)
+
+
+class FormatDurationTestCase(Test):
+    def test_format(self):
+        self.assertEqual(format_duration(4.6), '5s')
+        self.assertEqual(format_duration(125), '2m05s')
+        self.assertEqual(format_duration(3725), '1h02m')
+
+
+class CountListedTestCase(DbTest):
+    def test_counts_each_section(self):
+        self.assertEqual(count_listed(SITEMAPS), {'paged': 5, 'other': 1})
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase as Test
+from django.test.utils import override_settings
+from sitemapcheck.checks import check_status_code
+from sitemapcheck.checks import check_html_title
+from sitemapcheck.registry import get_checks
+from sitemapcheck.registry import load_checks
+from sitemapcheck.settings import SITEMAPCHECK_CHECKS
+
+
+class LoadChecksTestCase(Test):
+    def test_resolves_callables(self):
+        checks = load_checks(('sitemapcheck.checks.check_status_code',
+                              'sitemapcheck.checks.check_html_title'))
+        self.assertEqual(checks, (check_status_code, check_html_title))
+
+    def test_missing_module(self):
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'yay.nope'):
+            load_checks(('yay.nope.check',))
+
+    def test_missing_attribute(self):
+        with self.assertRaisesRegexp(ImproperlyConfigured,
+                                     'sitemapcheck.checks.nope'):
+            load_checks(('sitemapcheck.checks.nope',))
+
+    def test_not_callable(self):
+        with self.assertRaisesRegexp(ImproperlyConfigured, 'not callable'):
+            load_checks(('sitemapcheck.checks.Success',))
+
+
+class GetChecksTestCase(Test):
+    def test_defaults(self):
+        checks = get_checks()
+        self.assertEqual(len(checks), len(SITEMAPCHECK_CHECKS))
+        self.assertIs(checks, get_checks())
+
+    @override_settings(SITEMAPCHECK_CHECKS=(
+        'sitemapcheck.checks.check_status_code',))
+    def test_follows_setting(self):
+        self.assertEqual(get_checks(), (check_status_code,))
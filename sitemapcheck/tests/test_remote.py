@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+from django.test import SimpleTestCase as Test
+from sitemapcheck.checks import Error
+from sitemapcheck.checks import Success
+from sitemapcheck.remote import ConnectionPool
+from sitemapcheck.remote import UndecodableBody
+from sitemapcheck.remote import build_response
+from sitemapcheck.remote import handle_live_request
+from sitemapcheck.remote import liveprocessor
+from sitemapcheck.utils import SitemapRequestResponse
+from .standin import PAGE
+from .standin import StandInServer
+from .standin import gzipped
+
+
+def prepare(*paths):
+    return (SitemapRequestResponse(handler=None, path=path, sitemap_item=None)
+            for path in paths)
+
+
+class BuildResponseTestCase(Test):
+    def test_copies_headers(self):
+        response = build_response(200, [('x-frame-options', 'DENY'),
+                                        ('content-type', 'text/html'),
+                                        ('content-length', '4'),
+                                        ('connection', 'keep-alive')],
+                                  b'test')
+        self.assertEqual(response['X-Frame-Options'], 'DENY')
+        self.assertEqual(response['Content-Type'], 'text/html')
+        self.assertNotIn('Connection', response)
+        self.assertEqual(response.content, b'test')
+
+    def test_no_content_type_given(self):
+        response = build_response(204, [], b'')
+        self.assertNotIn('Content-Type', response)
+        self.assertEqual(response.status_code, 204)
+
+    def test_decompresses(self):
+        response = build_response(200, [('content-encoding', 'gzip')],
+                                  gzipped(b'test'))
+        self.assertEqual(response.content, b'test')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_bad_compression(self):
+        with self.assertRaisesRegexp(UndecodableBody,
+                                     "Couldn't decode the gzip body"):
+            build_response(200, [('content-encoding', 'gzip')], b'test')
+
+
+class LiveTestCase(Test):
+    def setUp(self):
+        self.server = StandInServer().start()
+        self.server.route('/ok/', headers={'X-Frame-Options': 'DENY'})
+        self.server.route('/gzip/', headers={'gzip': True})
+        self.server.route('/prefix/ok/')
+        self.server.route('/trickle/', headers={'trickle': 0.05})
+        self.server.route('/badgzip/', headers={'Content-Encoding': 'gzip'})
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_request(self):
+        pool = ConnectionPool(self.server.base_url, size=1)
+        status, headers, body, ttfb = pool.request('/ok/')
+        pool.close()
+        self.assertEqual(status, 200)
+        self.assertEqual(body, PAGE)
+        self.assertGreater(ttfb, 0)
+
+    def test_base_url_path_is_a_prefix(self):
+        pool = ConnectionPool(self.server.base_url + '/prefix/', size=1)
+        status, headers, body, ttfb = pool.request('/ok/')
+        pool.close()
+        self.assertEqual(status, 200)
+
+    def test_rejects_other_schemes(self):
+        with self.assertRaises(ValueError):
+            ConnectionPool('ftp://localhost/', size=1)
+
+    def test_connections_are_kept_alive(self):
+        pool = ConnectionPool(self.server.base_url, size=1)
+        for _ in range(5):
+            pool.request('/ok/')
+        pool.close()
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_handles_gzip(self):
+        pool = ConnectionPool(self.server.base_url, size=1)
+        result = handle_live_request(pool, '/gzip/')
+        pool.close()
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.content_length, len(PAGE))
+        self.assertLessEqual(result.timings.ttfb, result.elapsed)
+        self.assertIsNone(result.timings.queries)
+        path, headers = self.server.requests[0]
+        self.assertEqual(headers.get('Accept-Encoding'), 'gzip')
+
+    def test_unreachable(self):
+        # a port nothing is listening on any more.
+        closed = StandInServer()
+        closed.server_close()
+        pool = ConnectionPool(closed.base_url, size=1, timeout=1)
+        result = handle_live_request(pool, '/ok/')
+        self.assertIsNone(result.status_code)
+        self.assertEqual(result.check_results[0].code, Error)
+
+    def test_bad_compression(self):
+        pool = ConnectionPool(self.server.base_url, size=1)
+        result = handle_live_request(pool, '/badgzip/')
+        pool.close()
+        self.assertIsNone(result.status_code)
+        self.assertEqual(result.check_results[0].code, Error)
+        self.assertIn("Couldn't decode the gzip body",
+                      result.check_results[0].msg)
+
+    def test_trickling_response(self):
+        # each byte comes well within the timeout, but the whole body
+        # doesn't.
+        pool = ConnectionPool(self.server.base_url, size=1, timeout=0.5)
+        result = handle_live_request(pool, '/trickle/')
+        self.assertIsNone(result.status_code)
+        self.assertEqual(result.check_results[0].code, Error)
+        self.assertEqual(result.check_results[0].msg, 'Timed out after 0.5s')
+        self.assertLess(result.elapsed, 2)
+        # the connection given up on isn't handed out again.
+        status, headers, body, ttfb = pool.request('/ok/')
+        pool.close()
+        self.assertEqual(body, PAGE)
+
+    def test_liveprocessor_chunks_of_many(self):
+        paths = ('/ok/', '/gzip/', '/missing/') * 4
+        results = tuple(liveprocessor(prepare(*paths),
+                                      base_url=self.server.base_url,
+                                      concurrency=2, chunksize=5))
+        self.assertEqual(sorted(x.path for x in results), sorted(paths))
+
+    def test_liveprocessor(self):
+        paths = ('/ok/', '/gzip/', '/missing/') * 4
+        results = tuple(liveprocessor(prepare(*paths),
+                                      base_url=self.server.base_url,
+                                      concurrency=3, chunksize=1))
+        self.assertEqual(sorted(x.path for x in results), sorted(paths))
+        statuses = dict((x.path, x.status_code) for x in results)
+        self.assertEqual(statuses, {'/ok/': 200, '/gzip/': 200,
+                                    '/missing/': 404})
+        self.assertLessEqual(self.server.connections, 3)
+        checks = dict((x.path, dict((c.name, c.code) for c in x.check_results))
+                      for x in results)
+        self.assertEqual(checks['/ok/']['HTML title'], Success)
+        self.assertEqual(checks['/ok/']['Clickjacking via X-Frame-Options'],
+                         Success)
+        self.assertEqual(checks['/gzip/']['HTML5 doctype'], Success)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+from xml.etree import ElementTree
+from django.test import SimpleTestCase as Test
+from django.utils import six
+from sitemapcheck.checks import Caution
+from sitemapcheck.checks import CheckedResponse
+from sitemapcheck.checks import Error
+from sitemapcheck.checks import Skipped
+from sitemapcheck.checks import Success
+from sitemapcheck.profiling import CheckProfile
+from sitemapcheck.reports import JUnitReportWriter
+from sitemapcheck.reports import parse_report
+from sitemapcheck.reports import write_reports
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import Timings
+from sitemapcheck.utils import compact_check_results
+
+
+def make_results():
+    return [
+        Response(path=u'/a/', status_code=200, content_length=10, headers={},
+                 elapsed=0.25, timings=Timings(0.125, 3, 0.01, 0.05),
+                 check_results=compact_check_results((
+                     CheckedResponse(msg=u'Fine', code=Success, name=u'Title'),
+                     CheckedResponse(msg=u'Too <long>', code=Caution,
+                                     name=u'Description'),
+                 ))),
+        Response(path=u'/b/é/', status_code=404, content_length=5, headers={},
+                 elapsed=None, check_results=compact_check_results((
+                     CheckedResponse(msg=u'Not found & "gone"', code=Error,
+                                     name=u'Status'),
+                     None,
+                 ))),
+    ]
+
+
+class ReportsTestCase(Test):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write(self, name):
+        path = os.path.join(self.root, 'report')
+        results = make_results()
+        written = list(write_reports(iter(results), [(name, path)]))
+        self.assertEqual(written, results)
+        return path
+
+    def test_jsonl(self):
+        path = self.write('jsonl')
+        with io.open(path, encoding='utf-8') as f:
+            loaded = [Response.from_dict(json.loads(line)) for line in f]
+        self.assertEqual([x.path for x in loaded], [u'/a/', u'/b/é/'])
+        self.assertEqual(loaded[1].check_results[0].msg,
+                         u'Not found & "gone"')
+
+    def test_csv(self):
+        path = self.write('csv')
+        if six.PY2:
+            with open(path, 'rb') as f:
+                rows = [[x.decode('utf-8') for x in row]
+                        for row in csv.reader(f)]
+        else:
+            with io.open(path, encoding='utf-8', newline='') as f:
+                rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['path', 'status_code', 'content_length',
+                                   'elapsed', 'ttfb', 'queries', 'query_time',
+                                   'render_time', 'check', 'result',
+                                   'message'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][:6], ['/a/', '200', '10', '0.25', '0.125',
+                                       '3'])
+        self.assertEqual(rows[2][8:], ['Description', 'Warning',
+                                       'Too <long>'])
+        self.assertEqual(rows[3][:8], [u'/b/é/', '404', '5', '', '', '', '',
+                                       ''])
+
+    def test_junit(self):
+        path = self.write('junit')
+        tree = ElementTree.parse(path)
+        suites = tree.getroot().findall('testsuite')
+        self.assertEqual([x.get('name') for x in suites], [u'/a/', u'/b/é/'])
+        self.assertEqual([x.get('failures') for x in suites], ['0', '1'])
+        self.assertEqual([x.get('tests') for x in suites], ['2', '1'])
+        properties = dict((x.get('name'), x.get('value'))
+                          for x in suites[0].findall('properties/property'))
+        self.assertEqual(properties['queries'], '3')
+        self.assertEqual(properties['content_length'], '10')
+        failure = suites[1].find('testcase/failure')
+        self.assertEqual(failure.get('message'), u'Not found & "gone"')
+
+    def test_junit_skipped(self):
+        path = os.path.join(self.root, 'report')
+        results = [Response(path=u'/a/', status_code=404,
+                            check_results=compact_check_results((
+                                CheckedResponse(msg=u'Gone', code=Error,
+                                                name=u'Status'),
+                                CheckedResponse(msg=u'Not a 2xx',
+                                                code=Skipped, name=u'Title'),
+                            )))]
+        list(write_reports(iter(results), [('junit', path)]))
+        suite = ElementTree.parse(path).getroot().find('testsuite')
+        self.assertEqual(suite.get('failures'), '1')
+        self.assertEqual(suite.get('skipped'), '1')
+        skipped = suite.findall('testcase')[1].find('skipped')
+        self.assertEqual(skipped.get('message'), u'Not a 2xx')
+
+    def test_html(self):
+        path = self.write('html')
+        with io.open(path, encoding='utf-8') as f:
+            html = f.read()
+        self.assertIn(u'href="#link-a"', html)
+        self.assertIn(u'/b/é/', html)
+        self.assertIn(u'Too &lt;long&gt;', html)
+        self.assertNotIn(u'<!-- index -->', html)
+        self.assertLess(html.index(u'Not found'), html.index(u'href="#link-a"'))
+
+    def test_html_check_profile(self):
+        path = os.path.join(self.root, 'report')
+        profile = CheckProfile(['sitemapcheck.checks.check_status_code'])
+        results = [Response(path=u'/a/', status_code=200,
+                            check_times=(0.0025,))]
+        list(write_reports(profile.collecting(results), [('html', path)],
+                           profile=profile))
+        with io.open(path, encoding='utf-8') as f:
+            html = f.read()
+        self.assertIn(u'check-profile', html)
+        self.assertIn(u'<td>2.500</td>', html)
+
+    def test_closes_on_error(self):
+        path = os.path.join(self.root, 'report')
+
+        def results():
+            yield make_results()[0]
+            raise RuntimeError("stopped")
+
+        with self.assertRaises(RuntimeError):
+            list(write_reports(results(), [('jsonl', path)]))
+        with io.open(path, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 1)
+
+
+    def test_finished_on_error(self):
+        junit = os.path.join(self.root, 'report.xml')
+        html = os.path.join(self.root, 'report.html')
+
+        def results():
+            yield make_results()[0]
+            raise RuntimeError("stopped")
+
+        with self.assertRaises(RuntimeError):
+            list(write_reports(results(), [('junit', junit),
+                                           ('html', html)]))
+        suites = ElementTree.parse(junit).getroot().findall('testsuite')
+        self.assertEqual([x.get('name') for x in suites], [u'/a/'])
+        with io.open(html, encoding='utf-8') as f:
+            self.assertIn(u'href="#link-a"', f.read())
+
+    def test_finished_when_stopped(self):
+        path = os.path.join(self.root, 'report')
+        written = write_reports(iter(make_results()), [('junit', path)])
+        next(written)
+        written.close()
+        suites = ElementTree.parse(path).getroot().findall('testsuite')
+        self.assertEqual(len(suites), 1)
+
+    def test_context_manager(self):
+        path = os.path.join(self.root, 'report')
+        with JUnitReportWriter(path) as writer:
+            writer.add(make_results()[0])
+        self.assertTrue(writer.file.closed)
+        ElementTree.parse(path)
+
+
+class ParseReportTestCase(Test):
+    def test_default_path(self):
+        expected = os.path.realpath('/tmp/sitemapcheck_report.xml')
+        self.assertEqual(parse_report('junit', '/tmp'), ('junit', expected))
+
+    def test_given_path(self):
+        name, path = parse_report('csv:out/results.csv', '/tmp')
+        self.assertEqual(name, 'csv')
+        self.assertEqual(path, os.path.realpath('/tmp/out/results.csv'))
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            parse_report('pdf', '/tmp')
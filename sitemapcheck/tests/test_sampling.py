@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+from django.conf.urls import patterns, url
+from django.http import HttpResponse
+from django.test import SimpleTestCase as Test
+from django.test.utils import override_settings
+from sitemapcheck.sampling import Sampler
+from sitemapcheck.sampling import UNRESOLVED
+from sitemapcheck.sampling import parse_sample
+from sitemapcheck.sampling import sample_key
+from sitemapcheck.sampling import url_pattern
+from sitemapcheck.utils import SitemapRequestResponse
+
+
+def view(request, pk=None):
+    return HttpResponse()
+
+
+urlpatterns = patterns('',
+    url(r'^product/(?P<pk>\d+)/$', view, name='product'),
+    url(r'^about/$', view),
+)
+
+
+def prepared(path):
+    return SitemapRequestResponse(handler=None, path=path, sitemap_item={})
+
+
+PATHS = (['/product/{0:d}/'.format(x) for x in range(200)] +
+         ['/about/', '/missing/'])
+
+
+class ParseSampleTestCase(Test):
+    def test_size(self):
+        self.assertEqual(parse_sample('5'), (5, None))
+        self.assertEqual(parse_sample(5), (5, None))
+
+    def test_fraction(self):
+        self.assertEqual(parse_sample('0.1'), (None, 0.1))
+
+    def test_invalid(self):
+        for value in ('0', '1.5', '-1', 'some'):
+            with self.assertRaises(ValueError):
+                parse_sample(value)
+
+
+@override_settings(ROOT_URLCONF='sitemapcheck.tests.test_sampling')
+class SamplerTestCase(Test):
+    def sample(self, **kwargs):
+        sampler = Sampler(**kwargs)
+        paths = [x.path for x in sampler.sampling(prepared(path)
+                                                  for path in PATHS)]
+        return sampler, paths
+
+    def test_url_pattern(self):
+        self.assertEqual(url_pattern('/product/1/'), 'product')
+        self.assertEqual(url_pattern('/about/'),
+                         'sitemapcheck.tests.test_sampling.view')
+        self.assertEqual(url_pattern('/missing/'), UNRESOLVED)
+
+    def test_size(self):
+        sampler, paths = self.sample(size=3, seed=1)
+        products = [x for x in PATHS[:200]]
+        expected = sorted(products, key=lambda path: sample_key(1, path))[:3]
+        # in the order listed.
+        self.assertEqual(paths, sorted(expected, key=products.index) +
+                         ['/about/', '/missing/'])
+        self.assertEqual(sampler.rows(), [
+            {'pattern': UNRESOLVED, 'sampled': 1, 'listed': 1,
+             'coverage': 100.0},
+            {'pattern': 'product', 'sampled': 3, 'listed': 200,
+             'coverage': 1.5},
+            {'pattern': 'sitemapcheck.tests.test_sampling.view', 'sampled': 1,
+             'listed': 1, 'coverage': 100.0},
+        ])
+        self.assertEqual((sampler.total_sampled, sampler.total_listed),
+                         (5, 202))
+
+    def test_reproducible(self):
+        self.assertEqual(self.sample(size=3, seed=1)[1],
+                         self.sample(size=3, seed=1)[1])
+        self.assertNotEqual(self.sample(size=3, seed=1)[1],
+                            self.sample(size=3, seed=2)[1])
+
+    def test_fraction(self):
+        sampler, paths = self.sample(fraction=0.1, seed=1)
+        self.assertEqual(paths, self.sample(fraction=0.1, seed=1)[1])
+        # the first of each pattern, and roughly a tenth of the rest.
+        self.assertEqual(paths[0], '/product/0/')
+        self.assertIn('/about/', paths)
+        products = sampler.sampled['product']
+        self.assertTrue(5 < products < 40, products)
+        self.assertEqual(sampler.listed['product'], 200)
+
+    def test_size_or_fraction(self):
+        with self.assertRaises(ValueError):
+            Sampler()
+        with self.assertRaises(ValueError):
+            Sampler(size=1, fraction=0.5)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+from django.test import SimpleTestCase as Test
+from sitemapcheck.checks import CheckedResponse
+from sitemapcheck.dedup import Deduplicator
+from sitemapcheck.sampling import Sampler
+from sitemapcheck.shards import order_shards
+from sitemapcheck.shards import parse_shard
+from sitemapcheck.shards import read_shard_summary
+from sitemapcheck.shards import read_shards
+from sitemapcheck.shards import shard_for_path
+from sitemapcheck.shards import shard_requests
+from sitemapcheck.shards import write_shard
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import SitemapRequestResponse
+
+
+class ParseShardTestCase(Test):
+    def test_valid(self):
+        self.assertEqual(parse_shard('1/4'), (1, 4))
+        self.assertEqual(parse_shard('4/4'), (4, 4))
+
+    def test_invalid(self):
+        for value in ('1', 'a/b', '0/4', '5/4', '1/0', '1/2/3'):
+            with self.assertRaises(ValueError):
+                parse_shard(value)
+
+
+class ShardForPathTestCase(Test):
+    def test_stable(self):
+        # these must never change, or shards from different versions
+        # would overlap.
+        self.assertEqual(shard_for_path('/test/', 4), 2)
+        self.assertEqual(shard_for_path(u'/t\xe9st/', 4), 4)
+
+    def test_disjoint_and_complete(self):
+        paths = ['/page/{0:d}/'.format(x) for x in range(200)]
+        prepared = [SitemapRequestResponse(handler=None, path=path,
+                                           sitemap_item=None)
+                    for path in paths]
+        shards = [[x.path for x in shard_requests(prepared, index, 3)]
+                  for index in (1, 2, 3)]
+        seen = sum(shards, [])
+        self.assertEqual(sorted(seen), sorted(paths))
+        self.assertTrue(all(len(shard) > 0 for shard in shards))
+
+
+class ShardFilesTestCase(Test):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, index, count, *paths, **kwargs):
+        filename = os.path.join(self.tempdir, '{0:d}_{1:d}.jsonl'.format(
+            index, count))
+        check = CheckedResponse(msg='OK!', code='Success', name='Status code')
+        results = [Response(path=path, status_code=200, content_length=3,
+                            check_results=(check,)) for path in paths]
+        with open(filename, 'w') as f:
+            written = list(write_shard(results, f, index, count, **kwargs))
+        self.assertEqual(written, results)
+        return filename
+
+    def test_round_trip(self):
+        second = self.write(2, 2, '/c/')
+        first = self.write(1, 2, '/a/', '/b/')
+        filenames = order_shards([second, first])
+        self.assertEqual(filenames, [first, second])
+        results = list(read_shards(filenames))
+        self.assertEqual([x.path for x in results], ['/a/', '/b/', '/c/'])
+        self.assertEqual(results[0].check_results[0].msg, 'OK!')
+
+    def test_summary(self):
+        duplicates = Deduplicator()
+        list(duplicates.filtering(
+            SitemapRequestResponse(handler=None, path=path,
+                                   sitemap_item=None, section=section)
+            for path, section in (('/a/', 'x'), ('/a/', 'y'), ('/a/', None))))
+        sampler = Sampler(fraction=0.5, seed='s')
+        sampler.listed = {'pages': 4}
+        sampler.sampled = {'pages': 2}
+        filename = self.write(1, 1, '/a/', duplicates=duplicates,
+                              sampler=sampler)
+        summary = read_shard_summary(filename)
+        self.assertEqual(summary['count'], 1)
+        merged = Deduplicator.from_dict(summary['duplicates'])
+        self.assertEqual(merged.rows(), [('y', 1), (None, 1)])
+        merged = Sampler.from_dict(summary['sample'])
+        self.assertEqual(merged.rows(), sampler.rows())
+        self.assertEqual(merged.seed, 's')
+        self.assertEqual([x.path for x in read_shards([filename])], ['/a/'])
+
+    def test_no_summary(self):
+        summary = read_shard_summary(self.write(1, 1, '/a/'))
+        self.assertEqual(summary, {'count': 1})
+
+    def test_missing_shard(self):
+        filename = self.write(1, 3, '/a/')
+        with self.assertRaisesRegexp(ValueError, 'Missing shard 2, 3 of 3'):
+            order_shards([filename])
+
+    def test_duplicate_shard(self):
+        filename = self.write(1, 1, '/a/')
+        with self.assertRaisesRegexp(ValueError, 'both shard 1/1'):
+            order_shards([filename, filename])
+
+    def test_not_a_shard(self):
+        filename = os.path.join(self.tempdir, 'nope.jsonl')
+        with io.open(filename, 'w') as f:
+            f.write(u'{"path": "/a/"}\n')
+        with self.assertRaisesRegexp(ValueError, "isn't a sitemapcheck shard"):
+            order_shards([filename])
+
+    def test_incomplete_shard(self):
+        filename = self.write(1, 1, '/a/', '/b/', finished=lambda: False)
+        with io.open(filename) as f:
+            self.assertNotIn(u'sitemapcheck_shard_end', f.read())
+        with self.assertRaisesRegexp(ValueError, 'is incomplete'):
+            order_shards([filename])
+
+    def test_truncated_shard(self):
+        filename = self.write(1, 1, '/a/', '/b/')
+        with io.open(filename) as f:
+            lines = f.readlines()
+        with io.open(filename, 'w') as f:
+            f.writelines(lines[:2] + lines[3:])
+        with self.assertRaisesRegexp(ValueError, 'is incomplete'):
+            order_shards([filename])
+
+    def test_stopped_early(self):
+        filename = os.path.join(self.tempdir, 'stopped.jsonl')
+        results = [Response(path=path, status_code=200, content_length=3,
+                            check_results=()) for path in ('/a/', '/b/')]
+        with open(filename, 'w') as f:
+            shard = write_shard(results, f, 1, 1)
+            next(shard)
+            shard.close()
+        with self.assertRaisesRegexp(ValueError, 'is incomplete'):
+            order_shards([filename])
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from django.conf.urls import patterns, url
+from django.contrib.sitemaps.views import index
+from django.contrib.sitemaps.views import sitemap
+from django.test import Client
+from django.test import TestCase as DbTest
+from django.test import SimpleTestCase as Test
+from django.test.utils import override_settings
+from sitemapcheck.sitemapxml import parse_sitemap_xml
+from sitemapcheck.sitemapxml import sitemap_xml_urls
+from sitemapcheck.sitemapxml import source_kind
+from sitemapcheck.utils import sitemap_request_iterator
+from .test_pages import SITEMAPS
+
+
+INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+<sitemap><loc>https://example.com/sitemap-pages-1.xml</loc>
+<lastmod>2015-01-01</lastmod></sitemap>
+<sitemap><loc>https://example.com/sitemap-pages-2.xml</loc></sitemap>
+</sitemapindex>
+"""
+
+URLSET = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+{urls}
+</urlset>
+"""
+
+URL = """<url><loc>https://example.com{path}</loc><lastmod>{lastmod}</lastmod>
+<priority>0.5</priority><changefreq>daily</changefreq></url>"""
+
+
+def urlset(*paths):
+    return URLSET.format(urls='\n'.join(
+        URL.format(path=path, lastmod='2015-02-0{0:d}'.format(x + 1))
+        for x, path in enumerate(paths))).encode('utf-8')
+
+
+class ParseSitemapXmlTestCase(Test):
+    def test_urlset(self):
+        parsed = list(parse_sitemap_xml(io.BytesIO(urlset('/a/', '/b/'))))
+        self.assertEqual(parsed, [
+            ('url', {'location': 'https://example.com/a/',
+                     'lastmod': '2015-02-01', 'priority': '0.5',
+                     'changefreq': 'daily'}),
+            ('url', {'location': 'https://example.com/b/',
+                     'lastmod': '2015-02-02', 'priority': '0.5',
+                     'changefreq': 'daily'}),
+        ])
+
+    def test_index(self):
+        parsed = list(parse_sitemap_xml(io.BytesIO(INDEX)))
+        self.assertEqual([kind for kind, info in parsed],
+                         ['sitemap', 'sitemap'])
+        self.assertEqual(parsed[0][1]['lastmod'], '2015-01-01')
+        self.assertIsNone(parsed[1][1]['lastmod'])
+
+    def test_without_namespace_or_optional_fields(self):
+        xml = b"<urlset><url><loc>/a/</loc></url><url></url></urlset>"
+        parsed = list(parse_sitemap_xml(io.BytesIO(xml)))
+        self.assertEqual(parsed, [('url', {'location': '/a/', 'lastmod': None,
+                                           'priority': None,
+                                           'changefreq': None})])
+
+
+class SitemapFilesTestCase(Test):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.index = os.path.join(self.root, 'sitemap.xml')
+        with open(self.index, 'wb') as f:
+            f.write(INDEX)
+        with open(os.path.join(self.root, 'sitemap-pages-2.xml'), 'wb') as f:
+            f.write(urlset('/c/'))
+        path = os.path.join(self.root, 'sitemap-pages-1.xml.gz')
+        f = gzip.open(path, 'wb')
+        try:
+            f.write(urlset('/a/', '/b/'))
+        finally:
+            f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_follows_index_to_plain_and_gzipped_files(self):
+        urls = list(sitemap_xml_urls(self.index))
+        self.assertEqual([x['location'] for x in urls],
+                         ['https://example.com/a/', 'https://example.com/b/',
+                          'https://example.com/c/'])
+
+    def test_feeds_request_iterator(self):
+        prepared = list(sitemap_request_iterator(
+            sitemap_xml_urls(self.index)))
+        self.assertEqual([x.path for x in prepared], ['/a/', '/b/', '/c/'])
+        self.assertEqual(prepared[0].lastmod, '2015-02-01')
+        self.assertEqual(prepared[0].sitemap_item['priority'], '0.5')
+
+    def test_gzipped_whatever_its_name(self):
+        path = os.path.join(self.root, 'sitemap-pages-1.xml.gz')
+        renamed = os.path.join(self.root, 'renamed.xml')
+        os.rename(path, renamed)
+        self.assertEqual(len(list(sitemap_xml_urls(renamed))), 2)
+
+    def test_source_kind(self):
+        self.assertEqual(source_kind(self.index), 'file')
+        self.assertEqual(source_kind('/sitemap.xml'), 'url')
+        self.assertEqual(source_kind('https://example.com/sitemap.xml'),
+                         'url')
+        with self.assertRaises(ValueError):
+            source_kind('missing.xml')
+
+
+class SitemapViewTestCase(DbTest):
+    def test_reads_view_output(self):
+        urls = list(sitemap_xml_urls('/sitemap_c.xml', client=Client))
+        self.assertEqual([x['location'] for x in urls],
+                         ['http://example.com/test/',
+                          'http://example.com/test2/',
+                          'http://example.com/test3/test4/'])
+
+    def test_missing_view(self):
+        with self.assertRaises(ValueError):
+            list(sitemap_xml_urls('/nowhere.xml', client=Client))
+
+
+urlpatterns = patterns('',
+    url(r'^sitemap\.xml$', index,
+        {'sitemaps': SITEMAPS, 'sitemap_url_name': 'section_sitemap'}),
+    url(r'^sitemap-(?P<section>.+)\.xml$', sitemap, {'sitemaps': SITEMAPS},
+        name='section_sitemap'),
+)
+
+
+@override_settings(ROOT_URLCONF='sitemapcheck.tests.test_sitemapxml')
+class SitemapIndexViewTestCase(DbTest):
+    def test_follows_every_page(self):
+        urls = list(sitemap_xml_urls('/sitemap.xml', client=Client))
+        self.assertEqual(sorted(x['location'] for x in urls),
+                         ['http://example.com/page/0/',
+                          'http://example.com/page/1/',
+                          'http://example.com/page/2/',
+                          'http://example.com/page/3/',
+                          'http://example.com/page/4/',
+                          'http://example.com/page/other/'])
+        self.assertEqual(set(x['section'] for x in urls),
+                         set(['sitemap-paged', 'sitemap-other']))
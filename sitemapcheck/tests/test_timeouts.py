@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+from multiprocessing import Value
+import time
+from django.conf.urls import patterns, url
+from django.http import HttpResponse
+from django.test import Client
+from django.test import SimpleTestCase as Test
+from django.test.utils import override_settings
+from sitemapcheck.checks import Error
+from sitemapcheck.timeouts import TimeLimit
+from sitemapcheck.timeouts import URLTimeout
+from sitemapcheck.timeouts import is_transient
+from sitemapcheck.timeouts import retry_delay
+from sitemapcheck.timeouts import with_retries
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import SitemapRequestResponse
+from sitemapcheck.utils import handle_within_limits
+from sitemapcheck.utils import multiprocessor
+from sitemapcheck.utils import singleprocessor
+
+
+# shared with the worker processes, which are forked after it's made.
+calls = Value('i', 0)
+
+
+def hang(request):
+    time.sleep(30)
+    return HttpResponse('<!doctype html><title>late</title>')
+
+
+def stubborn(request):
+    try:
+        time.sleep(30)
+    except Exception:
+        pass
+    return HttpResponse('<!doctype html><title>carried on</title>')
+
+
+def flaky(request):
+    with calls.get_lock():
+        calls.value += 1
+        count = calls.value
+    if count < 3:
+        return HttpResponse('busy', status=503)
+    return HttpResponse('<!doctype html><title>fine</title>')
+
+
+def fine(request):
+    return HttpResponse('<!doctype html><title>fine</title>')
+
+
+def broken(request):
+    raise ValueError("bad view")
+
+
+urlpatterns = patterns('',
+    url(r'^hang/$', hang),
+    url(r'^stubborn/$', stubborn),
+    url(r'^flaky/$', flaky),
+    url(r'^fine/$', fine),
+    url(r'^broken/$', broken),
+)
+
+
+def prepare(*paths):
+    return [SitemapRequestResponse(handler=Client, path=path,
+                                   sitemap_item=None)
+            for path in paths]
+
+
+class TimeLimitTestCase(Test):
+    def test_interrupts(self):
+        limit = TimeLimit(0.05)
+        started = time.time()
+        with self.assertRaises(URLTimeout):
+            with limit:
+                time.sleep(5)
+        self.assertLess(time.time() - started, 1)
+        self.assertTrue(limit.expired)
+
+    def test_in_time(self):
+        with TimeLimit(5) as limit:
+            pass
+        self.assertFalse(limit.expired)
+        # disarmed, so nothing is raised later on.
+        time.sleep(0.01)
+
+    def test_no_limit(self):
+        with TimeLimit(None) as limit:
+            time.sleep(0.01)
+        self.assertFalse(limit.armed)
+
+
+class RetriesTestCase(Test):
+    def test_retry_delay(self):
+        self.assertEqual([retry_delay(x, 0.5) for x in range(4)],
+                         [0, 0.5, 1.0, 2.0])
+
+    def test_is_transient(self):
+        self.assertTrue(is_transient(Response(path='/', status_code=None)))
+        self.assertTrue(is_transient(Response(path='/', status_code=503)))
+        self.assertFalse(is_transient(Response(path='/', status_code=404)))
+        self.assertFalse(is_transient(Response(path='/', status_code=200)))
+
+    def test_with_retries(self):
+        statuses = [503, 502, 200, 200]
+        results = []
+
+        def handle():
+            results.append(Response(path='/', status_code=statuses.pop(0)))
+            return results[-1]
+        result = with_retries(handle, retries=5, backoff=0)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(len(results), 3)
+
+    def test_gives_up(self):
+        handled = []
+
+        def handle():
+            handled.append(1)
+            return Response(path='/', status_code=None)
+        result = with_retries(handle, retries=2, backoff=0)
+        self.assertIsNone(result.status_code)
+        self.assertEqual(len(handled), 3)
+
+
+@override_settings(ROOT_URLCONF='sitemapcheck.tests.test_timeouts',
+                   SITEMAPCHECK_RETRY_BACKOFF=0.01)
+class URLTimeoutTestCase(Test):
+    def setUp(self):
+        calls.value = 0
+
+    def assertTimedOut(self, result, path):
+        self.assertEqual(result.path, path)
+        self.assertIsNone(result.status_code)
+        check = result.check_results[0]
+        self.assertEqual(check.code, Error)
+        self.assertTrue(check.msg.startswith('Timed out after'))
+
+    def test_single_process(self):
+        started = time.time()
+        results = list(singleprocessor(prepare('/hang/', '/fine/'),
+                                       timeout=0.1))
+        self.assertLess(time.time() - started, 5)
+        self.assertTimedOut(results[0], '/hang/')
+        self.assertEqual(results[1].status_code, 200)
+
+    def test_caught_timeout(self):
+        result = handle_within_limits(Client, '/stubborn/', timeout=0.1)
+        self.assertTimedOut(result, '/stubborn/')
+
+    def test_single_process_retries(self):
+        result = handle_within_limits(Client, '/flaky/', retries=2)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(calls.value, 3)
+
+    def assertRaised(self, result, path):
+        self.assertEqual(result.path, path)
+        self.assertIsNone(result.status_code)
+        check = result.check_results[0]
+        self.assertEqual(check.code, Error)
+        self.assertEqual(check.msg, 'ValueError: bad view')
+
+    def test_single_process_raises(self):
+        results = list(singleprocessor(prepare('/broken/', '/fine/')))
+        self.assertRaised(results[0], '/broken/')
+        self.assertEqual(results[1].status_code, 200)
+
+    def test_many_processes_raises(self):
+        results = list(multiprocessor(prepare('/broken/', '/fine/'),
+                                      processes=2, chunksize=1))
+        results = dict((x.path, x) for x in results)
+        self.assertRaised(results['/broken/'], '/broken/')
+        self.assertEqual(results['/fine/'].status_code, 200)
+
+    def test_many_processes(self):
+        started = time.time()
+        results = list(multiprocessor(
+            prepare('/hang/', '/fine/', '/hang/', '/fine/', '/fine/'),
+            processes=2, chunksize=2, timeout=0.3))
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(len(results), 5)
+        timed_out = [x for x in results if x.path == '/hang/']
+        for result in timed_out:
+            self.assertTimedOut(result, '/hang/')
+        self.assertEqual([x.status_code for x in results
+                          if x.path == '/fine/'], [200, 200, 200])
+
+    def test_many_processes_retries(self):
+        results = list(multiprocessor(prepare('/flaky/', '/fine/'),
+                                      processes=2, chunksize=1, retries=2))
+        statuses = dict((x.path, x.status_code) for x in results)
+        self.assertEqual(statuses, {'/flaky/': 200, '/fine/': 200})
+        self.assertEqual(calls.value, 3)
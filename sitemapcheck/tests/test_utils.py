@@ -1,10 +1,27 @@
 # -*- coding: utf-8 -*-
 from django.contrib.sitemaps import Sitemap
+from django.db import connection
 from django.test import SimpleTestCase as Test, Client
+from django.test import TestCase as DbTest
+from django.utils import six
+from sitemapcheck.checks import Success
 from sitemapcheck.utils import get_view_sitemaps
 from sitemapcheck.utils import sitemap_urls_iterator
 from sitemapcheck.utils import sitemap_request_iterator
 from sitemapcheck.utils import handle_request_response
+from sitemapcheck.utils import get_worker_client
+from sitemapcheck.utils import bounded_iterator
+from sitemapcheck.utils import multiprocessor
+from sitemapcheck.utils import chunked
+from sitemapcheck.utils import SitemapRequestResponse
+from sitemapcheck.utils import Response
+from sitemapcheck.utils import Timings
+from sitemapcheck.utils import describe_cost
+from sitemapcheck.utils import current_worker
+import os
+import pickle
+import threading
+import types
 
 
 class GetViewSitemapsTestCase(Test):
@@ -102,3 +119,153 @@ class HandleRequestResponseTestCase(Test):
         self.assertEqual(200, response.status_code)
         self.assertEqual('/sitemap_c.xml', response.path)
         self.assertGreater(len(response.check_results), 0)
+
+    def test_keeps_a_summary(self):
+        response = handle_request_response(client=Client, path='/sitemap_c.xml')
+        self.assertIsInstance(response, Response)
+        self.assertFalse(hasattr(response, '__dict__'))
+        self.assertGreater(response.content_length, 0)
+        self.assertGreaterEqual(response.elapsed, 0)
+        self.assertEqual(response.header('content-type'), 'application/xml')
+        self.assertIsNone(response.header('Location'))
+        status = response.check_results[0]
+        self.assertIsInstance(status.name, six.text_type)
+        self.assertIsInstance(status.code, six.text_type)
+        self.assertEqual(status.code, Success)
+
+    def test_summary_pickles(self):
+        response = handle_request_response(client=Client, path='/sitemap_c.xml')
+        unpickled = pickle.loads(pickle.dumps(response,
+                                              pickle.HIGHEST_PROTOCOL))
+        for attr in Response.__slots__:
+            self.assertEqual(getattr(unpickled, attr), getattr(response, attr))
+
+    def test_records_worker(self):
+        response = handle_request_response(client=Client, path='/test/')
+        self.assertEqual(response.worker, current_worker())
+        self.assertEqual(response.worker, str(os.getpid()))
+        loaded = Response.from_dict(response.as_dict())
+        self.assertEqual(loaded.worker, response.worker)
+
+    def test_client_is_reused(self):
+        class CountingClient(Client):
+            instances = 0
+
+            def __init__(self, *args, **kwargs):
+                CountingClient.instances += 1
+                super(CountingClient, self).__init__(*args, **kwargs)
+        handle_request_response(client=CountingClient, path='/test/')
+        client = get_worker_client(CountingClient)
+        client.cookies['sessionid'] = 'leaked'
+        handle_request_response(client=CountingClient, path='/test2/')
+        self.assertEqual(CountingClient.instances, 1)
+        self.assertIs(get_worker_client(CountingClient), client)
+        self.assertNotIn('sessionid', client.cookies)
+
+    def test_instance_is_used_as_is(self):
+        client = Client()
+        self.assertIs(get_worker_client(client), client)
+
+
+class TimingsTestCase(DbTest):
+    def test_records_queries_and_rendering(self):
+        response = handle_request_response(client=Client, path='/costly/')
+        self.assertEqual(response.status_code, 200)
+        timings = response.timings
+        self.assertEqual(timings.queries, 2)
+        self.assertGreaterEqual(timings.query_time, 0)
+        self.assertGreater(timings.render_time, 0)
+        self.assertLessEqual(timings.render_time, response.elapsed)
+        self.assertEqual(timings.ttfb, response.elapsed)
+
+    def test_query_log_kept_small(self):
+        for attempt in range(50):
+            response = handle_request_response(client=Client,
+                                               path='/costly/')
+            self.assertEqual(response.timings.queries, 2)
+        self.assertLessEqual(len(connection.queries), 2)
+
+    def test_round_trips(self):
+        response = handle_request_response(client=Client, path='/costly/')
+        loaded = Response.from_dict(response.as_dict())
+        self.assertEqual(loaded.timings, response.timings)
+
+    def test_describe_cost(self):
+        result = Response(path='/', status_code=200, content_length=100,
+                          elapsed=0.5, timings=Timings(ttfb=0.25, queries=1,
+                                                       query_time=0.125,
+                                                       render_time=0.0625))
+        self.assertEqual(describe_cost(result),
+                         '0.500s, first byte 0.250s, 100 bytes, '
+                         '1 query in 0.125s, rendering 0.062s')
+        result = Response(path='/', status_code=None)
+        self.assertEqual(describe_cost(result), '')
+
+
+class BoundedIteratorTestCase(Test):
+    def test_stops_at_limit(self):
+        pulled = []
+
+        def source():
+            for x in range(10):
+                pulled.append(x)
+                yield x
+        semaphore = threading.Semaphore(3)
+        iterator = bounded_iterator(source(), semaphore)
+        self.assertEqual([next(iterator) for _ in range(3)], [0, 1, 2])
+        self.assertEqual(pulled, [0, 1, 2])
+        self.assertFalse(semaphore.acquire(False))
+        semaphore.release()
+        semaphore.release()
+        self.assertEqual([next(iterator) for _ in range(2)], [3, 4])
+        self.assertEqual(pulled, [0, 1, 2, 3, 4])
+        self.assertFalse(semaphore.acquire(False))
+
+    def test_finishes(self):
+        semaphore = threading.Semaphore(5)
+        self.assertEqual(list(bounded_iterator(range(3), semaphore)),
+                         [0, 1, 2])
+
+
+class ChunkedTestCase(Test):
+    def test_chunked(self):
+        self.assertEqual(list(chunked(range(7), 3)),
+                         [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual(list(chunked([], 3)), [])
+
+
+class MultiprocessorTestCase(Test):
+    def test_streams_every_result(self):
+        paths = ('/test/', '/test2/', '/sitemap_c.xml', '/test3/test4/')
+        prepared = (SitemapRequestResponse(handler=Client, path=path,
+                                           sitemap_item=None)
+                    for path in paths)
+        results = multiprocessor(prepared, processes=2, chunksize=1,
+                                 max_in_flight=2)
+        self.assertIsInstance(results, types.GeneratorType)
+        results = tuple(results)
+        self.assertEqual(sorted(x.path for x in results), sorted(paths))
+        statuses = dict((x.path, x.status_code) for x in results)
+        self.assertEqual(statuses['/sitemap_c.xml'], 200)
+        self.assertEqual(statuses['/test/'], 404)
+        self.assertTrue(all(isinstance(x, Response) for x in results))
+
+    def test_chunks_of_many(self):
+        paths = ['/test{0:d}/'.format(x) for x in range(7)]
+        prepared = (SitemapRequestResponse(handler=Client, path=path,
+                                           sitemap_item=None)
+                    for path in paths)
+        results = tuple(multiprocessor(prepared, processes=2, chunksize=3,
+                                       max_in_flight=6))
+        self.assertEqual(sorted(x.path for x in results), sorted(paths))
+
+    def test_default_chunksize(self):
+        paths = ['/test{0:d}/'.format(x) for x in range(9)]
+        prepared = (SitemapRequestResponse(handler=Client, path=path,
+                                           sitemap_item=None)
+                    for path in paths)
+        results = tuple(multiprocessor(prepared, processes=2))
+        self.assertEqual(sorted(x.path for x in results), sorted(paths))
+
+    def test_nothing_to_do(self):
+        self.assertEqual(tuple(multiprocessor((), processes=2)), ())
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+from multiprocessing import Value
+import os
+import time
+from django.test import SimpleTestCase as Test
+from sitemapcheck.workers import WorkerPool
+
+
+# shared with the worker processes, which are forked after it's made.
+attempts = Value('i', 0)
+
+
+def work(task):
+    if task == 'hang':
+        time.sleep(30)
+    elif task == 'die':
+        os._exit(3)
+    elif task == 'raise':
+        raise ValueError("bad task")
+    elif task == 'pid':
+        return os.getpid()
+    elif task == 'flaky':
+        with attempts.get_lock():
+            attempts.value += 1
+            if attempts.value < 3:
+                return None
+    return task
+
+
+def give_up(task, msg, elapsed):
+    return (task, msg)
+
+
+class WorkerPoolTestCase(Test):
+    def setUp(self):
+        attempts.value = 0
+
+    def stream(self, tasks, chunksize=2, max_in_flight=4, **kwargs):
+        pool = WorkerPool(2, work, give_up=give_up, **kwargs)
+        return list(pool.stream(tasks, chunksize, max_in_flight))
+
+    def test_every_result(self):
+        tasks = list(range(11))
+        self.assertEqual(sorted(self.stream(tasks)), tasks)
+
+    def test_nothing_to_do(self):
+        self.assertEqual(self.stream([]), [])
+
+    def test_timeout(self):
+        started = time.time()
+        results = self.stream([1, 'hang', 2, 3, 'hang', 4], timeout=0.2)
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(sorted(x for x in results if isinstance(x, int)),
+                         [1, 2, 3, 4])
+        self.assertEqual([x for x in results if isinstance(x, tuple)],
+                         [('hang', 'Timed out after 0.2s')] * 2)
+
+    def test_worker_dies(self):
+        results = self.stream([1, 'die', 2, 3])
+        self.assertEqual(sorted(x for x in results if isinstance(x, int)),
+                         [1, 2, 3])
+        self.assertIn(('die', 'The worker process died (exit code 3)'),
+                      results)
+
+    def test_retries(self):
+        results = self.stream(['flaky', 1], retries=3, backoff=0.01,
+                              should_retry=lambda result: result is None)
+        self.assertEqual(sorted(results, key=str), [1, 'flaky'])
+        self.assertEqual(attempts.value, 3)
+
+    def test_retries_run_out(self):
+        results = self.stream(['hang'], timeout=0.1, retries=1, backoff=0)
+        self.assertEqual(results, [('hang', 'Timed out after 0.1s')])
+
+    def test_interrupted(self):
+        def tasks():
+            yield 1
+            yield 'hang'
+            raise KeyboardInterrupt
+        pool = WorkerPool(2, work)
+        with self.assertRaises(KeyboardInterrupt):
+            list(pool.stream(tasks(), 1, 4))
+        self.assertEqual(pool.workers, [])
+
+    def test_raises(self):
+        results = self.stream([1, 'raise', 2])
+        self.assertEqual(sorted(x for x in results if isinstance(x, int)),
+                         [1, 2])
+        self.assertIn(('raise', 'ValueError: bad task'), results)
+
+    def test_raises_without_give_up(self):
+        pool = WorkerPool(2, work)
+        with self.assertRaises(ValueError):
+            list(pool.stream([1, 'raise', 2], 2, 4))
+
+    def test_kept_between_streams(self):
+        pool = WorkerPool(2, work)
+        pool.start()
+        self.addCleanup(pool.close)
+        first = set(pool.stream(['pid'] * 6, 1, 2))
+        second = set(pool.stream(['pid'] * 6, 1, 2))
+        self.assertEqual(first | second, set(x.process.pid
+                                             for x in pool.workers))
+        self.assertEqual(len(pool.workers), 2)
+
+    def test_stopped_part_way_while_kept(self):
+        pool = WorkerPool(2, work)
+        pool.start()
+        self.addCleanup(pool.close)
+        results = pool.stream([1, 'hang', 'hang', 2], 1, 4)
+        next(results)
+        results.close()
+        # the workers left on the hung tasks were replaced, and nothing of
+        # the first stream turns up in the next.
+        self.assertEqual(len(pool.workers), 2)
+        self.assertFalse(any(x.pending for x in pool.workers))
+        self.assertEqual(sorted(pool.stream([3, 4, 5], 1, 4)), [3, 4, 5])
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Giving up on a URL which takes too long, and trying again those which fail
+in a way which may not happen twice.
+
+In a single process, a URL is timed by an interval timer whose signal
+interrupts the view. When checking with many processes the parent watches
+the workers instead, killing and replacing any which takes too long over a
+URL; see sitemapcheck.workers.
+"""
+import signal
+import time
+from django.conf import settings
+from .settings import SITEMAPCHECK_TIMEOUT
+from .settings import SITEMAPCHECK_RETRIES
+from .settings import SITEMAPCHECK_RETRY_BACKOFF
+
+
+# statuses saying the server (or something in front of it) is struggling,
+# rather than that the page is broken.
+RETRY_STATUSES = (502, 503, 504)
+
+
+class URLTimeout(Exception):
+    """
+    Raised in whatever is checking a URL once its time is up.
+    """
+
+
+def get_timeout(timeout=None):
+    if timeout is None:
+        timeout = getattr(settings, 'SITEMAPCHECK_TIMEOUT',
+                          SITEMAPCHECK_TIMEOUT)
+    return timeout
+
+
+def get_retries(retries=None):
+    if retries is None:
+        retries = getattr(settings, 'SITEMAPCHECK_RETRIES',
+                          SITEMAPCHECK_RETRIES)
+    return retries
+
+
+def get_retry_backoff(backoff=None):
+    if backoff is None:
+        backoff = getattr(settings, 'SITEMAPCHECK_RETRY_BACKOFF',
+                          SITEMAPCHECK_RETRY_BACKOFF)
+    return backoff
+
+
+def describe_timeout(seconds):
+    return "Timed out after {seconds:g}s".format(seconds=seconds)
+
+
+class TimeLimit(object):
+    """
+    Raises URLTimeout in the block it's used around once `seconds` have
+    passed, and remembers that it did, in case the block caught it.
+
+    Does nothing when not given a time, off the main thread (which alone
+    receives signals) or on platforms without interval timers.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expired = False
+        self.armed = False
+        self.previous = None
+
+    def interrupt(self, signum, frame):
+        self.expired = True
+        raise URLTimeout(describe_timeout(self.seconds))
+
+    def __enter__(self):
+        if not self.seconds or not hasattr(signal, 'setitimer'):
+            return self
+        try:
+            self.previous = signal.signal(signal.SIGALRM, self.interrupt)
+        except ValueError:
+            # not the main thread.
+            return self
+        self.armed = True
+        signal.setitimer(signal.ITIMER_REAL, self.seconds)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.armed:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            previous = self.previous
+            if previous is None:
+                # the handler wasn't installed from Python.
+                previous = signal.SIG_DFL
+            signal.signal(signal.SIGALRM, previous)
+            self.armed = False
+        return False
+
+
+def is_transient(result):
+    """
+    Whether the result is a failure which may well not happen again: a URL
+    which timed out or couldn't be fetched at all, or a response saying the
+    server is struggling.
+    """
+    return (result.status_code is None or
+            result.status_code in RETRY_STATUSES)
+
+
+def retry_delay(attempt, backoff):
+    """
+    How long to wait before making the given attempt at a URL; the first
+    retry (the second attempt) waits `backoff` seconds, and each after it
+    twice as long as the last.
+    """
+    if attempt < 1:
+        return 0
+    return backoff * 2 ** (attempt - 1)
+
+
+def with_retries(handle, retries=None, backoff=None, attempt=0):
+    """
+    Calls `handle()` for a result, and again while that result is a
+    transient failure, up to `retries` more times, waiting longer before
+    each. `attempt` is how many attempts were already made elsewhere.
+    """
+    retries = get_retries(retries)
+    backoff = get_retry_backoff(backoff)
+    while True:
+        delay = retry_delay(attempt, backoff)
+        if delay:
+            time.sleep(delay)
+        result = handle()
+        if attempt >= retries or not is_transient(result):
+            return result
+        attempt += 1
@@ -1,30 +1,56 @@
 # -*- coding: utf-8 -*-
 from collections import namedtuple
+import hashlib
+import itertools
 import logging
-from multiprocessing import cpu_count, Pool
+from multiprocessing import cpu_count, TimeoutError
+import os
+import signal
+import threading
+from timeit import default_timer
 try:
     from django.contrib.sites.shortcuts import get_current_site
 except ImportError:
     from django.contrib.sites.models import get_current_site
 from django.utils import six
 from django.utils.encoding import force_text
-import os
+from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
 from django.core.paginator import InvalidPage
 from django.core.urlresolvers import (reverse, NoReverseMatch, resolve,
                                       Resolver404)
-from django.template.loader import render_to_string
 from django.test import Client, RequestFactory
-from .settings import SITEMAPCHECK_CHECKS, SITEMAPCHECK_MULTIPROCESSING
-from .checks import Success
-from .checks import Caution
+from .settings import SITEMAPCHECK_MULTIPROCESSING
+from .settings import SITEMAPCHECK_CHUNKSIZE
+from .settings import SITEMAPCHECK_MAX_IN_FLIGHT
+from .settings import SITEMAPCHECK_RESULT_HEADERS
+from .settings import SITEMAPCHECK_INCREMENTAL
+from .settings import SITEMAPCHECK_ENUMERATE_IN_WORKERS
 from .checks import Error
-from .checks import Info
-
-try:  # try for Django 1.7+ first.
-    from django.utils.module_loading import import_string
-except ImportError:  # < Django 1.7
-    from django.utils.module_loading import import_by_path as import_string
+from .checks import CheckedResponse
+from .checks import CheckContext
+from .checks import Skipped
+from .checks import get_check_name
+from .checks import unmet_precondition
+from .body import HEADERS
+from .body import check_needs
+from .body import get_needs
+from .body import read_body
+from .document import Document
+from .document import get_document
+from .document import set_document
+from .instrumentation import Instrumentation
+from .registry import get_checks
+from .registry import get_checks_hash
+from .timeouts import TimeLimit
+from .timeouts import URLTimeout
+from .timeouts import describe_timeout
+from .timeouts import get_retries
+from .timeouts import get_retry_backoff
+from .timeouts import get_timeout
+from .timeouts import is_transient
+from .timeouts import with_retries
+from .workers import WorkerPool
 
 
 logger = logging.getLogger(__name__)
@@ -70,23 +96,69 @@ def get_view_sitemaps(name='django.contrib.sitemaps.views.sitemap'):
                         mount_url=url, message=None)
 
 
-def sitemap_urls_iterator(sitemaps):
+def get_request_site():
     request = RequestFactory().get('/')
-    request_site = get_current_site(request=request)
+    return get_current_site(request=request)
+
+
+def sitemap_page_urls(site, page, request_site):
+    """
+    The URLs on one page of one sitemap section, or none if the page has
+    since gone away.
+    """
+    if callable(site):
+        site = site()
+    try:
+        return site.get_urls(page=page, site=request_site)
+    except InvalidPage:
+        return []
+
+
+def sitemap_urls_iterator(sitemaps):
+    request_site = get_request_site()
     for site in sitemaps:
         if callable(site):
             site = site()
         pages = site.paginator.page_range
         for page in pages:
-            try:
-                for url in site.get_urls(page=page, site=request_site):
-                    yield url
-            except InvalidPage:
-                pass
+            for url in sitemap_page_urls(site, page, request_site):
+                yield url
+
+
+def sitemap_section_urls_iterator(sitemaps):
+    """
+    Every URL in a dictionary of sitemaps, a section at a time in order of
+    their names, with the name of its section added as `section`.
+    """
+    for section in sorted(sitemaps):
+        for url in sitemap_urls_iterator((sitemaps[section],)):
+            url['section'] = section
+            yield url
 
 
-SitemapRequestResponse = namedtuple('SitemapRequestResponse',
-                                    'handler path sitemap_item')
+class SitemapRequestResponse(namedtuple('SitemapRequestResponse',
+                                         'handler path sitemap_item lastmod '
+                                         'previous section')):
+    """
+    A URL waiting to be checked. `lastmod` is the sitemap's lastmod for it,
+    as text, `previous` the Response from an earlier run, if that's being
+    reused where possible, and `section` the sitemap section listing it,
+    where known.
+    """
+    __slots__ = ()
+
+    def __new__(cls, handler, path, sitemap_item, lastmod=None,
+                previous=None, section=None):
+        return super(SitemapRequestResponse, cls).__new__(
+            cls, handler, path, sitemap_item, lastmod, previous, section)
+
+
+def format_lastmod(value):
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return force_text(value)
 
 
 def sitemap_request_iterator(sitemap_results, client=None):
@@ -97,75 +169,615 @@ def sitemap_request_iterator(sitemap_results, client=None):
             continue
         full_url = urlinfo.get('location')
         path = six.moves.urllib_parse.urlsplit(full_url).path
-        yield SitemapRequestResponse(handler=client, path=path,
-                                     sitemap_item=urlinfo)
+        yield SitemapRequestResponse(
+            handler=client, path=path, sitemap_item=urlinfo,
+            lastmod=format_lastmod(urlinfo.get('lastmod')),
+            section=urlinfo.get('section'))
+
+
+def run_checks_over_response(response, checks=None, context=None,
+                             times=None):
+    """
+    Checks are called with the response, and those which set
+    `takes_context = True` with the CheckContext too. A check whose
+    preconditions aren't met is recorded as Skipped instead. Given a list
+    as `times`, the seconds each check took are appended to it.
+    """
+    if checks is None:
+        checks = get_checks()
+    results = {}
+    for check in checks:
+        started = default_timer()
+        reason = unmet_precondition(check, response, results)
+        if reason is not None:
+            result = CheckedResponse(msg=reason, code=Skipped,
+                                     name=get_check_name(check))
+        else:
+            if check_needs(check) != HEADERS:
+                # decode & index the body the first time it's needed; every
+                # check then shares it.
+                get_document(response)
+            if getattr(check, 'takes_context', False):
+                result = check(response, context)
+            else:
+                result = check(response)
+        results[check] = result
+        if times is not None:
+            times.append(default_timer() - started)
+        yield result
+
+
+def applicable_checks(response, checks):
+    """
+    The checks which may be run against the response, as far as can be told
+    before running any of them.
+    """
+    return [check for check in checks
+            if unmet_precondition(check, response) is None]
+
+
+Fingerprint = namedtuple('Fingerprint',
+                         'lastmod etag last_modified content_hash '
+                         'headers_hash checks_hash')
+# those recorded before the headers & checks were hashed have neither.
+Fingerprint.__new__.__defaults__ = (None, None)
+
+# headers which differ from one response to the next however unchanged the
+# page, so aren't compared.
+VOLATILE_HEADERS = ('age', 'date', 'expires', 'set-cookie')
+
+# what producing the response cost, beyond the overall `elapsed` time: the
+# time until its first byte (in-process, until the response was handed back,
+# as it arrives all at once), and when fetched in-process, the number of
+# database queries, their total time, and the time spent rendering templates.
+Timings = namedtuple('Timings', 'ttfb queries query_time render_time')
+
+
+class Response(object):
+    """
+    What's kept of each checked URL once the checks have run; deliberately
+    not the response itself, which carries the body, the request and the
+    client, and is sent back from every worker and held until the report
+    is written.
+
+    `reused` is True when the check results were carried over from an
+    earlier run because the URL was found to be unchanged. `check_times` are
+    the seconds each check took, in the order they ran, when they were run.
+    `worker` is which worker checked it, as current_worker() says.
+    """
+    __slots__ = ('path', 'status_code', 'content_length', 'headers',
+                 'elapsed', 'check_results', 'fingerprint', 'reused',
+                 'timings', 'check_times', 'worker')
+
+    def __init__(self, path, status_code, content_length=None, headers=(),
+                 elapsed=None, check_results=(), fingerprint=None,
+                 reused=False, timings=None, check_times=None, worker=None):
+        self.path = path
+        self.status_code = status_code
+        self.content_length = content_length
+        self.headers = headers
+        self.elapsed = elapsed
+        self.check_results = check_results
+        self.fingerprint = fingerprint
+        self.reused = reused
+        self.timings = timings
+        self.check_times = check_times
+        self.worker = worker
+
+    def __getstate__(self):
+        return tuple(getattr(self, attr) for attr in self.__slots__)
+
+    def __setstate__(self, state):
+        for attr, value in zip(self.__slots__, state):
+            setattr(self, attr, value)
+
+    def __repr__(self):
+        return '<{cls!s}: {path!s} ({status!s})>'.format(
+            cls=self.__class__.__name__, path=self.path,
+            status=self.status_code)
+
+    def as_dict(self):
+        """
+        A JSON-serialisable form, which from_dict turns back into a Response.
+        """
+        checks = [None if check is None else list(check)
+                  for check in self.check_results]
+        fingerprint = self.fingerprint
+        if fingerprint is not None:
+            fingerprint = list(fingerprint)
+        timings = self.timings
+        if timings is not None:
+            timings = list(timings)
+        return {
+            'path': self.path,
+            'status_code': self.status_code,
+            'content_length': self.content_length,
+            'headers': [list(header) for header in self.headers],
+            'elapsed': self.elapsed,
+            'check_results': checks,
+            'fingerprint': fingerprint,
+            'reused': self.reused,
+            'timings': timings,
+            'check_times': (None if self.check_times is None
+                            else list(self.check_times)),
+            'worker': self.worker,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        checks = tuple(None if check is None else CheckedResponse(*check)
+                       for check in data.get('check_results', ()))
+        fingerprint = data.get('fingerprint')
+        if fingerprint is not None:
+            fingerprint = Fingerprint(*fingerprint)
+        timings = data.get('timings')
+        if timings is not None:
+            timings = Timings(*timings)
+        check_times = data.get('check_times')
+        if check_times is not None:
+            check_times = tuple(check_times)
+        return cls(path=data['path'], status_code=data['status_code'],
+                   content_length=data.get('content_length'),
+                   headers=tuple(tuple(x) for x in data.get('headers', ())),
+                   elapsed=data.get('elapsed'), check_results=checks,
+                   fingerprint=fingerprint,
+                   reused=data.get('reused', False), timings=timings,
+                   check_times=check_times, worker=data.get('worker'))
+
+    def copy(self, **changes):
+        values = dict((attr, getattr(self, attr)) for attr in self.__slots__)
+        values.update(changes)
+        return self.__class__(**values)
+
+    def header(self, name):
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return None
+
+
+def describe_cost(result):
+    """
+    A one line summary of the time, size, queries and rendering it took to
+    produce the result, as far as they're known.
+    """
+    parts = []
+    if result.elapsed is not None:
+        parts.append('{0:.3f}s'.format(result.elapsed))
+    timings = result.timings
+    if (timings is not None and timings.ttfb is not None and
+            timings.ttfb != result.elapsed):
+        parts.append('first byte {0:.3f}s'.format(timings.ttfb))
+    if result.content_length is not None:
+        parts.append('{0:d} bytes'.format(result.content_length))
+    if timings is not None and timings.queries is not None:
+        plural = 'y' if timings.queries == 1 else 'ies'
+        parts.append('{count:d} quer{plural} in {time:.3f}s'.format(
+            count=timings.queries, plural=plural, time=timings.query_time))
+    if timings is not None and timings.render_time is not None:
+        parts.append('rendering {0:.3f}s'.format(timings.render_time))
+    return ', '.join(parts)
+
+
+def get_result_headers(response):
+    names = getattr(settings, 'SITEMAPCHECK_RESULT_HEADERS',
+                    SITEMAPCHECK_RESULT_HEADERS)
+    return tuple((name, response[name]) for name in names
+                 if name in response)
+
+
+# check names & result codes repeat for every URL, so each distinct one is only
+# kept once per process.
+_shared_text = {}
+
+
+def _share_text(value):
+    value = force_text(value)
+    return _shared_text.setdefault(value, value)
+
+
+def compact_check_results(check_results):
+    """
+    Converts the (usually lazily translated) parts of each CheckedResponse
+    to plain text, which is far smaller to hold and to pickle.
+    """
+    compacted = []
+    for check in check_results:
+        if check is not None:
+            check = CheckedResponse(msg=force_text(check.msg),
+                                    code=_share_text(check.code),
+                                    name=_share_text(check.name))
+        compacted.append(check)
+    return tuple(compacted)
+
+
+def current_worker():
+    """
+    Which worker this is: the process ID, and the name of the thread too
+    when not on the main one (as when checking over HTTP).
+    """
+    thread = threading.current_thread()
+    if thread.name == 'MainThread':
+        return '{pid:d}'.format(pid=os.getpid())
+    return '{pid:d}/{thread!s}'.format(pid=os.getpid(), thread=thread.name)
+
+
+def failed_response(path, msg, elapsed=None):
+    """
+    The result for a URL which couldn't be fetched at all, so there was
+    nothing to run the checks against.
+    """
+    check = CheckedResponse(msg=msg, code=Error, name=_("Request"))
+    return Response(path=path, status_code=None, elapsed=elapsed,
+                    check_results=compact_check_results((check,)),
+                    worker=current_worker())
+
+
+def get_content_length(response, body=None):
+    """
+    Given the ReadBody for the response, its length if it was read to the
+    end, rather than the length of the body joined up again.
+    """
+    if body is not None:
+        return body.length
+    if getattr(response, 'streaming', False):
+        return None
+    return len(response.content)
 
 
-def run_checks_over_response(response):
-    checks = getattr(settings, 'SITEMAPCHECK_CHECKS', SITEMAPCHECK_CHECKS)
-    imported_checks = (import_string(check) for check in checks)
-    for check in imported_checks:
-        yield check(response)
+def get_content_hash(response, body=None):
+    if body is not None:
+        return body.sha1
+    if getattr(response, 'streaming', False):
+        return None
+    return hashlib.sha1(response.content).hexdigest()
 
 
-Response = namedtuple('Response', 'raw_data status_code path check_results')
+def get_headers_hash(response):
+    headers = sorted(
+        (force_text(name).lower(), force_text(value))
+        for name, value in response.items()
+        if name.lower() not in VOLATILE_HEADERS)
+    return hashlib.sha1('\n'.join(
+        '{0!s}: {1!s}'.format(name, value) for name, value in headers
+    ).encode('utf-8')).hexdigest()
 
 
-def handle_request_response(client, path):
-    if callable(client):
-        # instantiates the test client or whatever
-        client = client()
-    data = client.get(path)
-    # the following modifications allow the django test Client to be
-    # pickled, allowing us to multiplex over more than one process using
-    # the stdlib's multiprocessing module.
+def get_fingerprint(response, lastmod=None, body=None):
+    return Fingerprint(lastmod=lastmod, etag=response.get('ETag'),
+                       last_modified=response.get('Last-Modified'),
+                       content_hash=get_content_hash(response, body=body),
+                       headers_hash=get_headers_hash(response),
+                       checks_hash=get_checks_hash())
+
+
+def reusable(previous):
+    """
+    Whether the previous result's check results may be carried over, if the
+    URL hasn't changed: it was successful, and checked with the checks
+    configured now.
+    """
+    if previous is None or previous.fingerprint is None:
+        return False
+    if previous.status_code is None or not 200 <= previous.status_code < 300:
+        # whatever was wrong may have been put right since.
+        return False
+    return previous.fingerprint.checks_hash == get_checks_hash()
+
+
+def unchanged_since(previous, lastmod):
+    """
+    Whether the sitemap's lastmod says the URL hasn't changed since the
+    previous result was recorded, so it needn't be fetched at all.
+    """
+    if not reusable(previous) or lastmod is None:
+        return False
+    return previous.fingerprint.lastmod == lastmod
+
+
+def conditional_headers(previous):
+    """
+    The If-None-Match and If-Modified-Since values to send, from the
+    previous result's ETag and Last-Modified, if its check results could be
+    reused on a 304 Not Modified.
+    """
+    headers = {}
+    if not reusable(previous):
+        return headers
+    if previous.fingerprint.etag is not None:
+        headers['If-None-Match'] = previous.fingerprint.etag
+    if previous.fingerprint.last_modified is not None:
+        headers['If-Modified-Since'] = previous.fingerprint.last_modified
+    return headers
+
+
+# the client (or other handler) instantiated by this process for each handler
+# class, reused for every URL it checks rather than reloading the middleware
+# chain each time.
+_worker_clients = {}
+
+
+def get_worker_client(handler):
+    if not callable(handler):
+        # already an instance.
+        return handler
+    try:
+        return _worker_clients[handler]
+    except KeyError:
+        client = handler()
+        _worker_clients[handler] = client
+        return client
+
+
+def init_worker(handler):
+    """
+    Pool initializer: resolves the checks and sets up the long-lived client
+    before the worker is given any URLs.
+    """
+    # Ctrl-C is left to the parent, which stops the workers itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    get_checks()
+    get_worker_client(handler)
+
+
+def handle_request_response(client, path, lastmod=None, previous=None):
+    if unchanged_since(previous, lastmod):
+        return previous.copy(elapsed=None, reused=True, timings=None,
+                             check_times=None, worker=current_worker())
+    client = get_worker_client(client)
     if isinstance(client, Client):
-        # this first one is https://code.djangoproject.com/ticket/23895#ticket
-        if hasattr(data, '_request'):
-            data._request.resolver_match = None
-            data._request.environ['wsgi.input'] = None
-            data._request.environ['wsgi.errors'] = None
-            data._request._stream = None
-        data.client.handler._request_middleware = []
-        data.client.handler._exception_middleware = []
-        data.client.handler._view_middleware = []
-        data.client.handler._response_middleware = []
-        data.client.handler._template_response_middleware = []
-        data.client.errors = None
-    return Response(raw_data=data, path=path, status_code=data.status_code,
-                    check_results=tuple(run_checks_over_response(data)))
+        # don't let cookies set by one URL leak into the request for the next.
+        client.cookies.clear()
+    extra = {}
+    for name, value in conditional_headers(previous).items():
+        extra['HTTP_' + name.upper().replace('-', '_')] = value
+    instrumentation = Instrumentation()
+    started = default_timer()
+    with instrumentation:
+        data = client.get(path, **extra)
+    elapsed = default_timer() - started
+    queries = instrumentation.queries
+    timings = Timings(ttfb=elapsed, queries=len(queries),
+                      query_time=instrumentation.query_time,
+                      render_time=instrumentation.render_time)
+    return summarise_response(path=path, response=data, elapsed=elapsed,
+                              lastmod=lastmod, previous=previous,
+                              timings=timings, queries=queries)
+
+
+def handle_within_limits(client, path, lastmod=None, previous=None,
+                         timeout=None, retries=None, backoff=None):
+    """
+    handle_request_response, giving up on the URL once it's taken `timeout`
+    seconds (where the view can be interrupted), and trying it again up to
+    `retries` times while it fails in a way which may be transient; see
+    sitemapcheck.timeouts. An exception raised while checking the URL is
+    reported as an error for it, rather than raised on.
+    """
+    timeout = get_timeout(timeout)
+
+    def attempt():
+        limit = TimeLimit(timeout)
+        started = default_timer()
+        result = None
+        try:
+            with limit:
+                result = handle_request_response(client, path,
+                                                 lastmod=lastmod,
+                                                 previous=previous)
+        except URLTimeout:
+            pass
+        except Exception as e:
+            if not limit.expired:
+                msg = "{cls!s}: {error!s}".format(cls=e.__class__.__name__,
+                                                  error=e)
+                return failed_response(path=path, msg=msg,
+                                       elapsed=default_timer() - started)
+        if limit.expired:
+            # even if the view caught the timeout and carried on.
+            return failed_response(path=path, msg=describe_timeout(timeout),
+                                   elapsed=default_timer() - started)
+        return result
+    return with_retries(attempt, retries=retries, backoff=backoff)
+
+
+def summarise_response(path, response, elapsed=None, lastmod=None,
+                       previous=None, timings=None, queries=None):
+    """
+    Runs the checks over the response (with the queries it ran, if known),
+    and keeps the results and what else is needed from it. Given the
+    previous result for the same URL, its check results are reused instead
+    if the response is a 304 Not Modified or has the same body and headers
+    as last time; see reusable().
+
+    Only as much of the body is read as the checks need; see
+    sitemapcheck.body.
+    """
+    checks = get_checks()
+    # a failed response, whose other checks will be skipped, needs little or
+    # none of its body read.
+    needs = get_needs(applicable_checks(response, checks))
+    body = read_body(response, needs)
+    if needs != HEADERS:
+        set_document(response, Document.from_body(body))
+    if reusable(previous):
+        if response.status_code == 304:
+            fingerprint = previous.fingerprint._replace(lastmod=lastmod)
+            return previous.copy(elapsed=elapsed, fingerprint=fingerprint,
+                                 reused=True, timings=timings,
+                                 check_times=None, worker=current_worker())
+        fingerprint = get_fingerprint(response, lastmod=lastmod, body=body)
+        same_content = (fingerprint.content_hash is not None and
+                        fingerprint.content_hash ==
+                        previous.fingerprint.content_hash and
+                        fingerprint.headers_hash ==
+                        previous.fingerprint.headers_hash)
+        if same_content and response.status_code == previous.status_code:
+            return previous.copy(elapsed=elapsed, fingerprint=fingerprint,
+                                 headers=get_result_headers(response),
+                                 reused=True, timings=timings,
+                                 check_times=None, worker=current_worker())
+    context = CheckContext(path=path, queries=queries, timings=timings)
+    check_times = []
+    check_results = compact_check_results(run_checks_over_response(
+        response, checks=checks, context=context, times=check_times))
+    return Response(path=path, status_code=response.status_code,
+                    content_length=get_content_length(response, body=body),
+                    headers=get_result_headers(response), elapsed=elapsed,
+                    check_results=check_results,
+                    fingerprint=get_fingerprint(response, lastmod=lastmod,
+                                                body=body),
+                    timings=timings, check_times=tuple(check_times),
+                    worker=current_worker())
 
 
 def _unpack_handle_request_response(args):
     return handle_request_response(*args)
 
 
-def singleprocessor(prepared_requests):
+def _give_up_request(task, msg, elapsed):
+    result = failed_response(path=task[1], msg=msg, elapsed=elapsed)
+    # made by the parent, for a worker which has gone.
+    result.worker = None
+    return result
+
+
+def singleprocessor(prepared_requests, timeout=None, retries=None):
     for x in prepared_requests:
-        yield handle_request_response(x.handler, x.path)
-
-
-def multiprocessor(prepared_requests):
-    processes = use_multiprocessing()
-    if processes is True:
-        processes = cpu_count()
-    else:
-        # let this bubble up an error if the user has configured it stupidly.
-        processes = int(processes)
-    pool = Pool(processes)
-    for_pooling = ((x.handler, x.path) for x in prepared_requests)
+        yield handle_within_limits(x.handler, x.path, lastmod=x.lastmod,
+                                   previous=x.previous, timeout=timeout,
+                                   retries=retries)
+
+
+def bounded_iterator(iterable, semaphore):
+    """
+    Only pulls the next item once the semaphore allows it, so that a consumer
+    releasing the semaphore for every finished item keeps the number of items
+    taken but not yet finished within the semaphore's initial value.
+    """
+    iterator = iter(iterable)
+    while True:
+        semaphore.acquire()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        yield item
+
+
+# how long the parent blocks waiting on a result before checking again; waiting
+# without a timeout can't be interrupted by Ctrl-C under Python 2.
+RESULT_POLL_INTERVAL = 0.5
+
+
+def get_chunksize(chunksize=None):
+    if chunksize is None:
+        chunksize = getattr(settings, 'SITEMAPCHECK_CHUNKSIZE',
+                            SITEMAPCHECK_CHUNKSIZE)
+    return chunksize
+
+
+def get_max_in_flight(workers, chunksize, max_in_flight=None):
+    if max_in_flight is None:
+        max_in_flight = getattr(settings, 'SITEMAPCHECK_MAX_IN_FLIGHT',
+                                SITEMAPCHECK_MAX_IN_FLIGHT)
+    if max_in_flight is None:
+        max_in_flight = workers * chunksize * 2
+    # a chunk is only dispatched once it's full, so fewer slots than that
+    # would never let the first one go.
+    return max(max_in_flight, chunksize)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _call_chunk(args):
+    func, chunk = args
+    return [func(task) for task in chunk]
+
+
+def stream_from_pool(pool, func, tasks, chunksize, max_in_flight):
+    """
+    Yields the result of `func` for each of `tasks` from the given pool as
+    each one finishes, in no particular order. Only `max_in_flight` tasks
+    are taken ahead of the results consumed so far, so neither the full set
+    of tasks nor the full set of results is ever held at once.
+
+    The pool is always closed or terminated by the time this finishes,
+    including when it's interrupted by Ctrl-C, which is then raised on.
+    """
+    in_flight = threading.Semaphore(max_in_flight)
+    finished = False
     try:
-        results = pool.map_async(func=_unpack_handle_request_response,
-                                 iterable=for_pooling)
-        pool.close()
-        pool.join()
-    except KeyboardInterrupt:
-        pool.terminate()
+        # chunked here rather than by the pool, which for a chunksize over 1
+        # hands back a plain generator, whose next() can't take a timeout.
+        chunks = chunked(bounded_iterator(tasks, in_flight), chunksize)
+        results = pool.imap_unordered(
+            _call_chunk, ((func, chunk) for chunk in chunks))
+        while True:
+            try:
+                chunk = results.next(timeout=RESULT_POLL_INTERVAL)
+            except TimeoutError:
+                continue
+            except StopIteration:
+                break
+            for result in chunk:
+                in_flight.release()
+                yield result
+        finished = True
+    finally:
+        if finished:
+            pool.close()
+        else:
+            # unblock the task feeder if it's waiting for a slot, so that
+            # terminating the pool doesn't wait on it forever.
+            for slot in range(max_in_flight):
+                in_flight.release()
+            pool.terminate()
         pool.join()
-        results = ()
-    else:
-        results = results.get()
-    return results
+
+
+def multiprocessor(prepared_requests, processes=None, chunksize=None,
+                   max_in_flight=None, timeout=None, retries=None):
+    """
+    Checks each of the prepared requests using a pool of processes, yielding
+    results as each one finishes. A worker taking longer than `timeout` over
+    a URL is killed and replaced, and the URL tried again up to `retries`
+    times; see sitemapcheck.workers.
+    """
+    processes = get_processes(processes)
+    chunksize = get_chunksize(chunksize)
+    max_in_flight = get_max_in_flight(processes, chunksize, max_in_flight)
+    prepared_requests = iter(prepared_requests)
+    try:
+        first = next(prepared_requests)
+    except StopIteration:
+        return
+    prepared_requests = itertools.chain((first,), prepared_requests)
+    for_pooling = ((x.handler, x.path, x.lastmod, x.previous)
+                   for x in prepared_requests)
+    pool = WorkerPool(processes, _unpack_handle_request_response,
+                      initializer=init_worker, initargs=(first.handler,),
+                      timeout=get_timeout(timeout),
+                      retries=get_retries(retries),
+                      backoff=get_retry_backoff(), should_retry=is_transient,
+                      give_up=_give_up_request)
+    for result in pool.stream(for_pooling, chunksize, max_in_flight):
+        yield result
+
+
+def use_incremental(requested=None):
+    if requested is not None:
+        return requested
+    return getattr(settings, 'SITEMAPCHECK_INCREMENTAL',
+                   SITEMAPCHECK_INCREMENTAL)
 
 
 def use_multiprocessing():
@@ -173,23 +785,23 @@ def use_multiprocessing():
                       SITEMAPCHECK_MULTIPROCESSING)
     return setting is not False
 
-ReportLocations = namedtuple('ReportLocations', 'from_file, output_file context')  # noqa
-
-
-def render_report(results, root_dir):
-    template_path = "sitemapcheck/report.html"
-    context = {'results': results,
-               'Success': Success,
-               'Warning': Caution,
-               'Caution': Caution,
-               'Info': Info,
-               'Error': Error}
-    report_output = render_to_string(template_name=template_path,
-                                     dictionary=context)
-    report_output_text = force_text(report_output)
-    out_html_path = os.path.realpath(
-        os.path.join(root_dir, 'sitemapcheck_report.html'))
-    with open(out_html_path, mode='w') as f:
-        f.write(report_output_text)
-    return ReportLocations(from_file=template_path, output_file=out_html_path,
-                           context=context)
+
+def get_processes(processes=None):
+    """
+    How many worker processes to use; SITEMAPCHECK_MULTIPROCESSING may be
+    True, for one per CPU, or a number.
+    """
+    if processes is None:
+        processes = getattr(settings, 'SITEMAPCHECK_MULTIPROCESSING',
+                            SITEMAPCHECK_MULTIPROCESSING)
+    if processes is True or processes is False:
+        return cpu_count()
+    # let this bubble up an error if the user has configured it stupidly.
+    return int(processes)
+
+
+def use_worker_enumeration(requested=None):
+    if requested is not None:
+        return requested
+    return getattr(settings, 'SITEMAPCHECK_ENUMERATE_IN_WORKERS',
+                   SITEMAPCHECK_ENUMERATE_IN_WORKERS)
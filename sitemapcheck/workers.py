@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+A pool of worker processes which, unlike multiprocessing.Pool, knows which
+task each worker is on and since when. A worker taking too long over a task
+is killed and replaced, as is one which dies any other way, and the tasks it
+had left are handed to the others, rather than the run waiting for ever on
+results which won't come.
+
+Each worker is sent chunks of tasks down a pipe of its own, and sends back
+the result of each task as soon as it has it.
+"""
+from collections import deque
+import heapq
+import itertools
+from multiprocessing import Pipe, Process
+import select
+import signal
+import time
+from timeit import default_timer
+try:
+    from multiprocessing.connection import wait
+except ImportError:
+    # Python 2, where each end of a pipe is a descriptor select() can watch.
+    def wait(object_list, timeout=None):
+        return select.select(object_list, [], [], timeout)[0]
+from .timeouts import describe_timeout
+from .timeouts import retry_delay
+
+
+# how long the parent waits on the workers at a time, before checking whether
+# any has run out of time; waiting without a timeout can't be interrupted by
+# Ctrl-C under Python 2.
+WATCH_INTERVAL = 0.1
+
+
+def worker_main(connection, func, initializer, initargs):
+    # Ctrl-C is left to the parent, which stops the workers itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        try:
+            chunk = connection.recv()
+        except EOFError:
+            return
+        if chunk is None:
+            return
+        for task in chunk:
+            try:
+                connection.send((True, func(task)))
+            except Exception as e:
+                connection.send((False, e))
+
+
+class Worker(object):
+    """
+    A worker process, and the (task, attempt) pairs it's been sent but
+    hasn't finished, the first being the one it's been on since `started`.
+    """
+    __slots__ = ('process', 'connection', 'pending', 'started')
+
+    def __init__(self, func, initializer=None, initargs=()):
+        self.connection, child = Pipe()
+        self.process = Process(target=worker_main,
+                               args=(child, func, initializer, initargs))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self.pending = deque()
+        self.started = None
+
+    def send(self, items):
+        if not self.pending:
+            self.started = default_timer()
+        self.pending.extend(items)
+        self.connection.send([task for task, attempt in items])
+
+    def finish(self):
+        """
+        The (task, attempt) it was on, now its result has arrived.
+        """
+        self.started = default_timer()
+        return self.pending.popleft()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except (IOError, OSError):
+            # already gone.
+            pass
+        self.process.join()
+        self.connection.close()
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+class WorkerPool(object):
+    """
+    `processes` workers, each calling `initializer(*initargs)` once, then
+    `func(task)` for each task it's given.
+
+    A task whose worker goes over `timeout` seconds with it, or dies, is
+    tried again up to `retries` more times, as is one whose result
+    `should_retry(result)` is true of, each retry being held back as
+    sitemapcheck.timeouts.retry_delay says. Once out of retries, the result
+    of a task whose worker was lost is `give_up(task, msg, elapsed)`, as is
+    that of one which raised an exception, if `give_up` is given; otherwise
+    the exception is raised on.
+
+    The workers are started for each stream() and stopped after it, unless
+    start() is called first, in which case they're kept for every stream()
+    until close().
+    """
+    def __init__(self, processes, func, initializer=None, initargs=(),
+                 timeout=None, retries=0, backoff=0, should_retry=None,
+                 give_up=None):
+        self.processes = processes
+        self.func = func
+        self.initializer = initializer
+        self.initargs = initargs
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.should_retry = should_retry
+        self.give_up = give_up
+        self.workers = []
+        # (task, attempt) pairs to send out ahead of any new tasks, and
+        # those to retry later, by when.
+        self.ready = deque()
+        self.delayed = []
+        # breaks ties between retries due at once, so tasks themselves are
+        # never compared.
+        self.retried = itertools.count()
+
+    def start(self):
+        self.workers = [self.start_worker() for _ in range(self.processes)]
+
+    def close(self):
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+
+    def start_worker(self):
+        return Worker(self.func, initializer=self.initializer,
+                      initargs=self.initargs)
+
+    def retry(self, task, attempt):
+        """
+        Holds the task back for another attempt, if it has any left.
+        """
+        if attempt >= self.retries:
+            return False
+        attempt += 1
+        due = default_timer() + retry_delay(attempt, self.backoff)
+        heapq.heappush(self.delayed, (due, next(self.retried), task, attempt))
+        return True
+
+    def dispatch(self, chunksize):
+        now = default_timer()
+        while self.delayed and self.delayed[0][0] <= now:
+            due, number, task, attempt = heapq.heappop(self.delayed)
+            self.ready.append((task, attempt))
+        while self.ready:
+            worker = min(self.workers, key=lambda x: len(x.pending))
+            if worker.pending and len(self.ready) < chunksize:
+                # only an idle worker is sent less than a whole chunk.
+                return
+            count = min(chunksize, len(self.ready))
+            try:
+                worker.send([self.ready.popleft() for _ in range(count)])
+            except (IOError, OSError):
+                # it died while idle, so none of them were started.
+                worker.kill()
+                self.replace(worker)
+
+    def replace(self, worker):
+        """
+        Starts a new worker in place of one which was killed or died, handing
+        back the tasks it had been sent to be sent out again.
+        """
+        self.ready.extendleft(reversed(worker.pending))
+        worker.pending.clear()
+        self.workers[self.workers.index(worker)] = self.start_worker()
+
+    def lose(self, worker, msg):
+        """
+        Replaces a worker which was killed or died part way through a task,
+        yielding the result for that task if it isn't to be tried again.
+        """
+        elapsed = default_timer() - worker.started
+        task, attempt = worker.pending.popleft()
+        self.replace(worker)
+        if not self.retry(task, attempt):
+            yield self.give_up(task, msg, elapsed)
+
+    def receive(self, worker):
+        """
+        Yields whatever results the worker has sent back so far.
+        """
+        while True:
+            try:
+                if not worker.connection.poll():
+                    return
+                ok, value = worker.connection.recv()
+            except (EOFError, IOError, OSError):
+                # a worker which died with chunks still unread in its pipe
+                # resets it, rather than just closing it.
+                worker.kill()
+                msg = "The worker process died (exit code {code!s})".format(
+                    code=worker.process.exitcode)
+                for result in self.lose(worker, msg):
+                    yield result
+                return
+            elapsed = default_timer() - worker.started
+            task, attempt = worker.finish()
+            if not ok:
+                if self.give_up is None:
+                    raise value
+                msg = "{cls!s}: {error!s}".format(
+                    cls=value.__class__.__name__, error=value)
+                yield self.give_up(task, msg, elapsed)
+                continue
+            if (self.should_retry is not None and self.should_retry(value)
+                    and self.retry(task, attempt)):
+                continue
+            yield value
+
+    def watch(self):
+        """
+        Waits a little for results, yielding any which arrive, and replaces
+        the workers which have run out of time.
+        """
+        busy = [x for x in self.workers if x.pending]
+        if not busy:
+            # only retries are left, none of which is due yet.
+            time.sleep(max(0, min(WATCH_INTERVAL,
+                                  self.delayed[0][0] - default_timer())))
+            return
+        readable = wait([x.connection for x in busy], WATCH_INTERVAL)
+        for worker in busy:
+            if worker.connection in readable:
+                for result in self.receive(worker):
+                    yield result
+        if not self.timeout:
+            return
+        now = default_timer()
+        for worker in [x for x in self.workers if x.pending]:
+            if now - worker.started > self.timeout:
+                worker.kill()
+                for result in self.lose(worker,
+                                        describe_timeout(self.timeout)):
+                    yield result
+
+    def stream(self, tasks, chunksize, max_in_flight):
+        """
+        Yields the result for each of `tasks` as it's finished, in no
+        particular order. Only `max_in_flight` tasks are taken ahead of the
+        results yielded so far.
+
+        The workers are always stopped by the time this finishes, including
+        when it's interrupted by Ctrl-C, which is then raised on.
+        """
+        tasks = iter(tasks)
+        exhausted = False
+        taken = 0
+        finished = False
+        kept = bool(self.workers)
+        if not kept:
+            self.start()
+        try:
+            while True:
+                while not exhausted and taken < max_in_flight:
+                    try:
+                        self.ready.append((next(tasks), 0))
+                    except StopIteration:
+                        exhausted = True
+                    else:
+                        taken += 1
+                if exhausted and not taken:
+                    break
+                self.dispatch(chunksize)
+                for result in self.watch():
+                    taken -= 1
+                    yield result
+            finished = True
+        finally:
+            if kept:
+                if not finished:
+                    self.abandon()
+            elif finished:
+                self.close()
+            else:
+                for worker in self.workers:
+                    worker.kill()
+                self.workers = []
+
+    def abandon(self):
+        """
+        Replaces the workers still on tasks from a stream which was stopped
+        part way, so their results don't turn up in the next one.
+        """
+        for worker in list(self.workers):
+            if worker.pending:
+                worker.kill()
+                self.replace(worker)
+        self.ready.clear()
+        self.delayed = []
@@ -12,6 +12,7 @@ DATABASES = {
 INSTALLED_APPS = (
     'django.contrib.sites',
     'django.contrib.sitemaps',
+    'sitemapcheck',
 )
 
 ROOT_URLCONF = 'test_urls'
@@ -3,6 +3,10 @@ from django.conf.urls import patterns, url, include
 from django.contrib import admin
 from django.contrib.sitemaps import Sitemap
 from django.contrib.sitemaps.views import sitemap
+from django.contrib.sites.models import Site
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.views.decorators.http import etag
 
 
 class FakeSitemap(Sitemap):
@@ -13,6 +17,24 @@ class FakeSitemap(Sitemap):
         return '/test/', '/test2/', '/test3/test4/'
 
 
+@etag(lambda request: 'v1')
+def conditional(request):
+    return HttpResponse("<!doctype html><title>conditional</title>")
+
+
+def costly(request):
+    names = [site.name for site in Site.objects.all()]
+    names.extend(site.domain for site in Site.objects.all())
+    template = Template("<!doctype html><title>{{ names|join:', ' }}</title>")
+    return HttpResponse(template.render(Context({'names': names})))
+
+
+def n_plus_one(request):
+    sites = [Site.objects.filter(pk=pk).first() for pk in range(1, 11)]
+    return HttpResponse("<!doctype html><title>{0:d}</title>".format(
+        len([site for site in sites if site is not None])))
+
+
 urlpatterns = patterns('',
     url(r'^admin_mountpoint/', include(admin.site.urls)),
     url('sitemap_a\.xml', sitemap, {}, name='empty_sitemaps'),
@@ -24,4 +46,7 @@ urlpatterns = patterns('',
         'hello': FakeSitemap,
         }},
         name='sitemaps_key_exists_with_sitemap'),
+    url('^conditional/$', conditional, name='conditional'),
+    url('^costly/$', costly, name='costly'),
+    url('^n_plus_one/$', n_plus_one, name='n_plus_one'),
 )